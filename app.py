@@ -1,9 +1,7 @@
 from web3_copilot.agent import Web3CopilotAgent
-from council.agents import AgentResult
+from web3_copilot.common.serialization import serialize_agent_response
 from flask import Flask, request
 
-import json
-
 
 app = Flask(__name__)
 
@@ -54,33 +52,5 @@ def chat():
     return response
 
 
-def serialize_agent_response(agent_response: AgentResult):
-    response = {
-        "messages": [],
-        "best_message": {}
-    }
-
-    for scored_msg in agent_response.messages:
-        score = scored_msg.score
-        message = to_json(scored_msg.message)
-
-        response["messages"].append({
-            "score": score,
-            "message": message
-        })
-
-    best_message = agent_response.try_best_message.unwrap()
-    response["best_message"] = to_json(best_message)
-
-    return response
-
-
-def to_json(obj):
-    serialized = json.dumps(obj, default=lambda o: o.__dict__,
-                      sort_keys=True, indent=4)
-
-    return json.loads(serialized)
-
-
 if __name__ == '__main__':
     app.run(port=8000, debug=True)
@@ -0,0 +1,162 @@
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from web3_copilot.agent import Web3CopilotAgent
+from web3_copilot.controller import FastRouterController
+from web3_copilot.common import constants, tracing
+from web3_copilot.common.concurrency import LimitedStreamingResponse, RequestLimiter, RequestLimitExceeded
+from web3_copilot.common.serialization import serialize_agent_response
+
+import json
+import logging
+import os
+
+
+# SHARED_STORE is set by gunicorn.conf.py, the workers forked from the preloaded app share one database process.
+# LAZY_INIT starts serving before the models are loaded, they are warmed up in the background.
+# INDEX_ARTIFACT serves a prebuilt index artifact written by ingest.py.
+# TRACE_SAMPLE_RATE is the share of requests whose spans are logged to stderr as json lines.
+# ANSWER_CACHE=true serves the answers of similar prompts from the answer cache.
+agent = Web3CopilotAgent(
+    shared_store=os.environ.get("SHARED_STORE", "false").lower() == "true",
+    lazy_init=os.environ.get("LAZY_INIT", "false").lower() == "true",
+    index_artifact=os.environ.get("INDEX_ARTIFACT") or None,
+    trace_sample_rate=float(os.environ.get("TRACE_SAMPLE_RATE", constants.TRACE_SAMPLE_RATE)),
+    answer_cache=os.environ.get("ANSWER_CACHE", str(constants.ANSWER_CACHE)).lower() == "true",
+)
+if agent.trace_sample_rate > 0:
+    tracing.log_to_stream()
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    # The limiter belongs to the event loop of the server
+    app.state.limiter = RequestLimiter(
+        max_concurrent=constants.MAX_CONCURRENT_REQUESTS,
+        max_queued=constants.MAX_QUEUED_REQUESTS,
+        queue_timeout=constants.REQUEST_QUEUE_TIMEOUT,
+    )
+    # Runs in every worker, models loaded by a preloaded app are shared instead
+    if not agent.status()["ready"]:
+        agent.warmup()
+    yield
+
+
+async def index(request: Request):
+    return PlainTextResponse("Welcome to Web3 Copilot! Powered by Council AI from ChainML.")
+
+
+async def chat(request: Request):
+    """Same request and response as the /chat route of app.py.
+
+    Requests past MAX_CONCURRENT_REQUESTS are queued, and rejected with 429
+    once the queue is full or a request waited REQUEST_QUEUE_TIMEOUT seconds."""
+    req_data = await request.json()
+
+    prompt = req_data["prompt"]
+    logging.debug(f"request:\n{prompt}")
+
+    limiter = request.app.state.limiter
+    try:
+        with tracing.Span("server.queue"):
+            await limiter.acquire()
+    except RequestLimitExceeded as e:
+        logging.warning(f'message="chat request rejected" reason="{e}"')
+        return JSONResponse(
+            {"error": "Too many requests, try again later."},
+            status_code=429,
+            headers={"Retry-After": "1"},
+        )
+
+    try:
+        agent_response = await agent.ainteract(prompt)
+    finally:
+        limiter.release()
+
+    response = serialize_agent_response(agent_response)
+    logging.debug(f"response:\n{response}")
+
+    return JSONResponse(response)
+
+
+async def chat_stream(request: Request):
+    """Same request as /chat, answered with server-sent events as the agent executes:
+    route, retrieval and token events, then a result event with the messages without their data.
+
+    Requests are limited as on /chat, the slot is held until the stream ends."""
+    req_data = await request.json()
+
+    prompt = req_data["prompt"]
+    logging.debug(f"request:\n{prompt}")
+
+    limiter = request.app.state.limiter
+    try:
+        with tracing.Span("server.queue"):
+            await limiter.acquire()
+    except RequestLimitExceeded as e:
+        logging.warning(f'message="chat request rejected" reason="{e}"')
+        return JSONResponse(
+            {"error": "Too many requests, try again later."},
+            status_code=429,
+            headers={"Retry-After": "1"},
+        )
+
+    async def events():
+        try:
+            async for event, data in agent.astream(prompt):
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except Exception as e:
+            logging.exception('message="chat stream failed"')
+            yield f"event: error\ndata: {json.dumps({'error': repr(e)})}\n\n"
+
+    # The response releases the slot, even if the stream is dropped before its first event
+    return LimitedStreamingResponse(
+        events(),
+        limiter,
+        media_type="text/event-stream",
+        # Events are not held back by proxies
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def ready(request: Request):
+    """Readiness probe, 503 until the models are loaded and the database is synced."""
+    status = agent.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+async def stats(request: Request):
+    return JSONResponse({
+        "requests": request.app.state.limiter.stats(),
+        "retriever": agent.retriever.cache_stats(),
+        "answers": agent.answer_cache.stats() if agent.answer_cache is not None else None,
+        "router": agent.controller.stats() if isinstance(agent.controller, FastRouterController) else None,
+    })
+
+
+async def metrics(request: Request):
+    """Latency histograms and totals of the spans of agent executions, in the Prometheus text format."""
+    return PlainTextResponse(tracing.metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+app = Starlette(
+    routes=[
+        Route("/", index),
+        Route("/chat", chat, methods=["POST"]),
+        Route("/chat/stream", chat_stream, methods=["POST"]),
+        Route("/ready", ready),
+        Route("/stats", stats),
+        Route("/metrics", metrics),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, port=8000)
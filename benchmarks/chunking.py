@@ -0,0 +1,71 @@
+"""Compare the linear chunker with the re-encoding chunker on pdf documents.
+
+Usage:
+    python -m benchmarks.chunking [path/to/doc.pdf ...]
+
+Without arguments, every generated pdf under constants.DATA_DIR is used.
+"""
+import os
+import sys
+import time
+
+from pypdf import PdfReader
+
+from web3_copilot.common import constants
+from web3_copilot.common.utils import create_file_dict
+from web3_copilot.doc_retrieval import PdfExtractor
+
+
+def extract_pages(path: str):
+    with open(path, "rb") as f:
+        pdf_reader = PdfReader(f)
+        return [PdfExtractor._split_text(page.extract_text()) for page in pdf_reader.pages]
+
+
+def run_chunker(chunker, pages, source: str, max_size: int):
+    start = time.perf_counter()
+    chunks = []
+    for page_num, text_list in enumerate(pages):
+        chunks.extend(chunker(text_list, max_size, page_num, source))
+    return chunks, time.perf_counter() - start
+
+
+def main(paths):
+    extractor = PdfExtractor(constants.EMBEDDING_MODEL_NAME, max_chunk_size=constants.MAX_CHUNK_SIZE)
+
+    total_reencode, total_linear = 0.0, 0.0
+    for path in paths:
+        # Text extraction is the same for both chunkers, only chunking is timed
+        pages = extract_pages(path)
+        source = PdfExtractor._get_source(path)
+
+        reencode_chunks, reencode_time = run_chunker(
+            extractor._create_chunks_reencode, pages, source, extractor.max_chunk_size
+        )
+        linear_chunks, linear_time = run_chunker(
+            extractor._create_chunks, pages, source, extractor.max_chunk_size
+        )
+
+        if reencode_chunks != linear_chunks:
+            raise AssertionError(f"chunks differ for {path}")
+
+        total_reencode += reencode_time
+        total_linear += linear_time
+        print(
+            f"{path}: {len(pages)} pages, {len(linear_chunks)} chunks, "
+            f"re-encode {reencode_time:.2f}s, linear {linear_time:.2f}s, "
+            f"speedup {reencode_time / linear_time:.1f}x"
+        )
+
+    print(f"total: re-encode {total_reencode:.2f}s, linear {total_linear:.2f}s")
+
+
+if __name__ == "__main__":
+    pdf_paths = sys.argv[1:]
+    if not pdf_paths:
+        pdf_paths = [
+            os.path.join(constants.DATA_DIR, index, file)
+            for index, files in create_file_dict(constants.DATA_DIR).items()
+            for file in files
+        ]
+    main(pdf_paths)
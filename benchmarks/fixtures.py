@@ -0,0 +1,185 @@
+"""Offline fixtures of the benchmarks: a synthetic pdf corpus and tiny stand-in models.
+
+The stand-in models answer the methods of the models used by ingestion and retrieval,
+so the doc retrieval path runs without downloading any model. Their latency is not
+that of the real models, they are meant to measure everything around the models.
+"""
+import hashlib
+import os
+import re
+from typing import Dict, List, Sequence, Union
+
+import numpy as np
+
+WORDS = (
+    "account address block bridge chain client consensus contract delegate deploy epoch fee gas "
+    "governance hash keyring ledger liquidity message module network node oracle pool proposal "
+    "protocol relayer reward rollup router signature slashing staking state swap token transaction "
+    "validator vault wallet"
+).split()
+IDENTIFIERS = (
+    "keyring-backend eth_call eth_getBalance MsgSend MsgDelegate exactInputSingle "
+    "0xa9059cbb 0x095ea7b3 SSTORE DELEGATECALL --chain-id --gas-prices"
+).split()
+
+
+def synthetic_sentence(rng: np.random.Generator, num_words: int = 12) -> str:
+    words = list(rng.choice(WORDS, num_words))
+    # Some sentences mention an exact identifier, as web3 docs do
+    if rng.random() < 0.2:
+        words[rng.integers(num_words)] = rng.choice(IDENTIFIERS)
+    return " ".join(words).capitalize() + "."
+
+
+def write_pdf(path: str, pages: Sequence[Sequence[str]]):
+    """Function to write a minimal pdf with one line of Helvetica text per string of each page."""
+
+    def escape(text: str) -> str:
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    # Objects 1 and 2 are the catalog and the page tree, 3 the font, then a page and its content per page
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for lines in pages:
+        content = "BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"({escape(line)}) ' " for line in lines) + "ET"
+        content = content.encode("latin-1", errors="replace")
+        objects.append(None)
+        page_id = len(objects)
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        objects[page_id - 1] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (page_id + 1)
+        )
+        page_ids.append(page_id)
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, obj)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    with open(path, "wb") as f:
+        f.write(bytes(data))
+
+
+def build_corpus(
+    data_dir: str,
+    num_indices: int = 2,
+    docs_per_index: int = 4,
+    pages_per_doc: int = 10,
+    lines_per_page: int = 40,
+    seed: int = 0,
+) -> Dict[str, List[str]]:
+    """Function to write a synthetic pdf corpus, one subdirectory per index as in constants.DATA_DIR.
+
+    Returns sentences of the corpus per index, to be used as queries."""
+    rng = np.random.default_rng(seed)
+    sentences = {}
+    for i in range(num_indices):
+        index = f"index{i}"
+        os.makedirs(os.path.join(data_dir, index), exist_ok=True)
+        sentences[index] = []
+        for doc in range(docs_per_index):
+            pages = [
+                [synthetic_sentence(rng) for _ in range(lines_per_page)] for _ in range(pages_per_doc)
+            ]
+            write_pdf(os.path.join(data_dir, index, f"doc{doc}.pdf"), pages)
+            sentences[index].extend(line for page in pages for line in page)
+    return sentences
+
+
+def _terms(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9_]+", text.lower())
+
+
+def _term_vector(term: str, dimension: int, seed: int) -> np.ndarray:
+    digest = hashlib.md5(f"{seed}:{term}".encode("utf-8")).digest()
+    return np.random.default_rng(int.from_bytes(digest[:8], "little")).standard_normal(dimension).astype(np.float32)
+
+
+class HashingEncoder:
+    """Stand-in for the SentenceTransformer embedding model: the sum of a random vector per term."""
+
+    def __init__(self, dimension: int = 384, seed: int = 0):
+        self.dimension = dimension
+        self.seed = seed
+        self._vectors: Dict[str, np.ndarray] = {}
+
+    def __repr__(self) -> str:
+        return f"HashingEncoder(dimension={self.dimension}, seed={self.seed})"
+
+    def state_dict(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for term in _terms(text):
+            term_vector = self._vectors.get(term)
+            if term_vector is None:
+                term_vector = self._vectors[term] = _term_vector(term, self.dimension, self.seed)
+            vector += term_vector
+        return vector
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        convert_to_tensor: bool = False,
+        normalize_embeddings: bool = False,
+        **kwargs,
+    ) -> np.ndarray:
+        single = isinstance(sentences, str)
+        embeddings = np.stack([self._embed(text) for text in ([sentences] if single else sentences)])
+        if normalize_embeddings:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings[0] if single else embeddings
+
+
+class OverlapCrossEncoder:
+    """Stand-in for the CrossEncoder model: the share of the query terms found in the document."""
+
+    def predict(self, sentence_pairs: List[List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        scores = []
+        for query, document in sentence_pairs:
+            query_terms, document_terms = set(_terms(query)), set(_terms(document))
+            scores.append(len(query_terms & document_terms) / max(len(query_terms), 1))
+        return np.asarray(scores, dtype=np.float32)
+
+
+class WhitespaceEncoding:
+    """Stand-in for the tiktoken encoding of the prompt, one token per word."""
+
+    name = "whitespace"
+
+    def encode_ordinary(self, text: str) -> List[str]:
+        return text.split()
+
+    def encode_ordinary_batch(self, texts: List[str]) -> List[List[str]]:
+        return [text.split() for text in texts]
+
+
+def build_stand_in_tokenizer(texts: Sequence[str], output_dir: str, vocab_size: int = 2000) -> str:
+    """Function to train a small wordpiece tokenizer on the corpus, saved where AutoTokenizer can load it.
+
+    Returns output_dir, to be used as the embedding model name of the pdf extractor."""
+    from tokenizers import BertWordPieceTokenizer
+    from transformers import BertTokenizerFast
+
+    tokenizer = BertWordPieceTokenizer(lowercase=True)
+    tokenizer.train_from_iterator(texts, vocab_size=vocab_size)
+    BertTokenizerFast(tokenizer_object=tokenizer._tokenizer).save_pretrained(output_dir)
+    return output_dir
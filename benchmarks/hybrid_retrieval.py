@@ -0,0 +1,114 @@
+"""Compare hybrid BM25 and embedding retrieval with embedding retrieval alone.
+
+For each question, NUM_RETRIEVED_DOCUMENTS embedding candidates and HYBRID_NUM_CANDIDATES
+fused candidates are ranked by the cross-encoder. The top ranked documents of both modes
+are compared, with their mean cross-encoder score and the pairs scored to rank them.
+
+Usage:
+    python -m benchmarks.hybrid_retrieval [--questions questions.json] [--output results.json]
+
+questions.json maps collection names to lists of questions, the demo questions and
+questions on exact identifiers are used by default.
+"""
+import argparse
+import json
+
+import numpy as np
+
+from benchmarks.rerank_pruning import DEFAULT_QUESTIONS, rank
+from web3_copilot.common import constants
+from web3_copilot.doc_retrieval import Retriever
+from web3_copilot.doc_retrieval.config import Config
+
+IDENTIFIER_QUESTIONS = {
+    "cosmos": [
+        "What does the --keyring-backend flag do?",
+        "How do I use MsgSend?",
+    ],
+    "avalanche": [
+        "What does eth_getAssetBalance return?",
+    ],
+    "uniswap": [
+        "What does exactInputSingle do?",
+    ],
+}
+
+
+def top_score(retriever: Retriever, query: str, documents) -> float:
+    """Function to average the cross-encoder scores of the top ranked documents."""
+    if not documents:
+        return 0.0
+    return float(np.mean(retriever.reranker.predict([[query, doc] for doc in documents])))
+
+
+def main(questions, output):
+    config = Config(
+        encoding_name=constants.ENCODING_NAME,
+        embedding_model_name=constants.EMBEDDING_MODEL_NAME,
+        cross_encoder_model_name=constants.CROSS_ENCODER_MODEL_NAME,
+    )
+    vector_store = config.initialize()
+    retrievers = {"dense": Retriever(config, hybrid=False), "hybrid": Retriever(config, hybrid=True)}
+
+    results = []
+    for collection_name, collection_questions in questions.items():
+        collection = vector_store.collection(collection_name)
+        for query in collection_questions:
+            result = {"collection": collection_name, "query": query}
+            for mode, retriever in retrievers.items():
+                db_results = retriever._query_db(query, retriever.num_candidates, collection)
+                ids, pairs, seconds = rank(retriever, query, db_results, adaptive=False)
+                documents = dict(zip(db_results["ids"][0], db_results["documents"][0]))
+                result[mode] = {
+                    "ids": ids,
+                    "pairs": pairs,
+                    "rerank_seconds": seconds,
+                    "mean_top_score": top_score(retriever, query, [documents[doc_id] for doc_id in ids]),
+                }
+            result["overlap_at_k"] = len(set(result["dense"]["ids"]) & set(result["hybrid"]["ids"])) / max(
+                len(result["dense"]["ids"]), 1
+            )
+            results.append(result)
+            print(
+                f"{collection_name}: {query}\n"
+                f"    overlap@{constants.NUM_TOP_RANKED_DOCUMENTS} {result['overlap_at_k']:.2f}, "
+                f"mean top score {result['dense']['mean_top_score']:.2f} -> {result['hybrid']['mean_top_score']:.2f}, "
+                f"pairs {result['dense']['pairs']} -> {result['hybrid']['pairs']}"
+            )
+
+    summary = {
+        "num_questions": len(results),
+        "mean_overlap_at_k": sum(r["overlap_at_k"] for r in results) / max(len(results), 1),
+    }
+    for mode in retrievers:
+        summary[mode] = {
+            "mean_top_score": float(np.mean([r[mode]["mean_top_score"] for r in results])) if results else 0.0,
+            "pairs": sum(r[mode]["pairs"] for r in results),
+        }
+    print(
+        f"mean overlap@{constants.NUM_TOP_RANKED_DOCUMENTS} {summary['mean_overlap_at_k']:.3f}, "
+        f"mean top score {summary['dense']['mean_top_score']:.3f} -> {summary['hybrid']['mean_top_score']:.3f}, "
+        f"pairs scored {summary['dense']['pairs']} -> {summary['hybrid']['pairs']}"
+    )
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"summary": summary, "results": results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", help="json file mapping collection names to questions")
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+
+    if args.questions:
+        with open(args.questions, "r") as f:
+            eval_questions = json.load(f)
+    else:
+        eval_questions = {
+            name: DEFAULT_QUESTIONS.get(name, []) + IDENTIFIER_QUESTIONS.get(name, [])
+            for name in {**DEFAULT_QUESTIONS, **IDENTIFIER_QUESTIONS}
+        }
+
+    main(eval_questions, args.output)
@@ -0,0 +1,363 @@
+"""Load test the chat endpoint end to end, against local stand-ins of OpenAI, Tenderly and Etherscan.
+
+The stand-in servers of benchmarks/stubs.py are started in this process, and the ASGI app is started
+with uvicorn or gunicorn with its environment pointing to them. Prompts are then sent to /chat at
+--rps requests per second for --duration seconds, whatever the response times (open loop): the
+documentation questions and transaction prompts of demo.py, a --tx-ratio of them transaction prompts,
+each made unique so that no answer is served from a cache. With --stream, /chat/stream is used and
+the time to the first answer token is also measured.
+
+Reported: throughput, p50/p95/p99 latency overall and per kind of prompt, errors and 429 rejections,
+the cpu time and peak RSS of every process of the server, and the requests served by each stand-in.
+
+With --baseline, the run fails if the throughput or a p95 latency regressed by more than --tolerance
+against the results of a previous run. Process metrics are read from /proc and only reported on Linux.
+
+Usage:
+    python -m benchmarks.load_test [--server uvicorn|gunicorn|none] [--workers N] [--rps 5] [--duration 60]
+        [--tx-ratio 0.2] [--stream] [--llm-latency-ms 500] [--traces DIR] [--sources DIR]
+        [--output results.json] [--baseline results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from benchmarks import stubs
+
+DOC_QUESTIONS = [
+    "What is Uniswap?",
+    "What is soft governance in Uniswap?",
+    "How is Avalanche different from Ethereum?",
+    "What is the X-Chain and how is it different from the C-Chain?",
+    "Why would one use the Cosmos SDK?",
+    "How do I setup the keyring for my Cosmos Node?",
+    "Is Polygon a layer 2 blockchain or a layer 1 blockchains?",
+    "What are Polygon supernets?",
+]
+
+TX_PROMPTS = [
+    "Why did my txn fail - {tx_hash}?",
+    "What's happening in this tx - {tx_hash}?",
+]
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    return {
+        f"p{q}_ms": float(np.percentile(latencies, q)) * 1000 if latencies else 0.0
+        for q in (50, 95, 99)
+    }
+
+
+def build_workload(num_requests: int, tx_ratio: float, seed: int) -> List[Dict[str, str]]:
+    """Function to draw the prompts of the run, with a random transaction hash or a request number to make them unique."""
+    rng = np.random.default_rng(seed)
+    workload = []
+    for i in range(num_requests):
+        if rng.random() < tx_ratio:
+            tx_hash = "0x" + rng.bytes(32).hex()
+            prompt = TX_PROMPTS[rng.integers(len(TX_PROMPTS))].format(tx_hash=tx_hash)
+            workload.append({"kind": "tx", "prompt": prompt})
+        else:
+            question = DOC_QUESTIONS[rng.integers(len(DOC_QUESTIONS))]
+            workload.append({"kind": "doc", "prompt": f"{question} ({i})"})
+    return workload
+
+
+class ProcessSampler:
+    """Samples the cpu time and RSS of a process and its children from /proc, on a background thread."""
+
+    def __init__(self, pid: int, interval: float = 1.0):
+        self.pid = pid
+        self.interval = interval
+        self.processes: Dict[int, Dict[str, Any]] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="process-sampler", daemon=True)
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    @staticmethod
+    def supported() -> bool:
+        return sys.platform.startswith("linux")
+
+    def start(self):
+        self._sample()
+        self._thread.start()
+
+    def stop(self) -> Dict[str, Dict[str, Any]]:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return {
+            str(pid): {
+                "command": entry["command"],
+                "cpu_seconds": entry["cpu_last"] - entry["cpu_first"],
+                "cpu_percent": 100 * (entry["cpu_last"] - entry["cpu_first"]) / max(entry["seen_last"] - entry["seen_first"], 1e-9),
+                "peak_rss_mb": entry["peak_rss_mb"],
+            }
+            for pid, entry in self.processes.items()
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        now = time.perf_counter()
+        for pid in self._tree():
+            try:
+                with open(f"/proc/{pid}/stat", "r") as f:
+                    # Fields after the command name, which may contain spaces: utime and stime are the 12th and 13th
+                    fields = f.read().rsplit(")", 1)[1].split()
+                cpu = (int(fields[11]) + int(fields[12])) / self._ticks
+                with open(f"/proc/{pid}/status", "r") as f:
+                    rss_kb = next((int(line.split()[1]) for line in f if line.startswith("VmRSS:")), 0)
+                with open(f"/proc/{pid}/cmdline", "rb") as f:
+                    command = f.read().replace(b"\0", b" ").decode("utf-8", "replace").strip()
+            except (FileNotFoundError, ProcessLookupError, IndexError, ValueError):
+                continue
+            entry = self.processes.setdefault(
+                pid, {"command": command[:120], "cpu_first": cpu, "seen_first": now, "peak_rss_mb": 0.0}
+            )
+            entry["cpu_last"] = cpu
+            entry["seen_last"] = now
+            entry["peak_rss_mb"] = max(entry["peak_rss_mb"], rss_kb / 1024)
+
+    def _tree(self) -> List[int]:
+        children: Dict[int, List[int]] = {}
+        for name in os.listdir("/proc"):
+            if not name.isdigit():
+                continue
+            try:
+                with open(f"/proc/{name}/stat", "r") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (FileNotFoundError, ProcessLookupError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(name))
+
+        tree, pending = [], [self.pid]
+        while pending:
+            pid = pending.pop()
+            tree.append(pid)
+            pending.extend(children.get(pid, []))
+        return tree
+
+
+def start_server(args, env: Dict[str, str], port: int, log_file) -> subprocess.Popen:
+    if args.server == "uvicorn":
+        command = [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(port)]
+    else:
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "asgi:app"]
+        env = {**env, "BIND": f"127.0.0.1:{port}", "WEB_CONCURRENCY": str(args.workers)}
+    return subprocess.Popen(command, cwd=ROOT_DIR, env={**os.environ, **env}, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def wait_ready(url: str, server: Optional[subprocess.Popen], timeout: float):
+    """Function to wait until the app answers GET /ready with 200, i.e. its models are loaded.
+    Apps without /ready, such as the Flask app, are ready once they answer."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"server exited with code {server.returncode}")
+        try:
+            if httpx.get(f"{url}/ready", timeout=5).status_code in (200, 404):
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(1)
+    raise TimeoutError(f"{url} not ready after {timeout:.0f}s")
+
+
+async def send(client: httpx.AsyncClient, url: str, item: Dict[str, str], stream: bool) -> Dict[str, Any]:
+    start = time.perf_counter()
+    result = {"kind": item["kind"], "status": None, "error": None, "first_token": None}
+    try:
+        if stream:
+            async with client.stream("POST", f"{url}/chat/stream", json={"prompt": item["prompt"]}) as response:
+                result["status"] = response.status_code
+                event = None
+                async for line in response.aiter_lines():
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                        if event == "token" and result["first_token"] is None:
+                            result["first_token"] = time.perf_counter() - start
+                        elif event == "error":
+                            result["error"] = "error event"
+        else:
+            response = await client.post(f"{url}/chat", json={"prompt": item["prompt"]})
+            result["status"] = response.status_code
+    except httpx.HTTPError as e:
+        result["error"] = repr(e)
+    result["latency"] = time.perf_counter() - start
+    return result
+
+
+async def drive(url: str, workload: List[Dict[str, str]], rps: float, stream: bool, timeout: float):
+    """Function to send the workload at rps requests per second, without waiting for responses."""
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        tasks = []
+        for i, item in enumerate(workload):
+            delay = start + i / rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(client, url, item, stream)))
+        responses = await asyncio.gather(*tasks)
+        return responses, time.perf_counter() - start
+
+
+def summarize(responses: List[Dict[str, Any]], seconds: float) -> Dict[str, Any]:
+    ok = [r for r in responses if r["status"] == 200 and r["error"] is None]
+    summary = {
+        "requests": {
+            "sent": len(responses),
+            "ok": len(ok),
+            "rejected": sum(r["status"] == 429 for r in responses),
+            "errors": sum(r["status"] != 429 and (r["status"] != 200 or r["error"] is not None) for r in responses),
+        },
+        "seconds": seconds,
+        "throughput_rps": len(ok) / seconds,
+        "latency": {"all": percentiles([r["latency"] for r in ok])},
+    }
+    for kind in sorted({r["kind"] for r in responses}):
+        summary["latency"][kind] = percentiles([r["latency"] for r in ok if r["kind"] == kind])
+    first_tokens = [r["first_token"] for r in ok if r["first_token"] is not None]
+    if first_tokens:
+        summary["latency"]["first_token"] = percentiles(first_tokens)
+    return summary
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Function to list the p95 latencies and the throughput that regressed past tolerance."""
+    regressions = []
+    for kind, entry in results["latency"].items():
+        previous = baseline.get("latency", {}).get(kind)
+        if previous and entry["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{kind} p95 {previous['p95_ms']:.0f}ms -> {entry['p95_ms']:.0f}ms")
+
+    previous = baseline.get("throughput_rps")
+    current = results["throughput_rps"]
+    if previous and current < previous / (1 + tolerance):
+        regressions.append(f"throughput {previous:.2f} -> {current:.2f} requests/sec")
+    return regressions
+
+
+def main(args) -> int:
+    # An app started by hand is pointed to the stand-ins on a known port
+    stub_port = args.stub_port or (8900 if args.server == "none" else free_port())
+    stub_server = stubs.StubServer(stubs.config_from_args(args))
+    stubs.serve_in_thread(stub_server.app, stub_port)
+    env = {**stubs.environment(stub_port), "ANSWER_CACHE": "false"}
+
+    server, sampler = None, None
+    url = args.url
+    log_file = tempfile.NamedTemporaryFile("w", prefix="load_test-server-", suffix=".log", delete=False)
+    try:
+        if args.server != "none":
+            port = free_port()
+            url = f"http://127.0.0.1:{port}"
+            server = start_server(args, env, port, log_file)
+            print(f"started {args.server} on {url}, logs in {log_file.name}")
+        else:
+            print("the app must be started with:\n" + "\n".join(f"  {name}={value}" for name, value in env.items()))
+        wait_ready(url, server, args.startup_timeout)
+
+        warmup = build_workload(args.warmup, args.tx_ratio, args.seed + 1)
+        asyncio.run(drive(url, warmup, args.rps, args.stream, args.timeout))
+        stub_requests = dict(stub_server.requests)
+
+        if server is not None and ProcessSampler.supported():
+            sampler = ProcessSampler(server.pid)
+            sampler.start()
+        workload = build_workload(int(args.rps * args.duration), args.tx_ratio, args.seed)
+        responses, seconds = asyncio.run(drive(url, workload, args.rps, args.stream, args.timeout))
+        processes = sampler.stop() if sampler is not None else {}
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        log_file.close()
+
+    results = {
+        "run": {
+            "server": args.server,
+            "workers": args.workers if args.server == "gunicorn" else 1,
+            "rps": args.rps,
+            "duration": args.duration,
+            "tx_ratio": args.tx_ratio,
+            "stream": args.stream,
+            "stubs": vars(stubs.config_from_args(args)),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "created_at": time.time(),
+        },
+        **summarize(responses, seconds),
+        "processes": processes,
+        "stub_requests": {name: count - stub_requests[name] for name, count in stub_server.requests.items()},
+    }
+
+    requests = results["requests"]
+    print(
+        f"{requests['ok']}/{requests['sent']} ok, {requests['rejected']} rejected, {requests['errors']} errors "
+        f"in {seconds:.1f}s ({results['throughput_rps']:.2f} requests/sec)"
+    )
+    for kind, entry in results["latency"].items():
+        print(f"{kind:12} p50 {entry['p50_ms']:8.0f}ms  p95 {entry['p95_ms']:8.0f}ms  p99 {entry['p99_ms']:8.0f}ms")
+    for pid, entry in processes.items():
+        print(f"pid {pid:>7} cpu {entry['cpu_percent']:6.1f}%  peak RSS {entry['peak_rss_mb']:7.0f}MB  {entry['command']}")
+    print("stand-in requests: " + ", ".join(f"{name} {count}" for name, count in results["stub_requests"].items()))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=("uvicorn", "gunicorn", "none"), default="uvicorn",
+                        help="server to start the app with, none to load test an app started with the printed environment")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="url of the app with --server none")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--stub-port", type=int, help="port of the stand-in servers, 8900 with --server none, a free port otherwise")
+    parser.add_argument("--rps", type=float, default=5, help="requests sent per second")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to send requests for")
+    parser.add_argument("--warmup", type=int, default=10, help="requests sent before measuring")
+    parser.add_argument("--tx-ratio", type=float, default=0.2, help="share of transaction prompts")
+    parser.add_argument("--stream", action="store_true", help="send requests to /chat/stream")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds before a request fails")
+    parser.add_argument("--startup-timeout", type=float, default=600, help="seconds to wait for the app to be ready")
+    parser.add_argument("--seed", type=int, default=0)
+    stubs.add_arguments(parser)
+    parser.add_argument("--output", help="json file to write the results to")
+    parser.add_argument("--baseline", help="json results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="regression tolerated against the baseline")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,123 @@
+"""Measure the recall of quantized and IVF embedding search against the Chroma HNSW results.
+
+The embeddings of each collection are read from the Chroma database and indexed as
+float32, float16 and int8, exhaustively and with IVF lists. For each question, the
+top NUM_RETRIEVED_DOCUMENTS ids of every variant are compared with those of Chroma
+and with those of the exact float32 search, with the memory of every variant.
+
+Usage:
+    python -m benchmarks.quantized_search [--questions questions.json] [--ivf-lists N] [--nprobe N] [--output results.json]
+
+questions.json maps collection names to lists of questions, the demo questions are used by default.
+"""
+import argparse
+import json
+import math
+import time
+
+import numpy as np
+
+from benchmarks.rerank_pruning import DEFAULT_QUESTIONS
+from web3_copilot.common import constants
+from web3_copilot.doc_retrieval import VectorIndex
+from web3_copilot.doc_retrieval.config import Config
+
+
+def recall(ids, reference_ids) -> float:
+    return len(set(ids) & set(reference_ids)) / max(len(reference_ids), 1)
+
+
+def main(questions, ivf_lists: int, nprobe: int, output: str):
+    config = Config(
+        encoding_name=constants.ENCODING_NAME,
+        embedding_model_name=constants.EMBEDDING_MODEL_NAME,
+        cross_encoder_model_name=constants.CROSS_ENCODER_MODEL_NAME,
+    )
+    vector_store = config.initialize()
+    k = constants.NUM_RETRIEVED_DOCUMENTS
+
+    results = []
+    for collection_name, collection_questions in questions.items():
+        collection = vector_store.collection(collection_name)
+        stored = collection.get(include=["embeddings"])
+        ids = stored["ids"]
+        embeddings = np.asarray(stored["embeddings"], dtype=np.float32)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+        num_lists = ivf_lists or int(math.sqrt(len(ids)))
+        variants = {}
+        for dtype in ("float32", "float16", "int8"):
+            variants[dtype] = VectorIndex.build(embeddings, dtype=dtype)
+            variants[f"{dtype}_ivf"] = VectorIndex.build(embeddings, dtype=dtype, num_lists=num_lists)
+
+        queries = config.embedding_encoder.encode(
+            collection_questions, convert_to_numpy=True, normalize_embeddings=True
+        ).astype(np.float32)
+
+        for query, embedded_query in zip(collection_questions, queries):
+            start = time.perf_counter()
+            chroma_ids = collection.query(query_embeddings=[embedded_query.tolist()], n_results=k)["ids"][0]
+            chroma_seconds = time.perf_counter() - start
+
+            exact_ids = [ids[i] for i in variants["float32"].search(embedded_query[None, :], k)[0][0]]
+            result = {
+                "collection": collection_name,
+                "query": query,
+                "num_embeddings": len(ids),
+                "chroma_ms": chroma_seconds * 1000,
+                "chroma_recall_vs_exact": recall(chroma_ids, exact_ids),
+                "variants": {},
+            }
+            for name, index in variants.items():
+                start = time.perf_counter()
+                positions, _ = index.search(embedded_query[None, :], k, nprobe=nprobe)
+                seconds = time.perf_counter() - start
+                variant_ids = [ids[i] for i in positions[0] if i >= 0]
+                result["variants"][name] = {
+                    "recall_vs_chroma": recall(variant_ids, chroma_ids),
+                    "recall_vs_exact": recall(variant_ids, exact_ids),
+                    "search_ms": seconds * 1000,
+                    "bytes": index.nbytes(),
+                }
+            results.append(result)
+
+            print(f"{collection_name}: {query} ({len(ids)} embeddings, chroma {result['chroma_ms']:.1f}ms)")
+            for name, variant in result["variants"].items():
+                print(
+                    f"    {name:12} recall@{k} vs chroma {variant['recall_vs_chroma']:.3f}, "
+                    f"vs exact {variant['recall_vs_exact']:.3f}, "
+                    f"{variant['search_ms']:.2f}ms, {variant['bytes'] / 1e6:.1f}MB"
+                )
+
+    summary = {}
+    for name in results[0]["variants"] if results else []:
+        summary[name] = {
+            "mean_recall_vs_chroma": float(np.mean([r["variants"][name]["recall_vs_chroma"] for r in results])),
+            "mean_recall_vs_exact": float(np.mean([r["variants"][name]["recall_vs_exact"] for r in results])),
+            "mean_search_ms": float(np.mean([r["variants"][name]["search_ms"] for r in results])),
+        }
+        print(
+            f"{name:12} mean recall@{k} vs chroma {summary[name]['mean_recall_vs_chroma']:.3f}, "
+            f"vs exact {summary[name]['mean_recall_vs_exact']:.3f}, {summary[name]['mean_search_ms']:.2f}ms"
+        )
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"summary": summary, "results": results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", help="json file mapping collection names to questions")
+    parser.add_argument("--ivf-lists", type=int, default=0, help="IVF lists per collection, sqrt(#embeddings) by default")
+    parser.add_argument("--nprobe", type=int, default=constants.IVF_NPROBE, help="IVF lists probed per query")
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+
+    if args.questions:
+        with open(args.questions, "r") as f:
+            eval_questions = json.load(f)
+    else:
+        eval_questions = DEFAULT_QUESTIONS
+
+    main(eval_questions, args.ivf_lists, args.nprobe, args.output)
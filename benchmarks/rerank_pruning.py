@@ -0,0 +1,132 @@
+"""Evaluate adaptive reranking against reranking every retrieved candidate.
+
+For each question, the top ranked documents of both modes are compared and the
+pairs scored by the cross-encoder are counted, reporting the hit-rate tradeoff
+of candidate pruning and early stopping.
+
+Usage:
+    python -m benchmarks.rerank_pruning [--questions questions.json] [--output results.json]
+
+questions.json maps collection names to lists of questions, the demo questions are used by default.
+"""
+import argparse
+import json
+import time
+
+from web3_copilot.common import constants
+from web3_copilot.doc_retrieval import Retriever
+from web3_copilot.doc_retrieval.config import Config
+
+DEFAULT_QUESTIONS = {
+    "uniswap": [
+        "What is Uniswap?",
+        "What is soft governance in Uniswap?",
+    ],
+    "avalanche": [
+        "How is Avalanche different from Ethereum?",
+        "What is the X-Chain and how is it different from the C-Chain?",
+    ],
+    "cosmos": [
+        "Why would one use the Cosmos SDK?",
+        "How do I setup the keyring for my Cosmos Node?",
+    ],
+    "polygon": [
+        "Is Polygon a layer 2 blockchain or a layer 1 blockchains?",
+        "What are Polygon supernets?",
+    ],
+}
+
+
+def rank(retriever: Retriever, query: str, db_results, adaptive: bool):
+    num_pairs = 0
+    predict = retriever.reranker.predict
+
+    def counting_predict(sentence_pairs):
+        nonlocal num_pairs
+        num_pairs += len(sentence_pairs)
+        return predict(sentence_pairs)
+
+    retriever.reranker.predict = counting_predict
+    start = time.perf_counter()
+    try:
+        if adaptive:
+            ranked_results = retriever._rank_results_adaptive(
+                query, retriever._prune_candidates(db_results), constants.NUM_TOP_RANKED_DOCUMENTS
+            )
+        else:
+            ranked_results = retriever._rank_results(
+                query, db_results, constants.NUM_TOP_RANKED_DOCUMENTS
+            )
+    finally:
+        retriever.reranker.predict = predict
+
+    return ranked_results["ids"][0], num_pairs, time.perf_counter() - start
+
+
+def main(questions, output):
+    config = Config(
+        encoding_name=constants.ENCODING_NAME,
+        embedding_model_name=constants.EMBEDDING_MODEL_NAME,
+        cross_encoder_model_name=constants.CROSS_ENCODER_MODEL_NAME,
+    )
+    vector_store = config.initialize()
+    retriever = Retriever(config)
+
+    results = []
+    for collection_name, collection_questions in questions.items():
+        collection = vector_store.collection(collection_name)
+        for query in collection_questions:
+            db_results = retriever._query_db(query, constants.NUM_RETRIEVED_DOCUMENTS, collection)
+            full_ids, full_pairs, full_time = rank(retriever, query, db_results, adaptive=False)
+            adaptive_ids, adaptive_pairs, adaptive_time = rank(retriever, query, db_results, adaptive=True)
+
+            result = {
+                "collection": collection_name,
+                "query": query,
+                "recall_at_k": len(set(full_ids) & set(adaptive_ids)) / max(len(full_ids), 1),
+                "top_1_match": bool(full_ids) and bool(adaptive_ids) and full_ids[0] == adaptive_ids[0],
+                "full_pairs": full_pairs,
+                "adaptive_pairs": adaptive_pairs,
+                "full_seconds": full_time,
+                "adaptive_seconds": adaptive_time,
+            }
+            results.append(result)
+            print(
+                f"{collection_name}: {query}\n"
+                f"    recall@{constants.NUM_TOP_RANKED_DOCUMENTS} {result['recall_at_k']:.2f}, "
+                f"top-1 match {result['top_1_match']}, "
+                f"pairs {full_pairs} -> {adaptive_pairs}, "
+                f"rerank {full_time * 1000:.0f}ms -> {adaptive_time * 1000:.0f}ms"
+            )
+
+    summary = {
+        "num_questions": len(results),
+        "mean_recall_at_k": sum(r["recall_at_k"] for r in results) / max(len(results), 1),
+        "top_1_match_rate": sum(r["top_1_match"] for r in results) / max(len(results), 1),
+        "full_pairs": sum(r["full_pairs"] for r in results),
+        "adaptive_pairs": sum(r["adaptive_pairs"] for r in results),
+    }
+    print(
+        f"mean recall@{constants.NUM_TOP_RANKED_DOCUMENTS} {summary['mean_recall_at_k']:.3f}, "
+        f"top-1 match rate {summary['top_1_match_rate']:.3f}, "
+        f"pairs scored {summary['full_pairs']} -> {summary['adaptive_pairs']}"
+    )
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"summary": summary, "results": results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", help="json file mapping collection names to questions")
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+
+    if args.questions:
+        with open(args.questions, "r") as f:
+            eval_questions = json.load(f)
+    else:
+        eval_questions = DEFAULT_QUESTIONS
+
+    main(eval_questions, args.output)
@@ -0,0 +1,262 @@
+"""Measure the latency of the doc retrieval path, from pdf ingestion to the prompt context.
+
+A synthetic pdf corpus is written to a temporary directory, or --data-dir is used, and
+ingested through the PdfExtractor and the Encoder into a Chroma database or a numpy
+index artifact. Queries are then run stage by stage as in Retriever.retrieve_docs:
+query embedding, vector query, rerank and context build, with cold retriever caches.
+
+Reported: p50/p95/p99 latency of every stage and of retrieve_docs, ingestion throughput
+in chunks/sec and the peak RSS of the process and of the extraction workers.
+
+With --models stand-in (the default), tiny stand-in models from benchmarks/fixtures.py are
+used and no network is needed. With --models local, the configured models are loaded from
+the local Hugging Face cache, offline.
+
+With --baseline, the run fails if a stage p95 or the ingestion throughput regressed
+by more than --tolerance against the results of a previous run.
+
+Usage:
+    python -m benchmarks.retrieval_latency [--models stand-in|local] [--store chroma|numpy] [--data-dir DIR]
+        [--docs N] [--pages N] [--queries N] [--hybrid] [--output results.json] [--baseline results.json]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from pypdf import PdfReader
+
+from benchmarks import fixtures
+from web3_copilot.common import constants
+from web3_copilot.common.utils import create_file_dict
+from web3_copilot.doc_retrieval import PdfExtractor, Retriever, VectorStore, build_artifact
+from web3_copilot.doc_retrieval.config import Config
+
+STAGES = ("embed", "vector_query", "rerank", "context_build", "total", "retrieve_docs")
+
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(who).ru_maxrss * scale / 1e6
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    return {
+        f"p{q}_ms": float(np.percentile(latencies, q)) * 1000 if latencies else 0.0
+        for q in (50, 95, 99)
+    }
+
+
+def corpus_sentences(data_dir: str) -> Dict[str, List[str]]:
+    """Function to read the lines of the pdfs of every index, to train the stand-in tokenizer and draw queries."""
+    sentences = {}
+    for index, files in create_file_dict(data_dir).items():
+        sentences[index] = []
+        for file in files:
+            with open(os.path.join(data_dir, index, file), "rb") as f:
+                for page in PdfReader(f).pages:
+                    sentences[index].extend(PdfExtractor._split_text(page.extract_text()))
+    return sentences
+
+
+def make_config(models: str, work_dir: str, corpus_texts: List[str]) -> Config:
+    if models == "local":
+        # Models are only read from the local cache
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        os.environ["TRANSFORMERS_OFFLINE"] = "1"
+        return Config(
+            encoding_name=constants.ENCODING_NAME,
+            embedding_model_name=constants.EMBEDDING_MODEL_NAME,
+            cross_encoder_model_name=constants.CROSS_ENCODER_MODEL_NAME,
+        )
+
+    # Extraction workers are forked after the stand-in tokenizer is trained
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    config = Config(
+        encoding_name="whitespace",
+        embedding_model_name=fixtures.build_stand_in_tokenizer(corpus_texts, os.path.join(work_dir, "tokenizer")),
+        cross_encoder_model_name="stand-in",
+    )
+    config._embedding_encoder = fixtures.HashingEncoder()
+    config._cross_encoder_model = fixtures.OverlapCrossEncoder()
+    config._tokenizer = fixtures.WhitespaceEncoding()
+    return config
+
+
+def ingest(config: Config, store: str, data_dir: str, work_dir: str) -> Tuple[VectorStore, Dict[str, Any]]:
+    """Function to ingest the corpus, returning the vector store and the ingestion results."""
+    start = time.perf_counter()
+    if store == "numpy":
+        artifact_dir = os.path.join(work_dir, "artifact")
+        manifest = build_artifact(config, create_file_dict(data_dir), data_dir, artifact_dir)
+        num_chunks = sum(index["num_chunks"] for index in manifest["indices"].values())
+        seconds = time.perf_counter() - start
+        config.artifact_dir = artifact_dir
+        vector_store = config.initialize()
+    else:
+        constants.DATA_DIR = data_dir
+        constants.DB_PERSIST_DIR = os.path.join(work_dir, "chromadb")
+        constants.MANIFEST_DIR = os.path.join(work_dir, "manifest")
+        constants.LEXICAL_INDEX_DIR = os.path.join(work_dir, "lexical")
+        vector_store = config.initialize()
+        seconds = time.perf_counter() - start
+        num_chunks = sum(vector_store.collection(index).count() for index in config.index_names())
+
+    return vector_store, {
+        "num_chunks": num_chunks,
+        "seconds": seconds,
+        "chunks_per_sec": num_chunks / max(seconds, 1e-9),
+    }
+
+
+def time_stages(retriever: Retriever, collection, query: str) -> Dict[str, float]:
+    """Function to run the stages of Retriever.retrieve_docs one by one, with cold caches."""
+    retriever._embedding_cache.invalidate()
+    retriever.invalidate()
+    timings = {}
+
+    start = time.perf_counter()
+    embedded_query = retriever._embed_query(query)
+    timings["embed"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    db_results = retriever._query_db(query, retriever.num_candidates, collection, embedded_query=embedded_query)
+    timings["vector_query"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if retriever.adaptive_rerank:
+        ranked_results = retriever._rank_results_adaptive(
+            query, retriever._prune_candidates(db_results), constants.NUM_TOP_RANKED_DOCUMENTS
+        )
+    else:
+        ranked_results = retriever._rank_results(query, db_results, constants.NUM_TOP_RANKED_DOCUMENTS)
+    timings["rerank"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    retriever._build_context(ranked_results["documents"][0], ranked_results["metadatas"][0])
+    timings["context_build"] = time.perf_counter() - start
+    timings["total"] = sum(timings.values())
+
+    retriever._embedding_cache.invalidate()
+    retriever.invalidate()
+    start = time.perf_counter()
+    retriever.retrieve_docs(query=query, collection=collection)
+    timings["retrieve_docs"] = time.perf_counter() - start
+
+    return timings
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Function to list the stages whose p95 and the ingestion throughput regressed past tolerance."""
+    regressions = []
+    for stage, entry in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if previous and entry["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{stage} p95 {previous['p95_ms']:.2f}ms -> {entry['p95_ms']:.2f}ms")
+
+    previous = baseline.get("ingestion", {}).get("chunks_per_sec")
+    current = results["ingestion"]["chunks_per_sec"]
+    if previous and current < previous / (1 + tolerance):
+        regressions.append(f"ingestion {previous:.0f} -> {current:.0f} chunks/sec")
+    return regressions
+
+
+def main(args) -> int:
+    with tempfile.TemporaryDirectory(prefix="retrieval_latency-") as work_dir:
+        return run(args, work_dir)
+
+
+def run(args, work_dir: str) -> int:
+    rng = np.random.default_rng(args.seed)
+
+    data_dir = args.data_dir
+    if data_dir is None:
+        data_dir = os.path.join(work_dir, "data")
+        sentences = fixtures.build_corpus(
+            data_dir, num_indices=args.indices, docs_per_index=args.docs, pages_per_doc=args.pages, seed=args.seed
+        )
+    else:
+        sentences = corpus_sentences(data_dir)
+    constants.INGESTION_NUM_WORKERS = args.workers
+
+    config = make_config(args.models, work_dir, [s for texts in sentences.values() for s in texts])
+    vector_store, ingestion = ingest(config, args.store, data_dir, work_dir)
+    ingestion["peak_rss_mb"] = peak_rss_mb()
+    print(
+        f"ingested {ingestion['num_chunks']} chunks in {ingestion['seconds']:.2f}s "
+        f"({ingestion['chunks_per_sec']:.0f} chunks/sec)"
+    )
+
+    retriever = Retriever(config, hybrid=args.hybrid)
+    latencies = {stage: [] for stage in STAGES}
+    indices = list(sentences)
+    for i in range(args.warmup + args.queries):
+        index = indices[i % len(indices)]
+        # Unique queries: a sentence of the index with a query number
+        query = f"{sentences[index][rng.integers(len(sentences[index]))]} {i}"
+        timings = time_stages(retriever, vector_store.collection(index), query)
+        if i >= args.warmup:
+            for stage, seconds in timings.items():
+                latencies[stage].append(seconds)
+
+    results = {
+        "run": {
+            "models": args.models,
+            "store": args.store,
+            "hybrid": args.hybrid,
+            "adaptive_rerank": retriever.adaptive_rerank,
+            "num_candidates": retriever.num_candidates,
+            "queries": args.queries,
+            "corpus": args.data_dir or {"indices": args.indices, "docs": args.docs, "pages": args.pages},
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "created_at": time.time(),
+        },
+        "ingestion": ingestion,
+        "stages": {stage: percentiles(values) for stage, values in latencies.items()},
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_workers_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+    for stage, entry in results["stages"].items():
+        print(f"{stage:14} p50 {entry['p50_ms']:8.2f}ms  p95 {entry['p95_ms']:8.2f}ms  p99 {entry['p99_ms']:8.2f}ms")
+    print(f"peak RSS {results['peak_rss_mb']:.0f}MB, extraction workers {results['peak_rss_workers_mb']:.0f}MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", choices=("stand-in", "local"), default="stand-in")
+    parser.add_argument("--store", choices=("chroma", "numpy"), default="chroma")
+    parser.add_argument("--data-dir", help="directory of pdfs, one subdirectory per index, a synthetic corpus by default")
+    parser.add_argument("--indices", type=int, default=2, help="indices of the synthetic corpus")
+    parser.add_argument("--docs", type=int, default=4, help="pdfs per index of the synthetic corpus")
+    parser.add_argument("--pages", type=int, default=10, help="pages per pdf of the synthetic corpus")
+    parser.add_argument("--workers", type=int, default=1, help="pdf extraction worker processes")
+    parser.add_argument("--queries", type=int, default=200, help="timed queries")
+    parser.add_argument("--warmup", type=int, default=10, help="queries run before timing")
+    parser.add_argument("--hybrid", action="store_true", help="hybrid BM25 and embedding retrieval")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="json file to write the results to")
+    parser.add_argument("--baseline", help="json results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="regression tolerated against the baseline")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,289 @@
+"""Stand-in servers of the external APIs of the agent, for load tests without paid API calls.
+
+One app serves:
+- POST /v1/chat/completions: the OpenAI chat API. The controller is answered with the chain of the
+  prompt, the evaluator with a grade per answer, and skills with an answer of --answer-tokens words,
+  streamed when requested.
+- POST /tenderly: the `tenderly_traceTransaction` JSON-RPC method, a synthetic trace of --trace-steps
+  steps or a recorded trace.
+- GET /etherscan/api: the Etherscan `getsourcecode` action, a synthetic source of --source-bytes bytes
+  or a recorded source.
+
+Recorded traces are json files holding a `tenderly_traceTransaction` JSON-RPC response or its `result`,
+as for benchmarks/trace_compaction.py, served in turn whatever the transaction hash. Recorded sources
+are json files named after the contract address, holding a `getsourcecode` response or its `result`.
+
+Usage:
+    python -m benchmarks.stubs [--port 8900] [--llm-latency-ms 500] [--traces DIR] [--sources DIR]
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from benchmarks.fixtures import WORDS
+
+TX_HASH_PATTERN = re.compile(r"0x[a-fA-F0-9]{64}")
+CHAIN_NAME_PATTERN = re.compile(r"^name: ([^;\n]+);", re.MULTILINE)
+
+
+@dataclass
+class StubConfig:
+    # Seconds before the first byte of a response, and between streamed tokens
+    llm_latency: float = 0.5
+    llm_token_latency: float = 0.01
+    answer_tokens: int = 200
+    tenderly_latency: float = 0.3
+    trace_steps: int = 500
+    etherscan_latency: float = 0.1
+    source_bytes: int = 20_000
+    # Distinct contracts called by the synthetic traces
+    contracts: int = 8
+    traces_dir: Optional[str] = None
+    sources_dir: Optional[str] = None
+
+
+def _address(seed: str) -> str:
+    return "0x" + hashlib.md5(seed.encode("utf-8")).hexdigest()[:40].rjust(40, "0")
+
+
+def synthetic_trace(tx_hash: str, num_steps: int, num_contracts: int) -> Dict[str, Any]:
+    """Function to build a failed transaction trace calling num_contracts contracts in num_steps steps."""
+    rng = np.random.default_rng(int(tx_hash[2:18], 16))
+    contracts = [_address(f"contract{i}") for i in range(num_contracts)]
+    sender = _address(tx_hash)
+    steps = []
+    for i in range(num_steps):
+        to = contracts[rng.integers(num_contracts)]
+        step = {
+            "type": rng.choice(["CALL", "STATICCALL", "STATICCALL", "DELEGATECALL"]),
+            "from": contracts[0] if i else sender,
+            "to": to,
+            "value": "0x0",
+            "gas": hex(int(rng.integers(30_000, 300_000))),
+            "gasUsed": hex(int(rng.integers(1_000, 30_000))),
+            "input": "0x70a08231" + "0" * 24 + to[2:],
+            "output": "0x" + "0" * 63 + "1",
+            "traceAddress": [int(x) for x in rng.integers(0, 4, size=int(rng.integers(0, 4)))],
+        }
+        if i == 0:
+            step["decodedInput"] = [{"soltype": {"name": "amount", "type": "uint256"}, "value": "1000"}]
+        steps.append(step)
+    steps[-1].update({"type": "CALL", "error": "execution reverted", "errorReason": "STF"})
+
+    return {
+        "status": False,
+        "type": "CALL",
+        "from": sender,
+        "to": contracts[0],
+        "value": "0x0",
+        "gas": "0x493e0",
+        "gasUsed": "0x2d3f1",
+        "blockNumber": "0x112a880",
+        "transactionHash": tx_hash,
+        "error": "execution reverted",
+        "errorReason": "STF",
+        "trace": steps,
+    }
+
+
+def synthetic_source(address: str, num_bytes: int) -> List[Dict[str, Any]]:
+    name = f"Contract{address[-6:]}"
+    function = "    function f{i}(uint256 amount) external returns (uint256) {{ return amount * {i}; }}\n"
+    lines = [f"pragma solidity ^0.8.0;\n\ncontract {name} {{\n"]
+    size = len(lines[0])
+    for i in itertools.count():
+        if size >= num_bytes:
+            break
+        lines.append(function.format(i=i))
+        size += len(lines[-1])
+    lines.append("}\n")
+    return [{"ContractName": name, "SourceCode": "".join(lines), "CompilerVersion": "v0.8.19"}]
+
+
+class StubServer:
+    """The stand-in APIs, with counts of the requests served by each."""
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.requests = {"llm": 0, "tenderly": 0, "etherscan": 0}
+        self._traces = []
+        if config.traces_dir:
+            for path in sorted(glob.glob(os.path.join(config.traces_dir, "*.json"))):
+                with open(path, "r") as f:
+                    trace = json.load(f)
+                self._traces.append(trace.get("result", trace))
+        self._next_trace = itertools.count()
+        self.app = Starlette(
+            routes=[
+                Route("/v1/chat/completions", self.chat_completions, methods=["POST"]),
+                Route("/tenderly", self.tenderly, methods=["POST"]),
+                Route("/etherscan/api", self.etherscan),
+                Route("/stats", self.stats),
+            ]
+        )
+
+    async def chat_completions(self, request: Request):
+        self.requests["llm"] += 1
+        payload = await request.json()
+        answer = self._answer(payload["messages"])
+        await asyncio.sleep(self.config.llm_latency)
+
+        usage = {
+            "prompt_tokens": sum(len(m["content"].split()) for m in payload["messages"]),
+            "completion_tokens": len(answer),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if payload.get("stream"):
+            include_usage = (payload.get("stream_options") or {}).get("include_usage", False)
+            return StreamingResponse(self._stream(answer, usage if include_usage else None), media_type="text/event-stream")
+
+        await asyncio.sleep(self.config.llm_token_latency * len(answer))
+        return JSONResponse({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(answer)},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    async def _stream(self, tokens: List[str], usage: Optional[Dict[str, int]]):
+        for token in tokens:
+            chunk = {"choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(self.config.llm_token_latency)
+        if usage is not None:
+            yield f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    def _answer(self, messages: List[Dict[str, str]]) -> List[str]:
+        """Function to answer as the LLM would for the controller, the evaluator and the skills, token by token."""
+        prompt = messages[-1]["content"]
+        if prompt.startswith("Score categories for:"):
+            chains = CHAIN_NAME_PATTERN.findall(messages[0]["content"])
+            if TX_HASH_PATTERN.search(prompt):
+                chain = next((name for name in chains if name.startswith("txn_debugger")), chains[0])
+            else:
+                chain = next((name for name in chains if name.split("_")[0] in prompt.lower()), chains[0])
+            return [f"Name: {chain}<->Score: 9<->Instructions: none<->Justification: stub"]
+        if prompt.startswith("# The question to grade is:"):
+            num_answers = prompt.count("\nAnswer #")
+            if num_answers == 0:
+                return ["grade: 8.0"]
+            return ["\n".join(f"grade #{i + 1}: 8.0" for i in range(num_answers))]
+
+        rng = np.random.default_rng(len(prompt))
+        return [f" {word}" for word in rng.choice(WORDS, self.config.answer_tokens)]
+
+    async def tenderly(self, request: Request):
+        self.requests["tenderly"] += 1
+        body = await request.json()
+        tx_hash = body["params"][0]
+        if self._traces:
+            trace = dict(self._traces[next(self._next_trace) % len(self._traces)], transactionHash=tx_hash)
+        else:
+            trace = synthetic_trace(tx_hash, self.config.trace_steps, self.config.contracts)
+        await asyncio.sleep(self.config.tenderly_latency)
+        return JSONResponse({"jsonrpc": "2.0", "id": body.get("id"), "result": trace})
+
+    async def etherscan(self, request: Request):
+        self.requests["etherscan"] += 1
+        address = request.query_params.get("address", "").lower()
+        path = os.path.join(self.config.sources_dir or "", f"{address}.json")
+        if self.config.sources_dir and os.path.exists(path):
+            with open(path, "r") as f:
+                source = json.load(f)
+            result = source.get("result", source) if isinstance(source, dict) else source
+        else:
+            result = synthetic_source(address, self.config.source_bytes)
+        await asyncio.sleep(self.config.etherscan_latency)
+        return JSONResponse({"status": "1", "message": "OK", "result": result})
+
+    async def stats(self, request: Request):
+        return JSONResponse(self.requests)
+
+
+def serve_in_thread(app, port: int, host: str = "127.0.0.1"):
+    """Function to serve app on a daemon thread, returning the uvicorn server once it accepts connections."""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="stubs", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--llm-latency-ms", type=float, default=500, help="LLM time to first token")
+    parser.add_argument("--llm-token-ms", type=float, default=10, help="LLM time per answer token")
+    parser.add_argument("--answer-tokens", type=int, default=200, help="tokens of the answers of skills")
+    parser.add_argument("--tenderly-latency-ms", type=float, default=300)
+    parser.add_argument("--trace-steps", type=int, default=500, help="steps of the synthetic traces")
+    parser.add_argument("--etherscan-latency-ms", type=float, default=100)
+    parser.add_argument("--source-bytes", type=int, default=20_000, help="bytes of the synthetic sources")
+    parser.add_argument("--contracts", type=int, default=8, help="contracts called by the synthetic traces")
+    parser.add_argument("--traces", help="directory of recorded traces to replay")
+    parser.add_argument("--sources", help="directory of recorded sources to replay, one <address>.json per contract")
+
+
+def config_from_args(args) -> StubConfig:
+    return StubConfig(
+        llm_latency=args.llm_latency_ms / 1000,
+        llm_token_latency=args.llm_token_ms / 1000,
+        answer_tokens=args.answer_tokens,
+        tenderly_latency=args.tenderly_latency_ms / 1000,
+        trace_steps=args.trace_steps,
+        etherscan_latency=args.etherscan_latency_ms / 1000,
+        source_bytes=args.source_bytes,
+        contracts=args.contracts,
+        traces_dir=args.traces,
+        sources_dir=args.sources,
+    )
+
+
+def environment(port: int, host: str = "127.0.0.1") -> Dict[str, str]:
+    """Function to return the environment variables pointing the agent to the stand-in servers."""
+    base = f"http://{host}:{port}"
+    return {
+        "OPENAI_API_BASE": f"{base}/v1",
+        "OPENAI_API_KEY": "stub",
+        "ETH_MAINNET_URL": f"{base}/tenderly",
+        "TENDERLY_API_KEY": "stub",
+        "ETHERSCAN_API": f"{base}/etherscan/api",
+        "ETHERSCAN_API_KEY": "stub",
+        # The stand-in has no rate limit
+        "ETHERSCAN_RATE_LIMIT": "1000",
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    for name, value in environment(args.port).items():
+        print(f"{name}={value}")
+    uvicorn.run(StubServer(config_from_args(args)).app, host="127.0.0.1", port=args.port, log_level="warning")
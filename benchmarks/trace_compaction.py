@@ -0,0 +1,72 @@
+"""Compare the raw transaction trace put in the txn debugger prompt with the compacted trace.
+
+Recorded traces are json files holding either a `tenderly_traceTransaction`
+JSON-RPC response or its `result`.
+
+Usage:
+    python -m benchmarks.trace_compaction path/to/traces/ [--output results.json]
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+import tiktoken
+
+from web3_copilot.common import constants
+from web3_copilot.txn_debugger import compact_trace, to_prompt_json
+
+
+def load_trace(path: str):
+    with open(path, "r") as f:
+        trace = json.load(f)
+    return trace.get("result", trace)
+
+
+def main(trace_dir: str, output: str):
+    tokenizer = tiktoken.get_encoding(constants.ENCODING_NAME)
+
+    results = []
+    for path in sorted(glob.glob(os.path.join(trace_dir, "*.json"))):
+        trace = load_trace(path)
+
+        start = time.perf_counter()
+        raw_message = f"{ {'transaction_trace': trace} }"
+        raw_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        summary, compactor = compact_trace(trace, tokenizer, constants.TRACE_TOKEN_LIMIT)
+        compact_message = to_prompt_json({"transaction_trace": summary})
+        compact_seconds = time.perf_counter() - start
+
+        result = {
+            "trace": os.path.basename(path),
+            "steps": compactor.num_steps,
+            "kept_steps": len(summary["trace"]),
+            "raw_bytes": len(raw_message.encode("utf-8")),
+            "compact_bytes": len(compact_message.encode("utf-8")),
+            "raw_tokens": len(tokenizer.encode_ordinary(raw_message)),
+            "compact_tokens": len(tokenizer.encode_ordinary(compact_message)),
+            "raw_build_ms": raw_seconds * 1000,
+            "compact_build_ms": compact_seconds * 1000,
+        }
+        results.append(result)
+        print(
+            f"{result['trace']}: {result['steps']} steps -> {result['kept_steps']}, "
+            f"{result['raw_bytes']} -> {result['compact_bytes']} bytes, "
+            f"{result['raw_tokens']} -> {result['compact_tokens']} tokens, "
+            f"build {result['raw_build_ms']:.1f}ms -> {result['compact_build_ms']:.1f}ms"
+        )
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace_dir", help="directory of recorded trace json files")
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+    main(args.trace_dir, args.output)
@@ -0,0 +1,109 @@
+"""Compare the query latency of the Chroma and numpy vector store backends.
+
+The same questions are embedded once and sent to the Chroma database and to the
+numpy store serving a prebuilt index artifact (see ingest.py), one question per
+query and all the questions of a collection in a single batched query. The top
+NUM_RETRIEVED_DOCUMENTS ids of the numpy store are compared with those of Chroma.
+
+Usage:
+    python -m benchmarks.vector_stores [--artifact path/to/artifact] [--questions questions.json] [--repeat N] [--output results.json]
+
+questions.json maps collection names to lists of questions, the demo questions are used by default.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.rerank_pruning import DEFAULT_QUESTIONS
+from web3_copilot.common import constants
+from web3_copilot.doc_retrieval import NumpyVectorStore, VectorStore
+from web3_copilot.doc_retrieval.config import Config
+
+
+def timed_query(store: VectorStore, name: str, queries, k: int, repeat: int):
+    """Function to query a collection repeat times, returning the ids and the latencies in ms."""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = store.query(name, queries, n_results=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return output["ids"], latencies
+
+
+def percentiles(latencies):
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def main(artifact: str, questions, repeat: int, output: str):
+    config = Config(
+        encoding_name=constants.ENCODING_NAME,
+        embedding_model_name=constants.EMBEDDING_MODEL_NAME,
+        cross_encoder_model_name=constants.CROSS_ENCODER_MODEL_NAME,
+    )
+    chroma_store = config.initialize()
+    numpy_store = NumpyVectorStore(artifact)
+    numpy_store.load(config.embedding_identity, context_encoding=config.encoding_name)
+    stores = {"chroma": chroma_store, "numpy": numpy_store}
+    k = constants.NUM_RETRIEVED_DOCUMENTS
+
+    results = []
+    for collection_name, collection_questions in questions.items():
+        queries = config.embedding_encoder.encode(
+            collection_questions, convert_to_numpy=True, normalize_embeddings=True
+        ).astype(np.float32).tolist()
+
+        result = {"collection": collection_name, "num_questions": len(queries), "backends": {}}
+        ids = {}
+        for backend, store in stores.items():
+            single_latencies = []
+            ids[backend] = []
+            for query in queries:
+                query_ids, latencies = timed_query(store, collection_name, [query], k, repeat)
+                ids[backend].append(query_ids[0])
+                single_latencies.extend(latencies)
+            _, batch_latencies = timed_query(store, collection_name, queries, k, repeat)
+
+            result["backends"][backend] = {
+                "count": store.collection(collection_name).count(),
+                "single": percentiles(single_latencies),
+                "batch": percentiles(batch_latencies),
+            }
+
+        result["numpy_overlap_vs_chroma"] = float(np.mean([
+            len(set(numpy_ids) & set(chroma_ids)) / max(len(chroma_ids), 1)
+            for numpy_ids, chroma_ids in zip(ids["numpy"], ids["chroma"])
+        ]))
+        results.append(result)
+
+        print(f"{collection_name}: {len(queries)} questions, overlap@{k} {result['numpy_overlap_vs_chroma']:.3f}")
+        for backend, entry in result["backends"].items():
+            print(
+                f"    {backend:6} {entry['count']} chunks, single p50 {entry['single']['p50_ms']:.2f}ms "
+                f"p95 {entry['single']['p95_ms']:.2f}ms, batch of {len(queries)} p50 {entry['batch']['p50_ms']:.2f}ms"
+            )
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"results": results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--artifact", default=constants.INDEX_ARTIFACT_DIR, help="index artifact built by ingest.py")
+    parser.add_argument("--questions", help="json file mapping collection names to questions")
+    parser.add_argument("--repeat", type=int, default=20, help="times each query is timed")
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+
+    if args.questions:
+        with open(args.questions, "r") as f:
+            eval_questions = json.load(f)
+    else:
+        eval_questions = DEFAULT_QUESTIONS
+
+    main(args.artifact, eval_questions, args.repeat, args.output)
@@ -0,0 +1,33 @@
+"""Pre-fork serving of the ASGI app.
+
+The app is loaded once in the master process: models, tokenizers and indices are
+shared copy-on-write by the workers, and the Chroma store is owned by a single
+process the workers query over a local socket.
+
+Usage:
+    gunicorn -c gunicorn.conf.py asgi:app
+"""
+import gc
+import os
+
+bind = os.environ.get("BIND", "127.0.0.1:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Read by asgi.py when the app is preloaded
+os.environ["SHARED_STORE"] = "true"
+# HF tokenizers must not start their thread pool before the workers are forked
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+
+def when_ready(server):
+    # Objects of the preloaded app are left alone by the garbage collector of the
+    # workers, which would otherwise write to, and copy, the pages holding them
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Spans timed by the master while loading the app would be counted again by every worker
+    from web3_copilot.common import tracing
+    tracing.metrics.reset()
@@ -0,0 +1,53 @@
+"""Build a prebuilt index artifact from the pdfs of the data directory.
+
+Documents are extracted, chunked and embedded offline, then written with the
+fingerprints of the embedding model and tokenizer. Serve the artifact with
+`INDEX_ARTIFACT=<output> uvicorn asgi:app` instead of ingesting on every node.
+
+Embeddings may be stored as float16 or int8 to shrink the artifact, and
+grouped in IVF lists so that queries only score the closest lists.
+
+Usage:
+    python ingest.py [--data-dir DIR] [--output DIR] [--dtype {float32,float16,int8}] [--ivf-lists N]
+"""
+import argparse
+import time
+
+from web3_copilot.common import constants
+from web3_copilot.common.utils import create_file_dict
+from web3_copilot.doc_retrieval import build_artifact
+from web3_copilot.doc_retrieval.config import Config
+from web3_copilot.doc_retrieval.vector_index import STORAGE_DTYPES
+
+
+def main(data_dir: str, output: str, dtype: str, ivf_lists: int):
+    start = time.perf_counter()
+    config = Config(
+        encoding_name=constants.ENCODING_NAME,
+        embedding_model_name=constants.EMBEDDING_MODEL_NAME,
+        cross_encoder_model_name=constants.CROSS_ENCODER_MODEL_NAME,
+    )
+
+    manifest = build_artifact(
+        config, create_file_dict(data_dir), data_dir, output, dtype=dtype, num_lists=ivf_lists
+    )
+    num_chunks = sum(index["num_chunks"] for index in manifest["indices"].values())
+    print(
+        f"index artifact written to {output}: {len(manifest['indices'])} indices, "
+        f"{num_chunks} chunks in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=constants.DATA_DIR, help="directory of one pdf subdirectory per index")
+    parser.add_argument("--output", default=constants.INDEX_ARTIFACT_DIR, help="directory to write the artifact to")
+    parser.add_argument(
+        "--dtype", default=constants.INDEX_ARTIFACT_DTYPE, choices=STORAGE_DTYPES, help="storage of the embeddings"
+    )
+    parser.add_argument(
+        "--ivf-lists", type=int, default=constants.INDEX_ARTIFACT_IVF_LISTS,
+        help="number of IVF lists per index, 0 searches every embedding"
+    )
+    args = parser.parse_args()
+    main(args.data_dir, args.output, args.dtype, args.ivf_lists)
@@ -0,0 +1,62 @@
+import time
+
+import numpy as np
+from council.agents import AgentResult
+from council.contexts import ChatMessage, ScoredChatMessage
+
+from web3_copilot.answer_cache import SemanticAnswerCache
+
+
+class StubRetriever:
+    """Embeds the prompts of a fixed table."""
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def _embed_query(self, prompt):
+        return self.embeddings[prompt]
+
+
+def agent_result(answer: str) -> AgentResult:
+    return AgentResult([ScoredChatMessage(ChatMessage.agent(answer), 1.0)])
+
+
+def make_cache(**kwargs) -> SemanticAnswerCache:
+    retriever = StubRetriever({
+        "what is uniswap?": [1.0, 0.0, 0.0],
+        "explain uniswap": [0.99, 0.1, 0.0],
+        "uniswap?": [1.0, 0.02, 0.0],
+        "what is cosmos?": [0.0, 1.0, 0.0],
+    })
+    return SemanticAnswerCache(retriever, version=lambda: "v1", max_size=4, min_similarity=0.9, **kwargs)
+
+
+def test_similar_prompt_is_served():
+    cache = make_cache()
+    cache.put("what is uniswap?", agent_result("uniswap"))
+
+    assert cache.get("explain uniswap").best_message.message == "uniswap"
+    assert cache.get("what is cosmos?") is None
+
+
+def test_expired_best_entry_falls_back_to_next_best():
+    cache = make_cache(ttl=60)
+    cache.put("what is uniswap?", agent_result("old"))
+    cache.put("explain uniswap", agent_result("fresh"))
+    # The most similar entry to "uniswap?" is "what is uniswap?", expire it
+    slot = next(slot for slot, entry in cache._entries.items() if entry[1] == "what is uniswap?")
+    stored, prompt, result = cache._entries[slot]
+    cache._entries[slot] = (time.monotonic() - 120, prompt, result)
+
+    assert cache.get("uniswap?").best_message.message == "fresh"
+    assert len(cache._entries) == 1
+
+
+def test_version_change_drops_entries():
+    version = ["v1"]
+    cache = SemanticAnswerCache(StubRetriever({"a": np.array([1.0, 0.0])}), version=lambda: version[0], max_size=2)
+    cache.put("a", agent_result("answer"))
+    version[0] = "v2"
+
+    assert cache.get("a") is None
+    assert cache.stats()["invalidations"] == 1
@@ -0,0 +1,137 @@
+import json
+import logging
+import shutil
+
+import numpy as np
+import pytest
+
+from web3_copilot.doc_retrieval import VectorIndex
+from web3_copilot.doc_retrieval.artifact import (
+    ARTIFACT_MANIFEST,
+    ARTIFACT_VERSION,
+    CHUNKS_FILE,
+    EMBEDDINGS_NAME,
+    NumpyVectorStore,
+    WEIGHT_SAMPLE_BYTES,
+    embedding_model_identity,
+)
+
+IDENTITY = {"name": "sentence-transformers/all-MiniLM-L6-v2", "revision": None, "dimension": 4, "content": "abc123"}
+
+
+class StubModule:
+    def __init__(self, path=None, commit_hash=None):
+        config = type("Config", (), {"_name_or_path": path, "_commit_hash": commit_hash})
+        self.auto_model = type("AutoModel", (), {"config": config})()
+
+
+class StubEncoder(list):
+    """SentenceTransformer whose first module is the transformer, as far as the artifact is concerned."""
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return 4
+
+
+def write_artifact(path, manifest_updates=None) -> str:
+    index_dir = path / "docs"
+    index_dir.mkdir(parents=True)
+    VectorIndex.build(np.eye(4, dtype=np.float32)[:2]).save(str(index_dir), EMBEDDINGS_NAME)
+    with open(index_dir / CHUNKS_FILE, "w") as f:
+        for i in range(2):
+            f.write(json.dumps({"id": f"chunk-{i}", "text": f"text {i}", "metadata": {"page": i}}) + "\n")
+
+    manifest = {
+        "version": ARTIFACT_VERSION,
+        "embedding_model": dict(IDENTITY, fingerprint="weights"),
+        "tokenizer": {
+            "name": IDENTITY["name"], "revision": IDENTITY["revision"], "content": IDENTITY["content"], "fingerprint": "vocab",
+        },
+        "context_encoding": "cl100k_base",
+        "indices": {"docs": {"num_chunks": 2, "fingerprint": "content", "files": {}}},
+    }
+    manifest.update(manifest_updates or {})
+    with open(path / ARTIFACT_MANIFEST, "w") as f:
+        json.dump(manifest, f)
+    return str(path)
+
+
+def write_model(path, weights: bytes):
+    """Function to write a model directory as stored by sentence-transformers, without a hub revision."""
+    (path / "1_Pooling").mkdir(parents=True)
+    (path / "config.json").write_text('{"hidden_size": 4}')
+    (path / "1_Pooling" / "config.json").write_text('{"pooling_mode_mean_tokens": true}')
+    (path / "pytorch_model.bin").write_bytes(weights)
+    return StubEncoder([StubModule(str(path))])
+
+
+def test_embedding_model_identity(tmp_path):
+    weights = bytes(range(256)) * (3 * WEIGHT_SAMPLE_BYTES // 256)
+    identity = embedding_model_identity(IDENTITY["name"], write_model(tmp_path / "model", weights))
+
+    assert identity["revision"] is None and identity["dimension"] == 4
+    # Another copy of the same model, with other modification times
+    shutil.copytree(tmp_path / "model", tmp_path / "copy")
+    (tmp_path / "copy" / ".lock").write_text("")
+    copy = StubEncoder([StubModule(str(tmp_path / "copy"))])
+    assert embedding_model_identity(IDENTITY["name"], copy) == identity
+
+    # Other weights of the same size
+    retrained = write_model(tmp_path / "retrained", weights[:-1] + b"\x00")
+    assert embedding_model_identity(IDENTITY["name"], retrained)["content"] != identity["content"]
+
+    # A model not loaded from a local directory, or not a SentenceTransformer
+    assert embedding_model_identity("stand-in", StubEncoder([StubModule(commit_hash="abc")])) == {
+        "name": "stand-in", "revision": "abc", "dimension": 4, "content": None,
+    }
+    assert embedding_model_identity("stand-in", StubEncoder([object()]))["content"] is None
+
+
+def test_load_matching_artifact(tmp_path):
+    store = NumpyVectorStore(write_artifact(tmp_path))
+    store.load(dict(IDENTITY), context_encoding="cl100k_base")
+
+    results = store.collection("docs").query([[0.0, 1.0, 0.0, 0.0]], n_results=1)
+    batch = store.query("docs", [[0.0, 1.0, 0.0, 0.0], [1.0, 0.0, 0.0, 0.0]], n_results=2)
+
+    assert results["ids"] == [["chunk-1"]]
+    assert batch["ids"] == [["chunk-1", "chunk-0"], ["chunk-0", "chunk-1"]]
+    assert store.indices["docs"].version == "content"
+
+
+@pytest.mark.parametrize(
+    "key, value", [("name", "other/model"), ("revision", "def456"), ("dimension", 8), ("content", "def456"), ("content", None)]
+)
+def test_load_refuses_another_embedding_model(tmp_path, key, value):
+    store = NumpyVectorStore(write_artifact(tmp_path))
+
+    with pytest.raises(ValueError, match="another embedding model"):
+        store.load(dict(IDENTITY, **{key: value}), context_encoding="cl100k_base")
+    assert store.indices == {}
+
+
+def test_load_refuses_another_tokenizer(tmp_path):
+    tokenizer = {"name": IDENTITY["name"], "revision": None, "content": "def456", "fingerprint": "vocab"}
+    store = NumpyVectorStore(write_artifact(tmp_path, {"tokenizer": tokenizer}))
+
+    with pytest.raises(ValueError, match="another tokenizer"):
+        store.load(dict(IDENTITY), context_encoding="cl100k_base")
+
+
+def test_load_refuses_other_versions_and_encodings(tmp_path):
+    with pytest.raises(ValueError, match="version"):
+        NumpyVectorStore(write_artifact(tmp_path / "old", {"version": ARTIFACT_VERSION - 1})).load(dict(IDENTITY), "cl100k_base")
+
+    with pytest.raises(ValueError, match="p50k_base"):
+        NumpyVectorStore(write_artifact(tmp_path / "new")).load(dict(IDENTITY), "p50k_base")
+
+
+def test_load_warns_when_the_weights_cannot_be_verified(tmp_path, caplog):
+    identity = dict(IDENTITY, content=None)
+    tokenizer = {"name": IDENTITY["name"], "revision": None, "content": None, "fingerprint": "vocab"}
+    store = NumpyVectorStore(write_artifact(tmp_path, {"embedding_model": identity, "tokenizer": tokenizer}))
+
+    with caplog.at_level(logging.WARNING):
+        store.load(dict(identity), context_encoding="cl100k_base")
+
+    assert "not verified" in caplog.text
+    assert list(store.indices) == ["docs"]
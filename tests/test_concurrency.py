@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from web3_copilot.common.concurrency import LimitedStreamingResponse, RequestLimiter, RequestLimitExceeded
+
+SCOPE = {"type": "http", "method": "POST", "path": "/chat/stream", "headers": []}
+
+
+async def connected():
+    # The client stays connected
+    await asyncio.Event().wait()
+
+
+async def disconnected():
+    return {"type": "http.disconnect"}
+
+
+def test_requests_past_the_queue_are_rejected():
+    async def run():
+        limiter = RequestLimiter(max_concurrent=1, max_queued=0)
+        await limiter.acquire()
+        with pytest.raises(RequestLimitExceeded):
+            await limiter.acquire()
+        limiter.release()
+        await asyncio.wait_for(limiter.acquire(), 1)
+        return limiter.stats()
+
+    assert asyncio.run(run()) == {"running": 1, "queued": 0, "max_concurrent": 1, "max_queued": 0, "rejected": 1}
+
+
+def stream_with(receive, send, events):
+    """Function to send a streamed response holding the only slot of a limiter, returning the limiter after."""
+
+    async def run():
+        limiter = RequestLimiter(max_concurrent=1, max_queued=0)
+        await limiter.acquire()
+        response = LimitedStreamingResponse(events(), limiter, media_type="text/event-stream")
+        try:
+            await asyncio.wait_for(response(SCOPE, receive, send), 5)
+        except Exception:
+            # A failed send is raised, wrapped in an exception group by anyio
+            pass
+        return limiter
+
+    return asyncio.run(run())
+
+
+def test_slot_is_released_once_the_stream_ends():
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def events():
+        yield "event: result\n\n"
+
+    limiter = stream_with(connected, send, events)
+
+    assert sent[-2]["body"] == b"event: result\n\n"
+    assert limiter.stats()["running"] == 0
+    assert not limiter._semaphore.locked()
+
+
+def test_slot_is_released_when_the_stream_is_dropped_before_the_first_event():
+    started = []
+
+    async def send(message):
+        raise ConnectionError("client went away")
+
+    async def events():
+        started.append(True)
+        yield "event: result\n\n"
+
+    limiter = stream_with(connected, send, events)
+
+    assert started == []
+    assert limiter.stats()["running"] == 0
+
+
+def test_slot_is_released_when_the_client_disconnects():
+    closed = []
+
+    async def send(message):
+        pass
+
+    async def events():
+        try:
+            yield "event: route\n\n"
+            # The execution never finishes
+            await asyncio.Event().wait()
+            yield "event: result\n\n"
+        finally:
+            closed.append(True)
+
+    limiter = stream_with(disconnected, send, events)
+
+    assert closed == [True]
+    assert limiter.stats()["running"] == 0
+    assert not limiter._semaphore.locked()
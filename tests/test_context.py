@@ -0,0 +1,36 @@
+import pytest
+
+from web3_copilot.doc_retrieval.context import DOCUMENT_SEPARATOR, pack_documents
+
+DOCUMENTS = ["first", "second", "third", "fourth"]
+
+
+def packed(*documents: str) -> str:
+    return "".join(document + DOCUMENT_SEPARATOR for document in documents)
+
+
+def test_greedy_keeps_documents_until_the_first_that_does_not_fit():
+    # Sizes with the separator: 4, 9, 3, 2
+    context = pack_documents(DOCUMENTS, [3, 8, 2, 1], token_limit=10)
+
+    assert context == packed("first")
+
+
+def test_best_fit_fills_the_budget_keeping_the_rank_order():
+    context = pack_documents(DOCUMENTS, [3, 8, 2, 1], token_limit=10, strategy="best_fit")
+
+    assert context == packed("first", "third", "fourth")
+
+
+def test_documents_fitting_exactly_are_kept():
+    assert pack_documents(DOCUMENTS, [1, 1, 1, 1], token_limit=8, separator_tokens=1) == packed(*DOCUMENTS)
+    assert pack_documents(DOCUMENTS, [1, 1, 1, 1], token_limit=7, separator_tokens=1) == packed(*DOCUMENTS[:3])
+
+
+def test_no_document_fits():
+    assert pack_documents(DOCUMENTS, [10, 10, 10, 10], token_limit=5, strategy="best_fit") == ""
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        pack_documents(DOCUMENTS, [1, 1, 1, 1], token_limit=10, strategy="random")
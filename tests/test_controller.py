@@ -0,0 +1,30 @@
+from council.chains import Chain
+from council.contexts import AgentContext
+from council.mocks import MockLLM
+from council.skills import LLMSkill
+
+from web3_copilot.controller import FastRouterController
+from web3_copilot.skills import TransactionDebuggerSkill
+
+TX_HASH = "0xf6870204a21b88e47e5bc788852905669c61419d676a9a18bfa5a96e9928f70c"
+
+
+def make_controller() -> FastRouterController:
+    llm = MockLLM.from_responses(["Name: uniswap_doc_retrieval<->Score: 9<->Instructions: none<->Justification: -"])
+    chains = [
+        Chain("uniswap_doc_retrieval", "Uniswap documentation", [LLMSkill(llm)]),
+        Chain("txn_debugger_chain", "Debug Ethereum transactions", [LLMSkill(llm)]),
+    ]
+    return FastRouterController(chains, llm, retriever=None, txn_debugger_chain="txn_debugger_chain")
+
+
+def test_prompts_with_a_tx_hash_go_to_the_txn_debugger():
+    controller = make_controller()
+    # The hash is followed by a word character, as the transaction debugger accepts
+    prompt = f"Why did {TX_HASH}_tx fail?"
+
+    units = controller.execute(AgentContext.from_user_message(prompt))
+
+    assert [unit.chain.name for unit in units] == ["txn_debugger_chain"]
+    assert TransactionDebuggerSkill.extract_tx_hash(None, prompt) == TX_HASH
+    assert controller.stats()["tx_hash"] == 1
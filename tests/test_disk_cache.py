@@ -0,0 +1,89 @@
+import sqlite3
+
+from web3_copilot.common.disk_cache import DiskCache
+
+
+def entry_sizes(path):
+    with sqlite3.connect(path) as conn:
+        total = conn.execute("SELECT size FROM totals").fetchone()[0]
+        return total, conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+
+def accessed_at(path, key):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT accessed_at FROM entries WHERE key = ?", (key,)).fetchone()[0]
+
+
+def test_get_and_put(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), max_bytes=1 << 20)
+    cache.put("trace", "0xabc", {"steps": [1, 2, 3]})
+
+    assert cache.get("trace", "0xabc") == {"steps": [1, 2, 3]}
+    assert cache.get("source", "0xabc") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_expired_entries_are_dropped(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = DiskCache(path, max_bytes=1 << 20)
+    cache.put("source", "0xabc", [], ttl=-1)
+
+    assert cache.get("source", "0xabc") is None
+    assert entry_sizes(path) == (0, 0)
+
+
+def test_hits_only_record_the_access_time_past_the_resolution(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = DiskCache(path, max_bytes=1 << 20)
+    cache.put("trace", "0xabc", {"steps": []})
+    written_at = accessed_at(path, "0xabc")
+
+    cache.get("trace", "0xabc")
+    assert accessed_at(path, "0xabc") == written_at
+
+    cache.access_resolution = 0
+    cache.get("trace", "0xabc")
+    assert accessed_at(path, "0xabc") > written_at
+
+
+def test_total_size_is_kept_across_processes(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    # Two workers sharing the database
+    first, second = DiskCache(path, max_bytes=1 << 20), DiskCache(path, max_bytes=1 << 20)
+    first.put("trace", "a", "x" * 1000)
+    second.put("trace", "b", "y" * 10)
+    first.put("trace", "b", "y" * 5000)
+    second.get("trace", "b")
+
+    total, summed = entry_sizes(path)
+    assert total == summed == first.stats()["bytes"] == second.stats()["bytes"]
+    assert first.stats()["entries"] == 2
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    values = {key: bytes(range(256)).hex() * (i + 1) for i, key in enumerate("abc")}
+    cache = DiskCache(path, max_bytes=1 << 20, access_resolution=0)
+    for key, value in values.items():
+        cache.put("source", key, value)
+    cache.get("source", "a")
+
+    # Room for "a" and "c" only, "b" was used least recently
+    cache.max_bytes = entry_sizes(path)[0] - 1
+    cache.put("source", "c", values["c"])
+
+    assert cache.get("source", "b") is None
+    assert cache.get("source", "a") == values["a"] and cache.get("source", "c") == values["c"]
+    total, summed = entry_sizes(path)
+    assert total == summed <= cache.max_bytes
+
+
+def test_databases_without_totals_are_summed(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    DiskCache(path, max_bytes=1 << 20).put("trace", "a", "x" * 100)
+    with sqlite3.connect(path) as conn:
+        conn.execute("DROP TABLE totals")
+
+    cache = DiskCache(path, max_bytes=1 << 20)
+
+    assert cache.stats()["bytes"] == entry_sizes(path)[1] > 0
@@ -0,0 +1,121 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+import json
+import threading
+import time
+
+import pytest
+
+from benchmarks.load_test import free_port
+from web3_copilot.txn_debugger import EtherscanClient, RateLimiter
+
+
+class StubEtherscan(ThreadingHTTPServer):
+    """Local Etherscan API answering each address with its scripted responses in turn, the last one repeated."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubEtherscanHandler)
+        self.responses: Dict[str, List[tuple]] = {}
+        self.requests: List[str] = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/api"
+
+
+class StubEtherscanHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        address = parse_qs(urlparse(self.path).query)["address"][0]
+        self.server.requests.append(address)
+        responses = self.server.responses.get(address) or [(200, [{"ContractName": address, "SourceCode": ""}])]
+        status, result = responses.pop(0) if len(responses) > 1 else responses[0]
+        body = json.dumps({"status": "1", "message": "OK", "result": result}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def etherscan():
+    server = StubEtherscan()
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(url: str, **kwargs) -> EtherscanClient:
+    return EtherscanClient(url, "key", max_workers=4, requests_per_second=1000, retry_backoff=0.01, **kwargs)
+
+
+def test_sources_are_returned_in_the_order_of_the_addresses(etherscan):
+    addresses = [f"0x{i:040x}" for i in range(10)]
+
+    results = make_client(etherscan.url).get_source_codes(addresses)
+
+    assert [result[0]["ContractName"] for result in results] == addresses
+    assert sorted(etherscan.requests) == addresses
+
+
+def test_transient_errors_are_retried(etherscan):
+    etherscan.responses["0xa"] = [(500, "error"), (200, "Max rate limit reached"), (200, [{"ContractName": "A"}])]
+
+    assert make_client(etherscan.url).get_source_code("0xa") == [{"ContractName": "A"}]
+    assert etherscan.requests == ["0xa"] * 3
+
+
+def test_persistent_errors_fail_after_the_retries(etherscan):
+    etherscan.responses["0xa"] = [(503, "unavailable")]
+
+    assert make_client(etherscan.url, max_retries=2).get_source_code("0xa") is None
+    assert etherscan.requests == ["0xa"] * 3
+
+
+@pytest.mark.parametrize("response", [(200, "Invalid API Key"), (404, "not found")])
+def test_permanent_errors_are_not_retried(etherscan, response):
+    etherscan.responses["0xa"] = [response]
+
+    assert make_client(etherscan.url).get_source_code("0xa") is None
+    assert etherscan.requests == ["0xa"]
+
+
+def test_unreachable_api_returns_none():
+    client = make_client(f"http://127.0.0.1:{free_port()}/api", max_retries=1)
+
+    assert client.get_source_codes(["0xa", "0xb"]) == [None, None]
+
+
+def test_rate_limiter_spaces_out_calls_of_all_threads():
+    limiter = RateLimiter(rate=50)
+    starts = []
+    lock = threading.Lock()
+
+    def call():
+        for _ in range(3):
+            limiter.acquire()
+            with lock:
+                starts.append(time.monotonic())
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The first call starts right away, the 11 others one interval apart
+    assert len(starts) == 12
+    assert max(starts) - min(starts) >= 11 * 0.02 * 0.95
+
+
+def test_rate_limiter_without_rate_does_not_wait():
+    limiter = RateLimiter(rate=0)
+    start = time.monotonic()
+    for _ in range(100):
+        limiter.acquire()
+    assert time.monotonic() - start < 0.1
@@ -0,0 +1,68 @@
+from web3_copilot.doc_retrieval import LexicalIndex
+from web3_copilot.doc_retrieval.lexical import tokenize
+
+
+def make_index() -> LexicalIndex:
+    index = LexicalIndex()
+    index.upsert(
+        ["keyring", "gas", "swap"],
+        [
+            "Set the keyring-backend flag to test when you start a Cosmos node.",
+            "The eth_call method estimates the gas of a call without a transaction.",
+            "Uniswap swaps tokens from a pool, the pool price moves with every swap.",
+        ],
+    )
+    return index
+
+
+def test_tokenize_keeps_identifiers_whole_and_split():
+    assert tokenize("Use --keyring-backend and eth_call") == [
+        "use", "keyring-backend", "keyring", "backend", "and", "eth_call", "eth", "call",
+    ]
+
+
+def test_search_ranks_documents_with_the_query_terms():
+    index = make_index()
+
+    ids, scores = index.search("keyring-backend flag", k=3)
+
+    assert ids == ["keyring"]
+    assert scores[0] > 0
+    assert index.search("pool swap", k=3)[0][0] == "swap"
+    assert index.search("unknown terms", k=3) == ([], [])
+
+
+def test_search_returns_at_most_k_documents_best_first():
+    index = make_index()
+
+    ids, scores = index.search("the call of a pool", k=2)
+
+    assert len(ids) == 2
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_upsert_replaces_and_delete_removes_documents():
+    index = make_index()
+
+    index.upsert(["gas"], ["Gas fees are paid in ETH."])
+    assert index.search("estimates", k=3) == ([], [])
+    assert index.search("fees", k=3)[0] == ["gas"]
+
+    index.delete(["gas", "swap"])
+    assert len(index) == 1
+    assert index.search("fees pool", k=3) == ([], [])
+    assert index.search("keyring", k=3)[0] == ["keyring"]
+
+
+def test_save_and_load_keep_the_rankings(tmp_path):
+    index = make_index()
+    index.delete(["gas"])
+    path = str(tmp_path / "lexical" / "index.npz")
+
+    index.save(path)
+    loaded = LexicalIndex.load(path)
+
+    assert len(loaded) == 2
+    for query in ("keyring backend", "swap pool price", "gas"):
+        assert loaded.search(query, k=3) == index.search(query, k=3)
+    assert LexicalIndex.load(str(tmp_path / "missing.npz")) is None
@@ -0,0 +1,94 @@
+import json
+
+from web3_copilot.doc_retrieval.manifest import MANIFEST_VERSION, IngestionManifest
+
+
+def make_manifest(path: str) -> IngestionManifest:
+    manifest = IngestionManifest(path)
+    manifest.update_file("a.pdf", "hash-a", {"a-0": IngestionManifest.hash_chunk("alpha", {"page": 1})})
+    manifest.update_file("b.pdf", "hash-b", {
+        "b-0": IngestionManifest.hash_chunk("beta", {"page": 1}),
+        "b-1": IngestionManifest.hash_chunk("gamma", {"page": 2}),
+    })
+    return manifest
+
+
+def test_changed_and_removed_files(tmp_path):
+    manifest = make_manifest(str(tmp_path / "docs.json"))
+
+    file_hashes = {"a.pdf": "hash-a", "c.pdf": "hash-c"}
+
+    assert manifest.changed_files(file_hashes) == ["c.pdf"]
+    assert manifest.removed_files(file_hashes) == ["b.pdf"]
+    assert manifest.changed_files({"a.pdf": "hash-a2", "b.pdf": "hash-b"}) == ["a.pdf"]
+
+
+def test_chunks_and_fingerprint(tmp_path):
+    manifest = make_manifest(str(tmp_path / "docs.json"))
+    fingerprint = manifest.fingerprint()
+
+    assert manifest.num_chunks() == 3
+    assert manifest.chunk_ids("b.pdf") == {"b-0", "b-1"}
+    assert manifest.chunk_ids("missing.pdf") == set()
+    assert manifest.chunk_hashes().keys() == {"a-0", "b-0", "b-1"}
+
+    manifest.update_file("a.pdf", "hash-a2", {"a-0": IngestionManifest.hash_chunk("alpha!", {"page": 1})})
+    assert manifest.fingerprint() != fingerprint
+
+    manifest.remove_file("b.pdf")
+    manifest.remove_file("missing.pdf")
+    assert manifest.num_chunks() == 1
+    assert manifest.removed_files({"a.pdf": "hash-a2"}) == []
+
+
+def test_fingerprint_ignores_file_order(tmp_path):
+    manifest = make_manifest(str(tmp_path / "docs.json"))
+    reordered = IngestionManifest(manifest.path, dict(reversed(list(manifest.files.items()))))
+
+    assert reordered.fingerprint() == manifest.fingerprint()
+
+
+def test_save_and_load(tmp_path):
+    manifest = make_manifest(str(tmp_path / "manifest" / "docs.json"))
+    manifest.save()
+
+    loaded = IngestionManifest.load(str(tmp_path / "manifest"), "docs")
+
+    assert loaded.files == manifest.files
+    assert loaded.fingerprint() == manifest.fingerprint()
+    assert not (tmp_path / "manifest" / "docs.json.tmp").exists()
+
+
+def test_missing_or_outdated_manifest_is_rebuilt(tmp_path):
+    assert IngestionManifest.load(str(tmp_path), "docs").files == {}
+
+    manifest = make_manifest(str(tmp_path / "docs.json"))
+    with open(manifest.path, "w") as f:
+        json.dump({"version": MANIFEST_VERSION - 1, "files": manifest.files}, f)
+
+    loaded = IngestionManifest.load(str(tmp_path), "docs")
+
+    assert loaded.files == {}
+    assert loaded.changed_files({"a.pdf": "hash-a"}) == ["a.pdf"]
+
+
+def test_hash_file(tmp_path):
+    path = tmp_path / "a.pdf"
+    path.write_bytes(b"%PDF-1.4 alpha")
+    file_hash = IngestionManifest.hash_file(str(path))
+
+    assert IngestionManifest.hash_file(str(path)) == file_hash
+    path.write_bytes(b"%PDF-1.4 beta")
+    assert IngestionManifest.hash_file(str(path)) != file_hash
+
+
+def test_chunk_metadata_changes_keep_the_same_text():
+    chunk_hash = IngestionManifest.hash_chunk("alpha", {"page": 1, "source": "a.pdf"})
+
+    # Metadata keys are hashed sorted
+    assert IngestionManifest.hash_chunk("alpha", {"source": "a.pdf", "page": 1}) == chunk_hash
+
+    moved = IngestionManifest.hash_chunk("alpha", {"page": 2, "source": "a.pdf"})
+    assert moved != chunk_hash
+    assert IngestionManifest.same_text(moved, chunk_hash)
+    assert not IngestionManifest.same_text(IngestionManifest.hash_chunk("beta", {"page": 1}), chunk_hash)
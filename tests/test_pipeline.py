@@ -0,0 +1,30 @@
+import logging
+import os
+import threading
+
+from web3_copilot.doc_retrieval.pipeline import ExtractionPipeline
+
+
+class StubExtractor:
+    def extract_and_chunk(self, path, page_range=None):
+        return [{"id": path, "pid": os.getpid()}]
+
+
+def test_extraction_runs_in_process_while_other_threads_run(caplog):
+    pipeline = ExtractionPipeline(StubExtractor(), num_workers=4, pages_per_task=10)
+    results = []
+
+    # As the background warmup of a server which is serving requests
+    def warmup():
+        with pipeline:
+            results.extend(pipeline.extract({"a.pdf": "a.pdf", "b.pdf": "b.pdf"}))
+
+    with caplog.at_level(logging.WARNING):
+        thread = threading.Thread(target=warmup)
+        thread.start()
+        thread.join(10)
+
+    assert [file for file, _ in results] == ["a.pdf", "b.pdf"]
+    assert all(chunks[0]["pid"] == os.getpid() for _, chunks in results)
+    assert pipeline.num_workers == 1 and pipeline._pool is None
+    assert "pdf extraction runs in-process" in caplog.text
@@ -0,0 +1,78 @@
+import numpy as np
+
+from web3_copilot.doc_retrieval.retrieval import Retriever
+
+
+def db_results(ids, distances):
+    return {
+        "ids": [ids],
+        "documents": [[f"document {doc_id}" for doc_id in ids]],
+        "metadatas": [[{"id": doc_id} for doc_id in ids]],
+        "distances": [distances],
+    }
+
+
+class StubEncoder:
+    def __init__(self):
+        self.queries = []
+
+    def encode(self, query, **kwargs):
+        self.queries.append(query)
+        return np.array([1.0, 0.0])
+
+    def predict(self, sentence_pairs, **kwargs):
+        return np.arange(len(sentence_pairs), dtype=np.float32)
+
+    def encode_ordinary(self, text):
+        return text.split()
+
+
+class StubConfig:
+    def __init__(self):
+        self.embedding_encoder = self.cross_encoder_model = self.tokenizer = StubEncoder()
+
+    def collection_version(self, name):
+        return "v1"
+
+
+class StubCollection:
+    def __init__(self, name):
+        self.name = name
+        self.queries = 0
+
+    def query(self, query_embeddings, n_results):
+        self.queries += 1
+        return db_results([f"{self.name}-{i}" for i in range(3)], [0.1, 0.2, 0.3])
+
+
+def test_chains_of_a_prompt_embed_it_once_and_query_their_own_collection():
+    config = StubConfig()
+    retriever = Retriever(config, adaptive_rerank=False, hybrid=False)
+    uniswap, cosmos = StubCollection("uniswap"), StubCollection("cosmos")
+
+    uniswap_context = retriever.retrieve_docs("What is Uniswap?", uniswap)
+    cosmos_context = retriever.retrieve_docs("What is Uniswap?", cosmos)
+
+    assert config.embedding_encoder.queries == ["What is Uniswap?"]
+    assert (uniswap.queries, cosmos.queries) == (1, 1)
+    assert "document uniswap-0" in uniswap_context and "document cosmos-0" in cosmos_context
+
+
+def test_prune_candidates_keeps_lexical_only_documents():
+    pruned = Retriever._prune_candidates(db_results(["a", "b", "c", "d"], [0.1, None, 0.2, 0.9]))
+
+    assert pruned["ids"][0] == ["a", "b", "c"]
+    assert pruned["distances"][0] == [0.1, None, 0.2]
+
+
+def test_prune_candidates_drops_duplicates():
+    results = db_results(["a", "b", "a"], [0.1, 0.2, 0.1])
+    results["documents"][0][1] = "Document  A"
+
+    assert Retriever._prune_candidates(results)["ids"][0] == ["a"]
+
+
+def test_prune_candidates_without_distances():
+    results = db_results(["a", "b"], [None, None])
+
+    assert Retriever._prune_candidates(results) is results
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+from council.chains import Chain
+from council.contexts import AgentContext, Budget, Consumption
+from council.controllers import BasicController
+from council.evaluators import BasicEvaluator
+from council.filters import BasicFilter
+from council.llm import OpenAILLMConfiguration
+
+from benchmarks.stubs import StubConfig, StubServer, serve_in_thread
+from benchmarks.load_test import free_port
+from web3_copilot.llm import TracedOpenAILLM
+from web3_copilot.streaming import StreamingAgent, StreamingLLMSkill, listen
+
+MODEL = "gpt-3.5-turbo"
+
+
+@pytest.fixture(scope="module")
+def llm():
+    """LLM answering from a local stand-in of the OpenAI API."""
+    port = free_port()
+    stubs = StubServer(StubConfig(llm_latency=0, llm_token_latency=0, answer_tokens=20))
+    server = serve_in_thread(stubs.app, port)
+    previous = os.environ.get("OPENAI_API_BASE")
+    os.environ["OPENAI_API_BASE"] = f"http://127.0.0.1:{port}/v1"
+    yield TracedOpenAILLM(OpenAILLMConfiguration(model=MODEL, api_key="sk-stub"))
+    server.should_exit = True
+    if previous is None:
+        del os.environ["OPENAI_API_BASE"]
+    else:
+        os.environ["OPENAI_API_BASE"] = previous
+
+
+def run(llm, listener=None):
+    chain = Chain("docs", "documentation", [StreamingLLMSkill(llm, system_prompt="Answer the question.")])
+    agent = StreamingAgent(BasicController([chain]), BasicEvaluator(), BasicFilter())
+    budget = Budget(60, limits=[Consumption(100_000, "token", MODEL)])
+    context = AgentContext.from_user_message("What is Uniswap?", budget)
+    if listener is None:
+        result = agent.execute(context)
+    else:
+        with listen(context, listener):
+            result = agent.execute(context)
+    return result, 100_000 - budget._remaining[0].value
+
+
+def test_streamed_answers_consume_the_budget(llm):
+    events = []
+    result, streamed_tokens = run(llm, lambda event, data: events.append((event, data)))
+
+    tokens = [data["text"] for event, data in events if event == "token"]
+    assert [event for event, _ in events][0] == "route"
+    assert len(tokens) == 20
+    assert result.best_message.message == "".join(tokens)
+    assert streamed_tokens > 20
+
+    # As many tokens as the same answer requested in one piece
+    _, tokens_in_one_piece = run(llm)
+    assert streamed_tokens == tokens_in_one_piece
@@ -0,0 +1,29 @@
+import os
+
+from web3_copilot.common.tracing import Metrics
+
+
+def test_render_labels_every_series_with_the_pid():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.observe("retrieval.query", 0.05, counts={"tokens": 12})
+    metrics.observe("retrieval.query", 0.5)
+    metrics.observe("llm.skill", 2.0, error=True)
+
+    lines = metrics.render().splitlines()
+    series = [line for line in lines if not line.startswith("#")]
+    pid = f'pid="{os.getpid()}"'
+
+    assert series and all(f"{{{pid},span=" in line for line in series)
+    assert f'web3_copilot_span_duration_seconds_bucket{{{pid},span="retrieval.query",le="0.1"}} 1' in lines
+    assert f'web3_copilot_span_duration_seconds_bucket{{{pid},span="retrieval.query",le="1"}} 2' in lines
+    assert f'web3_copilot_span_duration_seconds_bucket{{{pid},span="llm.skill",le="+Inf"}} 1' in lines
+    assert f'web3_copilot_span_errors_total{{{pid},span="llm.skill"}} 1' in lines
+    assert f'web3_copilot_span_tokens_total{{{pid},span="retrieval.query"}} 12' in lines
+
+
+def test_reset():
+    metrics = Metrics()
+    metrics.observe("controller", 0.2)
+    metrics.reset()
+
+    assert "controller" not in metrics.render()
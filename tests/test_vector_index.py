@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from web3_copilot.doc_retrieval import VectorIndex
+
+
+def normalized(rows: np.ndarray) -> np.ndarray:
+    return (rows / np.linalg.norm(rows, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.fixture(scope="module")
+def embeddings() -> np.ndarray:
+    return normalized(np.random.default_rng(0).standard_normal((500, 32)))
+
+
+@pytest.fixture(scope="module")
+def queries(embeddings) -> np.ndarray:
+    noise = np.random.default_rng(1).standard_normal((10, embeddings.shape[1])) * 0.1
+    return normalized(embeddings[:10] + noise)
+
+
+def exact_top_k(embeddings: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-(queries @ embeddings.T), axis=1, kind="stable")[:, :k]
+
+
+def test_float32_search_is_exact(embeddings, queries):
+    positions, scores = VectorIndex.build(embeddings).search(queries, k=5)
+
+    assert positions.tolist() == exact_top_k(embeddings, queries, 5).tolist()
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_quantized_search_finds_the_nearest_rows(embeddings, queries, dtype):
+    index = VectorIndex.build(embeddings, dtype=dtype)
+
+    positions, scores = index.search(queries, k=5)
+
+    assert index.dtype == dtype
+    assert index.nbytes() < embeddings.nbytes
+    # Each query is a noisy copy of a row, which stays its nearest row once quantized
+    assert positions[:, 0].tolist() == list(range(len(queries)))
+    np.testing.assert_allclose(scores[:, 0], np.sum(queries * embeddings[:10], axis=1), atol=0.02)
+
+
+def test_ivf_search_probing_every_list_is_exact(embeddings, queries):
+    index = VectorIndex.build(embeddings, num_lists=8)
+
+    positions, _ = index.search(queries, k=5, nprobe=index.num_lists)
+
+    assert index.num_lists == 8
+    assert sorted(index.list_rows.tolist()) == list(range(len(embeddings)))
+    assert positions.tolist() == exact_top_k(embeddings, queries, 5).tolist()
+
+
+def test_ivf_search_pads_queries_with_fewer_rows(embeddings):
+    index = VectorIndex.build(embeddings[:20], num_lists=10)
+
+    positions, scores = index.search(embeddings[:20], k=20, nprobe=1)
+
+    # A single list holds fewer than k rows, each query gets the rows of its list
+    sizes = np.diff(index.list_offsets)
+    assert positions.shape == (20, sizes.max())
+    assert np.all((positions == -1) == np.isneginf(scores))
+    probed = np.argmax(embeddings[:20] @ index.centroids.T, axis=1)
+    assert (positions != -1).sum(axis=1).tolist() == sizes[probed].tolist()
+
+
+def test_index_with_fewer_rows_than_lists_is_searched_exhaustively(embeddings):
+    index = VectorIndex.build(embeddings[:4], num_lists=8)
+
+    positions, _ = index.search(embeddings[:1], k=10)
+
+    assert index.num_lists == 0
+    assert sorted(positions[0].tolist()) == [0, 1, 2, 3]
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_and_load(tmp_path, embeddings, queries, mmap):
+    index = VectorIndex.build(embeddings, dtype="int8", num_lists=8)
+    index.save(str(tmp_path), "docs")
+
+    loaded = VectorIndex.load(str(tmp_path), "docs", mmap=mmap)
+
+    assert isinstance(loaded.data, np.memmap) == mmap
+    assert loaded.dtype == "int8" and loaded.num_lists == 8
+    for expected, actual in zip(index.search(queries, k=5), loaded.search(queries, k=5)):
+        np.testing.assert_array_equal(expected, actual)
+
+
+def test_unknown_dtype():
+    with pytest.raises(ValueError, match="bfloat16"):
+        VectorIndex.build(np.zeros((1, 4), dtype=np.float32), dtype="bfloat16")
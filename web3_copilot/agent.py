@@ -1,67 +1,139 @@
-from typing import List
+import time
+
+# Time spent importing the agent and its dependencies, reported by status
+_IMPORT_STARTED = time.perf_counter()
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from pathlib import Path
+import asyncio
+import hashlib
+import threading
 
 import toml
 import dotenv
 
-from council.agents import Agent
 from council.chains import Chain
 from council.contexts import AgentContext, SkillContext
 from council.filters import BasicFilter
 from council.contexts import Budget, Consumption
-from council.llm import OpenAILLM, LLMMessage
-from council.skills import LLMSkill, PromptToMessages
+from council.llm import LLMMessage
+from council.skills import PromptToMessages
 from council.prompt import PromptBuilder
 from council.controllers import LLMController
 from council.evaluators import LLMEvaluator
 
 from web3_copilot.common import constants
+from web3_copilot.common.serialization import serialize_agent_result
+from web3_copilot.common.tracing import Trace
 import logging
 
 from web3_copilot.doc_retrieval.config import Config
-from web3_copilot.doc_retrieval import Retriever
+from web3_copilot.doc_retrieval import Retriever, serve_collections
+from web3_copilot.answer_cache import SemanticAnswerCache
+from web3_copilot.controller import FastRouterController
+from web3_copilot.llm import TracedOpenAILLM
 from web3_copilot.skills import DocRetrievalSkill, TransactionDebuggerSkill
-from web3_copilot.common.utils import create_file_dict
+from web3_copilot.streaming import EventListener, StreamingAgent, StreamingLLMSkill, listen
 
 dotenv.load_dotenv()
 
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
 logging.getLogger("council").setLevel(logging.ERROR)
 
 
 class Web3CopilotAgent:
 
-    def __init__(self):
+    def __init__(
+        self,
+        shared_store: bool = False,
+        lazy_init: bool = False,
+        index_artifact: Optional[str] = None,
+        trace_sample_rate: float = constants.TRACE_SAMPLE_RATE,
+        answer_cache: bool = constants.ANSWER_CACHE,
+    ):
+        """shared_store hands the database over to a store process, for serving processes
+        forked after the agent is created, which then share its models copy-on-write.
+
+        lazy_init leaves loading the models and syncing the database to their first use
+        or to warmup, so the agent is created in a fraction of the time.
+
+        index_artifact serves a prebuilt index artifact written by ingest.py instead of
+        ingesting the documents of the data directory.
+
+        trace_sample_rate is the share of executions whose spans are logged, see web3_copilot/common/tracing.py.
+
+        answer_cache serves the answers of similar prompts from a cache, see web3_copilot/answer_cache.py."""
+        start = time.perf_counter()
+        self.timings: Dict[str, float] = {"import": IMPORT_SECONDS}
+        self._warmup_error: Optional[str] = None
+        self.trace_sample_rate = trace_sample_rate
+
         # Initialize database dependencies
         self.config = Config(
             encoding_name=constants.ENCODING_NAME,
             embedding_model_name=constants.EMBEDDING_MODEL_NAME,
-            cross_encoder_model_name=constants.CROSS_ENCODER_MODEL_NAME
+            cross_encoder_model_name=constants.CROSS_ENCODER_MODEL_NAME,
+            artifact_dir=index_artifact,
         )
-        self.db_client = self.config.initialize()
+        self.vector_store = self.config.initialize(lazy=lazy_init)
+        if shared_store:
+            if lazy_init:
+                # The store process owns the database as it is when forked
+                self.config.sync_database(self.vector_store)
+            self.vector_store = serve_collections(self.vector_store)
         self.retriever = Retriever(self.config)
 
         # Initialize agent
-        self.llm = OpenAILLM.from_env()
+        self.llm = TracedOpenAILLM.from_env()
         self.init_skills()
         chains = self.init_chains()
-        self.controller = LLMController(chains=chains, llm=self.llm, response_threshold=5)
+        if constants.FAST_ROUTER:
+            self.controller = FastRouterController(
+                chains=chains,
+                llm=self.llm,
+                retriever=self.retriever,
+                txn_debugger_chain="txn_debugger_chain",
+                response_threshold=5,
+            )
+        else:
+            self.controller = LLMController(chains=chains, llm=self.llm, response_threshold=5)
         self.evaluator = LLMEvaluator(self.llm)
-        self.agent = Agent(self.controller, self.evaluator, filter=BasicFilter(), name="Web3Copilot")
+        self.agent = StreamingAgent(self.controller, self.evaluator, filter=BasicFilter(), name="Web3Copilot")
+
+        # Answers of similar prompts, valid as long as the documents and templates are unchanged
+        self._templates_fingerprint = self.fingerprint_templates()
+        self.answer_cache = (
+            SemanticAnswerCache(self.retriever, version=self.answer_version) if answer_cache else None
+        )
+
+        # Threads running agent executions for ainteract, sized to the requests served concurrently
+        self._executor = ThreadPoolExecutor(
+            max_workers=constants.MAX_CONCURRENT_REQUESTS, thread_name_prefix="web3-copilot-agent"
+        )
+
+        self.timings["init"] = time.perf_counter() - start
+        logging.info(
+            f'message="agent initialized" lazy_init={lazy_init} '
+            f'import_seconds={IMPORT_SECONDS:.2f} init_seconds={self.timings["init"]:.2f}'
+        )
 
     def init_skills(self):
         # Skills for document retrieval
         self.doc_retrieval_skills = {}
 
-        indices = list(create_file_dict(constants.DATA_DIR).keys())
+        indices = self.config.index_names()
+        # The skills share the retriever, so the doc retrieval chains of a prompt embed it once
         for index in indices:
             self.doc_retrieval_skills[index] = DocRetrievalSkill(
-                db_client=self.db_client,
+                vector_store=self.vector_store,
                 collection_name=index,
                 retriever=self.retriever,
             )
 
         # Skill to interact with LLM for document retrieval
-        self.dr_llm_skill = LLMSkill(
+        self.dr_llm_skill = StreamingLLMSkill(
             llm=self.llm,
             system_prompt=self.load_system_prompt("doc_retrieval"),
             context_messages=self.build_context_message
@@ -73,7 +145,7 @@ class Web3CopilotAgent:
         )
 
         # Skill to interact with LLM transaction debugger
-        self.txn_debugger_llm_skill = LLMSkill(
+        self.txn_debugger_llm_skill = StreamingLLMSkill(
             llm=self.llm,
             system_prompt=self.load_system_prompt("txn_debugger"),
             context_messages=self.build_context_message
@@ -104,6 +176,22 @@ class Web3CopilotAgent:
 
         return chains
 
+    @staticmethod
+    def fingerprint_templates() -> str:
+        m = hashlib.md5()
+        for path in sorted(Path("./web3_copilot/templates").rglob("*")):
+            if path.is_file():
+                m.update(str(path).encode("utf-8"))
+                m.update(path.read_bytes())
+        return m.hexdigest()
+
+    def answer_version(self) -> str:
+        """Function to fingerprint what answers depend on: the document indices and the prompt templates."""
+        m = hashlib.md5(self._templates_fingerprint.encode("utf-8"))
+        for index in self.doc_retrieval_skills:
+            m.update(f"{index}:{self.config.collection_version(index)}".encode("utf-8"))
+        return m.hexdigest()
+
     def load_system_prompt(self, skill: str):
         system_prompt_file = ""
 
@@ -127,8 +215,8 @@ class Web3CopilotAgent:
         messages = context_message_prompt.to_user_message(context)
         return messages
 
-    def interact(self, message):
-
+    def interact(self, message, listener: Optional[EventListener] = None):
+        """listener is called with the events of the execution, see astream."""
         api_call_limit = Consumption(10, "call", "API_CALL")
 
         budget = Budget(
@@ -140,8 +228,92 @@ class Web3CopilotAgent:
 
         context = AgentContext.from_user_message(message, budget)
 
-        result = self.agent.execute(context=context)
+        with Trace("agent", context, sample_rate=self.trace_sample_rate) as trace:
+            trace.count(prompt_chars=len(message))
+            if self.answer_cache is not None:
+                cached_result = self.answer_cache.get(message)
+                trace.set(cached=cached_result is not None)
+                if cached_result is not None:
+                    return cached_result
+
+            if listener is None:
+                result = self.agent.execute(context=context)
+            else:
+                with listen(context, listener):
+                    result = self.agent.execute(context=context)
+            if self.answer_cache is not None:
+                self.answer_cache.put(message, result)
         return result
 
+    async def ainteract(self, message):
+        """Async variant of interact for the ASGI app.
+
+        Council runs chains synchronously, so the execution is handed to a bounded thread pool
+        and the event loop stays free to accept requests while LLM and RPC calls are in flight.
+        Skills and models are shared by all executions, each execution has its own context."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.interact, message)
+
+    async def astream(self, message) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Variant of ainteract yielding the events of the execution as they happen: a route event
+        per chain run, a retrieval event once its documents or transaction are retrieved, the token
+        events of the LLM answers, and last a result event with the serialized result.
+
+        Events are tagged with the chain they come from, the controller may run several chains."""
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+
+        def listener(event: str, data: Dict[str, Any]):
+            loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+        future = loop.run_in_executor(self._executor, self.interact, message, listener)
+        # Scheduled after the events of the execution
+        future.add_done_callback(lambda _: events.put_nowait(None))
+        while (event := await events.get()) is not None:
+            yield event
+
+        yield "result", serialize_agent_result(future.result())
+
+    def warmup(self, background: bool = True) -> Optional[threading.Thread]:
+        """Function to load the models and sync the database ahead of the first request,
+        by default on a background thread which is returned."""
+        if not background:
+            self._warmup()
+            return None
+
+        thread = threading.Thread(target=self._warmup, name="warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def _warmup(self):
+        start = time.perf_counter()
+        try:
+            self.config.load_models()
+            if not self.config.database_synced:
+                self.config.sync_database(self.vector_store)
+            # The first forward passes are slower, they are not left to the first request
+            self.retriever._embed_query("warmup")
+            self.retriever.reranker.predict([["warmup", "warmup"]])
+            if isinstance(self.controller, FastRouterController):
+                self.controller.prepare()
+        except Exception as e:
+            self._warmup_error = repr(e)
+            logging.exception('message="warmup failed"')
+            return
+
+        self.timings["warmup"] = time.perf_counter() - start
+        logging.info(f'message="warmup completed" seconds={self.timings["warmup"]:.2f}')
+
+    def status(self) -> Dict[str, Any]:
+        """Function to report whether the models are loaded and the database synced, with startup timings."""
+        models = self.config.loaded_models()
+        return {
+            "ready": all(models.values()) and self.config.database_synced,
+            "models": models,
+            "database_synced": self.config.database_synced,
+            "warmup_error": self._warmup_error,
+            "timings": {**self.timings, **self.config.timings},
+        }
+
     def render(self):
         return self.agent.render_as_json()
@@ -0,0 +1,151 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+import threading
+import time
+
+import numpy as np
+
+from council.agents import AgentResult
+
+from web3_copilot.common import constants
+from web3_copilot.common.cache import LRUCache
+from web3_copilot.common.utils import TX_HASH_PATTERN
+from web3_copilot.doc_retrieval import Retriever
+
+
+class SemanticAnswerCache:
+    """Cache of agent results, serving the answer of a previous prompt similar enough to a new one.
+
+    Prompts are embedded with the query embedding of the retriever. Prompts with a transaction
+    hash are only served the answer of the exact same prompt. Entries are dropped once the
+    version changes, e.g. when the document indices or prompt templates changed, and the least
+    recently used entries are evicted past max_size."""
+
+    def __init__(
+        self,
+        retriever: Retriever,
+        version: Callable[[], str],
+        max_size: int = constants.ANSWER_CACHE_SIZE,
+        ttl: Optional[float] = constants.ANSWER_CACHE_TTL,
+        min_similarity: float = constants.ANSWER_CACHE_MIN_SIMILARITY,
+    ):
+        self.retriever = retriever
+        self.version = version
+        self.max_size = max_size
+        self.ttl = ttl
+        self.min_similarity = min_similarity
+        # Normalized embeddings of the semantic entries, one row per slot, zero for free slots
+        self._embeddings: Optional[np.ndarray] = None
+        # slot -> (time stored, prompt, result), least recently used first
+        self._entries: "OrderedDict[int, tuple[float, str, AgentResult]]" = OrderedDict()
+        self._free_slots: List[int] = list(range(max_size - 1, -1, -1))
+        # Transaction prompts, keyed on their exact normalized text
+        self._exact = LRUCache(max_size, ttl=ttl)
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, prompt: str) -> Optional[AgentResult]:
+        self._check_version()
+        if TX_HASH_PATTERN.search(prompt):
+            result = self._exact.get(Retriever._normalize_query(prompt))
+            self._count(result is not None)
+            return result
+
+        query = self._embed(prompt)
+        with self._lock:
+            result = None
+            if self._entries:
+                similarities = self._embeddings @ query
+                # Entries similar enough, most similar first, skipping expired ones
+                candidates = np.flatnonzero(similarities >= self.min_similarity)
+                for slot in candidates[np.argsort(-similarities[candidates], kind="stable")]:
+                    slot = int(slot)
+                    entry = self._entries.get(slot)
+                    if entry is None:
+                        continue
+                    if self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                        self._remove(slot)
+                        continue
+                    self._entries.move_to_end(slot)
+                    result = entry[2]
+                    break
+        self._count(result is not None)
+        return result
+
+    def put(self, prompt: str, result: AgentResult):
+        """Function to store the result of a prompt, unless it has no successful answer."""
+        best_message = result.try_best_message
+        if best_message.is_none() or best_message.unwrap().is_error:
+            return
+
+        self._check_version()
+        if TX_HASH_PATTERN.search(prompt):
+            self._exact.put(Retriever._normalize_query(prompt), result)
+            return
+
+        query = self._embed(prompt)
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = np.zeros((self.max_size, len(query)), dtype=np.float32)
+            if not self._free_slots:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            slot = self._free_slots.pop()
+            self._embeddings[slot] = query
+            self._entries[slot] = (time.monotonic(), prompt, result)
+
+    def invalidate(self):
+        with self._lock:
+            for slot in list(self._entries):
+                self._remove(slot)
+        self._exact.invalidate()
+
+    def stats(self) -> Dict[str, Any]:
+        exact_stats = self._exact.stats()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries) + exact_stats["size"],
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _embed(self, prompt: str) -> np.ndarray:
+        query = np.asarray(self.retriever._embed_query(prompt), dtype=np.float32)
+        return query / max(np.linalg.norm(query), 1e-12)
+
+    def _check_version(self):
+        """Function to drop every entry when the version changed since they were stored."""
+        version = self.version()
+        if version == self._version:
+            return
+
+        with self._lock:
+            if version == self._version:
+                return
+            for slot in list(self._entries):
+                self._remove(slot)
+            if self._version is not None:
+                self.invalidations += 1
+            self._version = version
+        self._exact.invalidate()
+
+    def _remove(self, slot: int):
+        del self._entries[slot]
+        self._embeddings[slot] = 0
+        self._free_slots.append(slot)
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
@@ -1,2 +1,3 @@
 from .constants import *
 from .utils import create_file_dict
+from .cache import LRUCache
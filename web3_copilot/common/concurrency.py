@@ -0,0 +1,93 @@
+from typing import Any, Dict, Optional
+import asyncio
+
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+class RequestLimitExceeded(Exception):
+    """Raised when a request can neither run nor wait for a slot."""
+
+
+class RequestLimiter:
+    """Bound the requests running concurrently on an event loop.
+
+    Requests past max_concurrent wait for a slot in arrival order. Once max_queued requests
+    are waiting, or a request waited queue_timeout seconds, RequestLimitExceeded is raised
+    so the server can shed load instead of queuing without bound.
+
+    Must be created from the event loop it is used on."""
+
+    def __init__(self, max_concurrent: int, max_queued: int, queue_timeout: Optional[float] = None):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._running = 0
+        self._queued = 0
+
+    async def __aenter__(self) -> "RequestLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+    async def acquire(self):
+        """Function to wait for a slot, for requests whose slot outlives the handler, e.g. streamed responses."""
+        if self._semaphore.locked() and self._queued >= self.max_queued:
+            self.rejected += 1
+            raise RequestLimitExceeded(f"{self._queued} requests already queued")
+
+        self._queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise RequestLimitExceeded(f"no slot after {self.queue_timeout}s")
+        finally:
+            self._queued -= 1
+
+        self._running += 1
+
+    def release(self):
+        self._running -= 1
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._running,
+            "queued": self._queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "rejected": self.rejected,
+        }
+
+
+class LimitedStreamingResponse(StreamingResponse):
+    """Streaming response holding a slot of a RequestLimiter until it is sent.
+
+    The slot is released however the response ends, including when the client disconnects
+    or the first send fails before the body iterator started, whose finally would never run."""
+
+    def __init__(self, content: Any, limiter: RequestLimiter, **kwargs):
+        super().__init__(content, **kwargs)
+        self.limiter = limiter
+        self._released = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                # Stops the producer of a body left behind by a disconnect
+                if hasattr(self.body_iterator, "aclose"):
+                    await self.body_iterator.aclose()
+            finally:
+                self.release()
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.limiter.release()
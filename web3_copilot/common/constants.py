@@ -1,16 +1,98 @@
+import os
+
 DATA_DIR = "./web3_copilot/doc_retrieval/data/generated_pdfs"
 DB_PERSIST_DIR = "./web3_copilot/doc_retrieval/data/database/chromadb/"
+MANIFEST_DIR = "./web3_copilot/doc_retrieval/data/database/manifest/"
+# BM25 indices of the collections, updated along with their embeddings
+LEXICAL_INDEX_DIR = "./web3_copilot/doc_retrieval/data/database/lexical/"
+# Prebuilt index artifact written by ingest.py
+INDEX_ARTIFACT_DIR = "./web3_copilot/doc_retrieval/data/database/artifact/"
 SOURCE_DOCS = "./web3_copilot/doc_retrieval/data/source_docs"
+TXN_DEBUGGER_CACHE_PATH = "./web3_copilot/txn_debugger/data/cache/txn_debugger.sqlite3"
 
 EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 CROSS_ENCODER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
 ENCODING_NAME = "cl100k_base"
 
 CONTEXT_TOKEN_LIMIT = 8000
+# "greedy" keeps ranked documents until one does not fit, "best_fit" also fills the remaining budget
+CONTEXT_PACKING_STRATEGY = "greedy"
 NUM_RETRIEVED_DOCUMENTS = 50
 NUM_TOP_RANKED_DOCUMENTS = 10
+# Micro-batching of cross-encoder pairs across concurrent requests
+RERANK_MAX_BATCH_SIZE = 256
+RERANK_MAX_WAIT_MS = 5
+# Adaptive reranking prunes and deduplicates candidates, then ranks them in
+# blocks until the top ranked documents are stable (see benchmarks/rerank_pruning.py)
+ADAPTIVE_RERANK = False
+RERANK_MAX_DISTANCE_GAP = 0.3
+RERANK_BLOCK_SIZE = 10
+# Hybrid retrieval fuses the embedding and BM25 rankings of a collection with reciprocal
+# rank fusion, so fewer candidates are ranked (see benchmarks/hybrid_retrieval.py)
+HYBRID_RETRIEVAL = False
+HYBRID_NUM_CANDIDATES = 30
+RRF_K = 60
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Prompts are routed to the chain with the most similar description without asking the LLM
+# if the similarity is at least ROUTER_MIN_SIMILARITY and ROUTER_MIN_MARGIN above the next chain.
+# Off by default: the thresholds are not measured yet, and a prompt is only routed to one chain
+FAST_ROUTER = False
+ROUTER_MIN_SIMILARITY = 0.3
+ROUTER_MIN_MARGIN = 0.1
+
+# Answers served to prompts at least ANSWER_CACHE_MIN_SIMILARITY similar to a previous prompt,
+# until the document indices or prompt templates change. Off by default: prompts differing only
+# in a key entity, e.g. "Uniswap v2" and "Uniswap v3", can be that similar
+ANSWER_CACHE = False
+ANSWER_CACHE_SIZE = 1024
+ANSWER_CACHE_TTL = 24 * 60 * 60
+ANSWER_CACHE_MIN_SIMILARITY = 0.9
+
+# Bounds of the retriever caches of query embeddings and ranked contexts
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_TTL = 60 * 60
+# Token counts of verified contract sources kept by the transaction debugger
+SOURCE_TOKEN_COUNT_CACHE_SIZE = 4096
+# Concurrent Etherscan requests, and requests per second when ETHERSCAN_RATE_LIMIT is not set
+ETHERSCAN_MAX_WORKERS = 8
+ETHERSCAN_RATE_LIMIT = 5
+# Retries of Etherscan requests failing transiently (network errors, 429, 5xx, rate limit messages),
+# the n-th retry waiting ETHERSCAN_RETRY_BACKOFF * 2 ** (n - 1) seconds
+ETHERSCAN_MAX_RETRIES = 2
+ETHERSCAN_RETRY_BACKOFF = 0.5
+# Persistent cache of transaction traces and contract sources
+TXN_DEBUGGER_CACHE_MAX_BYTES = 512 * 1024 * 1024
+UNVERIFIED_SOURCE_CACHE_TTL = 24 * 60 * 60
+# Tokens of the compacted transaction trace in the prompt, contract sources get the rest of the context
+TRACE_TOKEN_LIMIT = 2500
+# Compacted trace steps are spilled to disk past this many bytes
+TRACE_SPOOL_MAX_MEMORY = 16 * 1024 * 1024
 MAX_CHUNK_SIZE = 256
 
+# Worker processes used to extract and chunk pdfs, 1 extracts in-process
+INGESTION_NUM_WORKERS = max((os.cpu_count() or 1) - 1, 1)
+# Large pdfs are split into page ranges of this size across workers
+INGESTION_PAGES_PER_TASK = 50
+# Storage of the embeddings of index artifacts: float32, float16 or int8, and
+# IVF lists of the artifact searched by probing the IVF_NPROBE closest lists, 0 searches every embedding
+INDEX_ARTIFACT_DTYPE = "float32"
+INDEX_ARTIFACT_IVF_LISTS = 0
+IVF_NPROBE = 8
+
+# Requests executed concurrently by the async server, and requests waiting for
+# a slot before new ones are rejected with 429
+MAX_CONCURRENT_REQUESTS = 64
+MAX_QUEUED_REQUESTS = 256
+# Seconds a queued request waits for a slot before it is rejected
+REQUEST_QUEUE_TIMEOUT = 30
+
+# Share of agent executions whose spans are logged as json, every execution is counted in the metrics
+TRACE_SAMPLE_RATE = 0.0
+# Upper bounds in seconds of the latency histograms of the metrics
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
 PROJECT_REPOS = {
     "uniswap": "https://github.com/Uniswap/docs.git",
     "avalanche": "https://github.com/ava-labs/avalanche-docs.git",
@@ -0,0 +1,163 @@
+from typing import Any, Dict, Optional
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Hits within this many seconds of the last recorded access of an entry do not record it again,
+# so that reads stay read-only transactions instead of contending for the write lock of the database
+ACCESS_TIME_RESOLUTION = 60
+
+
+class DiskCache:
+    """Persistent cache of JSON values in a SQLite database, bounded in total size
+    by evicting the least recently used entries. Entries may expire after a time to live.
+
+    Access times are recorded to within access_resolution seconds, and the total size of the entries
+    is kept up to date by triggers, so that neither reads nor writes scan the table.
+
+    The connection is opened on first use in each process, as SQLite connections must not cross a fork."""
+
+    def __init__(self, path: str, max_bytes: int, access_resolution: float = ACCESS_TIME_RESOLUTION):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.access_resolution = access_resolution
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn_pid = None
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn_pid == os.getpid():
+            return self._conn
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn_pid = os.getpid()
+        # Write-ahead logging lets several processes share the cache
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        # Total size of the entries, shared by every process using the database
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER NOT NULL)"
+        )
+        self._conn.executescript(
+            """CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+                UPDATE totals SET size = size + NEW.size WHERE id = 0;
+            END;
+            CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+                UPDATE totals SET size = size - OLD.size WHERE id = 0;
+            END;
+            CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+                UPDATE totals SET size = size + NEW.size - OLD.size WHERE id = 0;
+            END;"""
+        )
+        # Databases created without the totals are summed once
+        self._conn.execute("INSERT OR IGNORE INTO totals SELECT 0, COALESCE(SUM(size), 0) FROM entries")
+        return self._conn
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            self._connect()
+            row = self._conn.execute(
+                "SELECT value, expires_at, accessed_at FROM entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+
+            if row is not None and row[1] is not None and row[1] < now:
+                self._conn.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+                )
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            if now - row[2] > self.access_resolution:
+                self._conn.execute(
+                    "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    (now, namespace, key),
+                )
+            self.hits += 1
+
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        blob = zlib.compress(json.dumps(value).encode("utf-8"), 1)
+        if len(blob) > self.max_bytes:
+            return
+
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            self._connect()
+            # The entry and the evictions it causes are written in a single transaction
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # An upsert, unlike INSERT OR REPLACE, fires the update trigger keeping the total size
+                self._conn.execute(
+                    """INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (namespace, key) DO UPDATE SET
+                        value = excluded.value, size = excluded.size,
+                        expires_at = excluded.expires_at, accessed_at = excluded.accessed_at""",
+                    (namespace, key, blob, len(blob), expires_at, now),
+                )
+                self._evict()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _total_bytes(self) -> int:
+        return self._conn.execute("SELECT size FROM totals WHERE id = 0").fetchone()[0]
+
+    def _evict(self):
+        """Function to delete the least recently used entries until the cache fits in max_bytes."""
+        total_bytes = self._total_bytes()
+        if total_bytes <= self.max_bytes:
+            return
+
+        # Only the least recently used entries are read, in order of the access time index
+        evicted = []
+        cursor = self._conn.execute("SELECT namespace, key, size FROM entries ORDER BY accessed_at")
+        for namespace, key, size in cursor:
+            if total_bytes <= self.max_bytes:
+                break
+            evicted.append((namespace, key))
+            total_bytes -= size
+        cursor.close()
+
+        self._conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._connect()
+            num_entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            total_bytes = self._total_bytes()
+            lookups = self.hits + self.misses
+            return {
+                "entries": num_entries,
+                "bytes": total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
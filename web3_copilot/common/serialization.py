@@ -0,0 +1,72 @@
+from enum import Enum
+from typing import Any, Dict, Optional
+
+from council.agents import AgentResult
+from council.contexts import ChatMessage
+
+
+def serialize_agent_response(agent_response: AgentResult):
+    response = {
+        "messages": [],
+        "best_message": {}
+    }
+
+    for scored_msg in agent_response.messages:
+        score = scored_msg.score
+        message = to_json(scored_msg.message)
+
+        response["messages"].append({
+            "score": score,
+            "message": message
+        })
+
+    best_message = agent_response.try_best_message.unwrap()
+    response["best_message"] = to_json(best_message)
+
+    return response
+
+
+def serialize_agent_result(agent_response: AgentResult) -> Dict[str, Any]:
+    """Function to serialize the messages of a result without their data, e.g. LLM results and retrieved documents."""
+    best_message = agent_response.try_best_message
+    return {
+        "messages": [
+            {"score": scored_msg.score, "message": _serialize_message(scored_msg.message)}
+            for scored_msg in agent_response.messages
+        ],
+        "best_message": None if best_message.is_none() else _serialize_message(best_message.unwrap()),
+    }
+
+
+def _serialize_message(message: ChatMessage) -> Dict[str, Optional[Any]]:
+    return {
+        "message": message.message,
+        "kind": message.kind.value,
+        "source": message.source,
+        "is_error": message.is_error,
+    }
+
+
+def to_json(obj):
+    """Function to convert an object to json types, other objects by their attributes,
+    as json.dumps(obj, default=lambda o: o.__dict__) would without a round trip through a string."""
+    if obj is None or isinstance(obj, (bool, int, float)):
+        return obj
+    if isinstance(obj, Enum):
+        return to_json(obj.value)
+    if isinstance(obj, str):
+        return str(obj)
+    if isinstance(obj, dict):
+        return {_json_key(key): to_json(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_json(value) for value in obj]
+    return to_json(obj.__dict__)
+
+
+def _json_key(key) -> str:
+    # Keys are converted as json.dumps does
+    if isinstance(key, str):
+        return key
+    if isinstance(key, bool) or key is None:
+        return "true" if key is True else "false" if key is False else "null"
+    return str(key)
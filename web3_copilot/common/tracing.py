@@ -0,0 +1,255 @@
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+import bisect
+import functools
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import weakref
+
+from web3_copilot.common import constants
+
+# Spans of sampled executions, one json object per line
+logger = logging.getLogger("web3_copilot.trace")
+
+# Span of the current thread, set while a span of a sampled execution is open
+_current: ContextVar[Optional["Span"]] = ContextVar("web3_copilot_span", default=None)
+
+# Root spans of the sampled executions in progress, keyed on the chat history of their context.
+# Council runs skills on its own thread pools, the chat history is what all contexts of an execution share.
+_executions: "weakref.WeakKeyDictionary[Any, Span]" = weakref.WeakKeyDictionary()
+_executions_lock = threading.Lock()
+
+# Span ids are unique per process, trace ids across processes
+_span_ids = itertools.count(1)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        # Observations per bucket, the last one counts observations past every bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Aggregates of the spans of every execution, sampled or not: a latency histogram and an
+    error count per span name, and totals of the counts of the spans such as tokens and bytes.
+
+    Rendered in the Prometheus text format. The metrics are those of the current process: each
+    gunicorn worker serves its own, so every series is labelled with the pid of the worker."""
+
+    def __init__(self, buckets: Sequence[float] = constants.METRICS_LATENCY_BUCKETS, prefix: str = "web3_copilot"):
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self._histograms: Dict[str, Histogram] = {}
+        self._errors: Dict[str, int] = {}
+        self._totals: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, counts: Optional[Dict[str, float]] = None, error: bool = False):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            if error:
+                self._errors[name] = self._errors.get(name, 0) + 1
+            if counts:
+                for key, value in counts.items():
+                    self._totals[(key, name)] = self._totals.get((key, name), 0) + value
+
+    def render(self) -> str:
+        """Function to write the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = {
+                name: (list(histogram.counts), histogram.sum, histogram.count)
+                for name, histogram in self._histograms.items()
+            }
+            errors = dict(self._errors)
+            totals = dict(self._totals)
+
+        # Series of different workers are told apart by the pid, and summed by span across workers
+        pid = f'pid="{os.getpid()}"'
+        lines = [
+            f"# HELP {self.prefix}_span_duration_seconds Duration of the spans of agent executions.",
+            f"# TYPE {self.prefix}_span_duration_seconds histogram",
+        ]
+        for name, (counts, total, count) in sorted(histograms.items()):
+            cumulative = 0
+            for bucket, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.prefix}_span_duration_seconds_bucket{{{pid},span="{name}",le="{bucket:g}"}} {cumulative}')
+            lines.append(f'{self.prefix}_span_duration_seconds_bucket{{{pid},span="{name}",le="+Inf"}} {count}')
+            lines.append(f'{self.prefix}_span_duration_seconds_sum{{{pid},span="{name}"}} {total:.6f}')
+            lines.append(f'{self.prefix}_span_duration_seconds_count{{{pid},span="{name}"}} {count}')
+
+        lines.append(f"# HELP {self.prefix}_span_errors_total Spans ended by an exception.")
+        lines.append(f"# TYPE {self.prefix}_span_errors_total counter")
+        for name, count in sorted(errors.items()):
+            lines.append(f'{self.prefix}_span_errors_total{{{pid},span="{name}"}} {count}')
+
+        for key in sorted({key for key, _ in totals}):
+            lines.append(f"# HELP {self.prefix}_span_{key}_total Total {key.replace('_', ' ')} of the spans.")
+            lines.append(f"# TYPE {self.prefix}_span_{key}_total counter")
+            for (total_key, name), value in sorted(totals.items()):
+                if total_key == key:
+                    lines.append(f'{self.prefix}_span_{key}_total{{{pid},span="{name}"}} {value:g}')
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._errors.clear()
+            self._totals.clear()
+
+
+metrics = Metrics()
+
+
+class Span:
+    """Timed stage of an agent execution, recorded in the metrics when it ends.
+
+    Spans of sampled executions are also logged with their attributes and counts, and are the
+    parent of the spans opened in them. Spans of other executions cost two clock reads and a
+    histogram update. The parent of a span is the span open in the current thread, or the root
+    span of the execution of context, for spans opened by skills on the thread pools of council.
+
+    Use as a context manager:
+
+        with Span("retrieval.rerank", candidates=len(documents)) as span:
+            ...
+            span.count(pairs=len(pairs))"""
+
+    __slots__ = ("name", "context", "attributes", "counts", "parent", "sampled", "trace_id", "span_id", "start", "_token")
+
+    def __init__(self, name: str, context=None, **attributes: Any):
+        self.name = name
+        self.context = context
+        self.attributes = attributes
+        self.counts: Dict[str, float] = {}
+        self.parent: Optional[Span] = None
+        self.sampled = False
+        self.trace_id: Optional[str] = None
+        self.span_id: Optional[int] = None
+        self._token = None
+
+    def set(self, **attributes: Any) -> "Span":
+        """Function to add attributes to the log of the span, ignored unless sampled."""
+        if self.sampled:
+            self.attributes.update(attributes)
+        return self
+
+    def count(self, **counts: float) -> "Span":
+        """Function to add to the counts of the span, e.g. tokens or bytes, which are totaled in the metrics."""
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+        return self
+
+    def __enter__(self) -> "Span":
+        parent = _current.get()
+        if parent is None and self.context is not None and _executions:
+            parent = _executions.get(self.context.chat_history)
+        if parent is not None:
+            self._start_sampled(parent.trace_id, parent)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        seconds = time.perf_counter() - self.start
+        metrics.observe(self.name, seconds, self.counts, error=exc_type is not None)
+        if self.sampled:
+            _current.reset(self._token)
+            self._log(seconds, exc_val)
+
+    def _start_sampled(self, trace_id: str, parent: Optional["Span"]):
+        self.sampled = True
+        self.trace_id = trace_id
+        self.parent = parent
+        self.span_id = next(_span_ids)
+        self._token = _current.set(self)
+
+    def _log(self, seconds: float, error: Optional[BaseException]):
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent is not None else None,
+            "name": self.name,
+            "start": time.time() - seconds,
+            "duration_ms": round(seconds * 1000, 3),
+            **self.attributes,
+            **self.counts,
+        }
+        if error is not None:
+            record["error"] = repr(error)
+        logger.info(json.dumps(record, default=str))
+
+
+class Trace(Span):
+    """Root span of an agent execution, sampled with probability sample_rate.
+
+    While it is open, the spans opened for the execution of context are its children, in any thread."""
+
+    __slots__ = ("sample_rate",)
+
+    def __init__(self, name: str, context, sample_rate: Optional[float] = None, **attributes: Any):
+        super().__init__(name, context, **attributes)
+        self.sample_rate = constants.TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    def __enter__(self) -> "Trace":
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            self._start_sampled(f"{random.getrandbits(64):016x}", None)
+            with _executions_lock:
+                _executions[self.context.chat_history] = self
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.sampled:
+            with _executions_lock:
+                _executions.pop(self.context.chat_history, None)
+        super().__exit__(exc_type, exc_val, exc_tb)
+
+
+def current_span() -> Optional[Span]:
+    """Function to return the span of the current thread, None unless an execution is sampled."""
+    return _current.get()
+
+
+def propagate(fn: Callable) -> Callable:
+    """Function to run fn as part of the span of the current thread when it is called from another
+    thread, e.g. when submitted to a thread pool."""
+    parent = _current.get()
+    if parent is None:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _current.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return wrapper
+
+
+def log_to_stream(stream=sys.stderr):
+    """Function to write the spans of sampled executions to stream, one json object per line."""
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
@@ -1,4 +1,9 @@
 import os
+import re
+
+# Transaction hashes in prompts, shared by the router, the answer cache and the transaction debugger
+TX_HASH_PATTERN = re.compile(r"0x[a-fA-F0-9]{64}")
+
 
 def create_file_dict(root_dir: str) -> dict[str, list[str]]:
     file_dict = {}
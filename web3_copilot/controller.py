@@ -0,0 +1,105 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+import threading
+
+import numpy as np
+
+from council.chains import ChainBase
+from council.contexts import AgentContext
+from council.controllers import ExecutionUnit, LLMController
+from council.llm import LLMBase
+
+from web3_copilot.common import constants
+from web3_copilot.common.tracing import Span
+from web3_copilot.common.utils import TX_HASH_PATTERN
+from web3_copilot.doc_retrieval import Retriever
+
+
+class FastRouterController(LLMController):
+    """Controller routing prompts locally, falling back to the LLM for ambiguous prompts.
+
+    Prompts with a transaction hash go to the transaction debugger chain. Other prompts
+    go to the chain whose description is the most similar to them, if it is similar
+    enough and clearly ahead of the next one. The prompt embedding is the query embedding
+    of the retriever, so it is reused by the doc retrieval chain it is routed to."""
+
+    def __init__(
+        self,
+        chains: Sequence[ChainBase],
+        llm: LLMBase,
+        retriever: Retriever,
+        txn_debugger_chain: str,
+        response_threshold: float = 0.0,
+        min_similarity: float = constants.ROUTER_MIN_SIMILARITY,
+        min_margin: float = constants.ROUTER_MIN_MARGIN,
+    ):
+        super().__init__(chains=chains, llm=llm, response_threshold=response_threshold)
+        self.retriever = retriever
+        self.txn_debugger_chain = next(chain for chain in self._chains if chain.name == txn_debugger_chain)
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self._description_embeddings: Optional[np.ndarray] = None
+        self._descriptions_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._routes = {"tx_hash": 0, "embedding": 0, "llm": 0}
+
+    def prepare(self):
+        """Function to embed the chain descriptions, on first use otherwise."""
+        self._descriptions()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._routes)
+
+    def _execute(self, context: AgentContext) -> List[ExecutionUnit]:
+        with Span("controller", context) as span:
+            route, units = self._plan(context)
+            span.set(route=route, chains=[unit.chain.name for unit in units])
+        return units
+
+    def _plan(self, context: AgentContext) -> Tuple[str, List[ExecutionUnit]]:
+        message = context.chat_history.try_last_user_message.unwrap().message
+
+        if TX_HASH_PATTERN.search(message):
+            self._count("tx_hash")
+            context.logger.debug(f'message="fast route" chain="{self.txn_debugger_chain.name}" reason="tx hash"')
+            return "tx_hash", [self._build_execution_unit(self.txn_debugger_chain, context, "", 10)]
+
+        chain, similarity = self._route(message)
+        if chain is not None:
+            self._count("embedding")
+            context.logger.debug(f'message="fast route" chain="{chain.name}" similarity={similarity:.3f}')
+            return "embedding", [self._build_execution_unit(chain, context, "", round(10 * similarity))]
+
+        self._count("llm")
+        return "llm", super()._execute(context)
+
+    def _route(self, message: str) -> Tuple[Optional[ChainBase], float]:
+        """Function to find the chain of a prompt by similarity with the chain descriptions, None if ambiguous."""
+        query = np.asarray(self.retriever._embed_query(message), dtype=np.float32)
+        query /= max(np.linalg.norm(query), 1e-12)
+        similarities = self._descriptions() @ query
+
+        order = np.argsort(-similarities)
+        best = similarities[order[0]]
+        second = similarities[order[1]] if len(order) > 1 else -1.0
+        chain = self._chains[order[0]]
+        # The transaction debugger needs a transaction hash, which the prompt does not have
+        if best < self.min_similarity or best - second < self.min_margin or chain is self.txn_debugger_chain:
+            return None, float(best)
+        return chain, float(best)
+
+    def _descriptions(self) -> np.ndarray:
+        if self._description_embeddings is None:
+            with self._descriptions_lock:
+                if self._description_embeddings is None:
+                    with self.retriever._embedding_lock:
+                        embeddings = self.retriever.embedding_encoder.encode(
+                            [chain.description for chain in self._chains], convert_to_numpy=True
+                        ).astype(np.float32)
+                    embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+                    self._description_embeddings = embeddings
+        return self._description_embeddings
+
+    def _count(self, route: str):
+        with self._lock:
+            self._routes[route] += 1
@@ -1,3 +1,11 @@
 from .encoder import Encoder
 from .extractor import PdfExtractor
+from .manifest import IngestionManifest
+from .pipeline import ExtractionPipeline
+from .reranker import BatchingReranker
+from .lexical import LexicalIndex
 from .retrieval import Retriever
+from .vector_store import ChromaVectorStore, VectorStore
+from .store import RemoteCollection, SharedStoreClient, serve_collections
+from .vector_index import VectorIndex
+from .artifact import ArtifactCollection, NumpyVectorStore, build_artifact
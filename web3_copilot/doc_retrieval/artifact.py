@@ -0,0 +1,378 @@
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+
+from web3_copilot.common import constants
+from .lexical import LexicalIndex
+from .manifest import IngestionManifest
+from .pipeline import ExtractionPipeline
+from .vector_index import VectorIndex
+from .vector_store import VectorStore
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+    from .config import Config
+
+ARTIFACT_VERSION = 3
+ARTIFACT_MANIFEST = "manifest.json"
+EMBEDDINGS_NAME = "embeddings"
+CHUNKS_FILE = "chunks.jsonl"
+LEXICAL_FILE = "lexical.npz"
+# Identifiers of the embedding model compared when an artifact is loaded
+EMBEDDING_MODEL_KEYS = ("name", "revision", "dimension", "content")
+# Weight files are identified by their size and their first and last bytes, not hashed whole
+WEIGHT_FILE_SUFFIXES = (".bin", ".safetensors", ".h5", ".msgpack", ".onnx", ".ot")
+WEIGHT_SAMPLE_BYTES = 1 << 20
+
+
+def embedding_model_fingerprint(model: "SentenceTransformer") -> str:
+    """Function to hash the architecture and weights of an embedding model.
+
+    Only computed when an artifact is built, as hashing every weight takes seconds:
+    loading an artifact compares the cheaper identifiers of embedding_model_identity instead."""
+    m = hashlib.sha256()
+    m.update(repr(model).encode("utf-8"))
+    for name, tensor in model.state_dict().items():
+        m.update(name.encode("utf-8"))
+        m.update(tensor.detach().cpu().numpy().tobytes())
+    return m.hexdigest()
+
+
+def _transformer_config(model: "SentenceTransformer") -> Any:
+    # The transformer is the first module of a SentenceTransformer
+    auto_model = getattr(model[0], "auto_model", None) if hasattr(model, "__getitem__") else None
+    return getattr(auto_model, "config", None)
+
+
+def embedding_model_revision(model: "SentenceTransformer") -> Optional[str]:
+    """Function to return the hub commit the embedding model was downloaded at.
+
+    None for models stored in the cache folder of sentence-transformers, which keeps no revision."""
+    return getattr(_transformer_config(model), "_commit_hash", None)
+
+
+def embedding_model_directory(model: "SentenceTransformer") -> Optional[str]:
+    """Function to return the local directory the embedding model was loaded from."""
+    path = getattr(_transformer_config(model), "_name_or_path", None)
+    return path if path and os.path.isdir(path) else None
+
+
+def model_directory_digest(path: str) -> str:
+    """Function to hash the files of a model directory in milliseconds: configuration and tokenizer
+    files are hashed whole, weight files by their size and their first and last megabyte."""
+    m = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        # Hidden files such as download locks are not part of the model
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for file in sorted(f for f in files if not f.startswith(".")):
+            file_path = os.path.join(root, file)
+            size = os.path.getsize(file_path)
+            m.update(f"{os.path.relpath(file_path, path)}:{size}".encode("utf-8"))
+            with open(file_path, "rb") as f:
+                if file.endswith(WEIGHT_FILE_SUFFIXES) and size > 2 * WEIGHT_SAMPLE_BYTES:
+                    m.update(f.read(WEIGHT_SAMPLE_BYTES))
+                    f.seek(-WEIGHT_SAMPLE_BYTES, os.SEEK_END)
+                m.update(f.read())
+    return m.hexdigest()
+
+
+def embedding_model_identity(name: str, model: "SentenceTransformer") -> Dict[str, Any]:
+    """Function to return the name, revision, dimension and content digest of an embedding model.
+
+    Embeddings of an artifact are only comparable with queries embedded by the same weights,
+    and the chunks were sized by the tokenizer of the same model directory. The content digest
+    is None for models not loaded from a local directory."""
+    directory = embedding_model_directory(model)
+    return {
+        "name": name,
+        "revision": embedding_model_revision(model),
+        "dimension": model.get_sentence_embedding_dimension(),
+        "content": model_directory_digest(directory) if directory is not None else None,
+    }
+
+
+def tokenizer_fingerprint(tokenizer: Any) -> str:
+    """Function to hash the vocabulary and rules of the HF tokenizer used to chunk documents."""
+    if getattr(tokenizer, "is_fast", False):
+        data = tokenizer.backend_tokenizer.to_str()
+    else:
+        data = json.dumps(tokenizer.get_vocab(), sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def build_artifact(
+    config: "Config",
+    file_dict: Dict[str, List[str]],
+    data_dir: str,
+    output_dir: str,
+    dtype: str = "float32",
+    num_lists: int = 0,
+    batch_size: int = 128,
+) -> Dict[str, Any]:
+    """Function to extract, chunk and embed the documents of every index into an artifact directory.
+
+    Embeddings are stored as dtype (float32, float16 or int8), grouped in num_lists IVF lists if given.
+    The artifact is written next to output_dir first and only replaces it once complete.
+    Returns the manifest of the artifact."""
+    output_dir = os.path.abspath(output_dir)
+    tmp_dir = f"{output_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    identity = config.embedding_identity
+    manifest = {
+        "version": ARTIFACT_VERSION,
+        "created_at": time.time(),
+        # The fingerprints are computed once here, for the record, and never on load
+        "embedding_model": dict(identity, fingerprint=embedding_model_fingerprint(config.embedding_encoder)),
+        "tokenizer": {
+            "name": identity["name"],
+            "revision": identity["revision"],
+            "content": identity["content"],
+            "fingerprint": tokenizer_fingerprint(config.pdf_extractor.tokenizer),
+            "max_chunk_size": constants.MAX_CHUNK_SIZE,
+        },
+        "context_encoding": config.encoding_name,
+        "storage": {"dtype": dtype, "num_lists": num_lists},
+        "indices": {},
+    }
+
+    with ExtractionPipeline(
+        config.pdf_extractor,
+        num_workers=constants.INGESTION_NUM_WORKERS,
+        pages_per_task=constants.INGESTION_PAGES_PER_TASK,
+    ) as pipeline:
+        for index, files in file_dict.items():
+            start = time.perf_counter()
+            paths = {file: os.path.join(data_dir, index, file) for file in files}
+            manifest["indices"][index] = _build_index(
+                config, pipeline, paths, os.path.join(tmp_dir, index), dtype, num_lists, batch_size
+            )
+            print(
+                f"built {index} index: {manifest['indices'][index]['num_chunks']} chunks "
+                f"in {time.perf_counter() - start:.1f}s"
+            )
+
+    with open(os.path.join(tmp_dir, ARTIFACT_MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=4)
+
+    # Swap the complete artifact in place of the previous one
+    old_dir = f"{output_dir}.old-{os.getpid()}"
+    if os.path.exists(output_dir):
+        os.replace(output_dir, old_dir)
+    os.replace(tmp_dir, output_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    return manifest
+
+
+def _build_index(
+    config: "Config",
+    pipeline: ExtractionPipeline,
+    paths: Dict[str, str],
+    index_dir: str,
+    dtype: str,
+    num_lists: int,
+    batch_size: int,
+) -> Dict[str, Any]:
+    os.makedirs(index_dir)
+    chunk_hashes = {file: {} for file in paths}
+    embeddings = []
+    lexical = LexicalIndex()
+    batch = []
+
+    def embed(chunks: List[Dict[str, Any]]):
+        texts = [chunk["text"] for chunk in chunks]
+        lexical.upsert([chunk["id"] for chunk in chunks], texts)
+        embeddings.append(
+            config.embedding_encoder.encode(
+                texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True
+            ).astype(np.float32)
+        )
+
+    # Chunks are written as they are extracted, in the same order as their embeddings
+    with open(os.path.join(index_dir, CHUNKS_FILE), "w") as f:
+        for file, chunks in pipeline.extract(paths):
+            for chunk in chunks:
+                chunk_hashes[file][chunk["id"]] = IngestionManifest.hash_chunk(chunk["text"], chunk["metadata"])
+                f.write(json.dumps({"id": chunk["id"], "text": chunk["text"], "metadata": chunk["metadata"]}))
+                f.write("\n")
+                batch.append(chunk)
+                if len(batch) == batch_size:
+                    embed(batch)
+                    batch = []
+        if batch:
+            embed(batch)
+
+    dimension = config.embedding_encoder.get_sentence_embedding_dimension()
+    matrix = np.concatenate(embeddings) if embeddings else np.zeros((0, dimension), dtype=np.float32)
+    VectorIndex.build(matrix, dtype=dtype, num_lists=num_lists).save(index_dir, EMBEDDINGS_NAME)
+    lexical.save(os.path.join(index_dir, LEXICAL_FILE))
+
+    # Same content fingerprint as an ingested collection, used as the version of the index
+    index_manifest = IngestionManifest(None)
+    for file, path in paths.items():
+        index_manifest.update_file(file, IngestionManifest.hash_file(path), chunk_hashes[file])
+
+    return {
+        "num_chunks": len(matrix),
+        "fingerprint": index_manifest.fingerprint(),
+        "files": {file: entry["hash"] for file, entry in index_manifest.files.items()},
+    }
+
+
+class ArtifactIndex:
+    """Chunks, normalized embeddings and BM25 index of one index of an artifact,
+    the embeddings memory-mapped read-only."""
+
+    def __init__(self, index_dir: str, version: str):
+        self.version = version
+        self.vectors = VectorIndex.load(index_dir, EMBEDDINGS_NAME)
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        with open(os.path.join(index_dir, CHUNKS_FILE), "r") as f:
+            for line in f:
+                chunk = json.loads(line)
+                self.ids.append(chunk["id"])
+                self.documents.append(chunk["text"])
+                self.metadatas.append(chunk["metadata"])
+
+        self.positions = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+
+        if len(self.ids) != len(self.vectors):
+            raise ValueError(
+                f"index artifact `{index_dir}` has {len(self.ids)} chunks but {len(self.vectors)} embeddings"
+            )
+
+        # Artifacts built without a BM25 index get one built from their chunks
+        self.lexical = LexicalIndex.load(os.path.join(index_dir, LEXICAL_FILE))
+        if self.lexical is None:
+            self.lexical = LexicalIndex()
+            self.lexical.upsert(self.ids, self.documents)
+
+
+class NumpyVectorStore(VectorStore):
+    """Read-only vector store serving the indices of a prebuilt artifact with numpy, without Chroma."""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        with open(os.path.join(path, ARTIFACT_MANIFEST), "r") as f:
+            self.manifest = json.load(f)
+        self.indices: Dict[str, ArtifactIndex] = {}
+
+    @property
+    def index_names(self) -> List[str]:
+        return list(self.manifest["indices"].keys())
+
+    def load(self, embedding_model: Dict[str, Any], context_encoding: str):
+        """Function to memory-map the indices, refusing artifacts built for another embedding model.
+
+        embedding_model holds the identifiers of the served model, see embedding_model_identity."""
+        if self.manifest.get("version") != ARTIFACT_VERSION:
+            raise ValueError(
+                f"index artifact `{self.path}` has version {self.manifest.get('version')}, expected {ARTIFACT_VERSION}"
+            )
+        # The chunks were sized by the tokenizer of the embedding model repository
+        for entry in ("embedding_model", "tokenizer"):
+            built = {key: self.manifest[entry].get(key) for key in EMBEDDING_MODEL_KEYS if key in self.manifest[entry]}
+            served = {key: embedding_model[key] for key in built}
+            if built != served:
+                raise ValueError(
+                    f"index artifact `{self.path}` was built with another {entry.replace('_', ' ')} "
+                    f"({built}, serving {served}), rebuild it with ingest.py"
+                )
+        if self.manifest["embedding_model"].get("content") is None:
+            logging.warning(
+                f'message="index artifact embedding model not verified" path="{self.path}" '
+                f'reason="no local model directory to compare the weights of"'
+            )
+        if self.manifest["context_encoding"] != context_encoding:
+            raise ValueError(
+                f"index artifact `{self.path}` counts tokens with `{self.manifest['context_encoding']}`, "
+                f"expected `{context_encoding}`"
+            )
+
+        self.indices = {
+            name: ArtifactIndex(os.path.join(self.path, name), entry["fingerprint"])
+            for name, entry in self.manifest["indices"].items()
+        }
+
+    def _open_collection(self, name: str) -> "ArtifactCollection":
+        if name not in self.manifest["indices"]:
+            raise ValueError(f"index artifact `{self.path}` has no index `{name}`")
+        return ArtifactCollection(name, self)
+
+
+class ArtifactCollection:
+    """Index of an artifact, with the Collection methods used by the retriever.
+
+    Distances are cosine distances as in Chroma. Queries are scored against every embedding,
+    or against the embeddings of the nprobe closest IVF lists if the artifact has some."""
+
+    def __init__(self, name: str, client: NumpyVectorStore, nprobe: int = constants.IVF_NPROBE):
+        self.name = name
+        self.nprobe = nprobe
+        self._client = client
+
+    def _index(self) -> ArtifactIndex:
+        index = self._client.indices.get(self.name)
+        if index is None:
+            raise RuntimeError(f"index artifact `{self._client.path}` is not loaded yet")
+        return index
+
+    def count(self) -> int:
+        return len(self._index().ids)
+
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        include: Iterable[str] = ("documents", "metadatas", "distances"),
+        **kwargs,
+    ) -> Dict[str, Any]:
+        index = self._index()
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        positions, scores = index.vectors.search(queries, n_results, nprobe=self.nprobe)
+        # Rows missing from small IVF lists are padded with -1
+        found = positions >= 0
+        top = [row[mask].tolist() for row, mask in zip(positions, found)]
+        distances = [(1 - row[mask]).tolist() for row, mask in zip(scores, found)]
+
+        return _results(index, top, distances, include)
+
+    def get(self, ids: Optional[List[str]] = None, include: Iterable[str] = ("documents", "metadatas"), **kwargs):
+        index = self._index()
+        if ids is None:
+            positions = list(range(len(index.ids)))
+        else:
+            positions = [index.positions[chunk_id] for chunk_id in ids if chunk_id in index.positions]
+
+        return {
+            "ids": [index.ids[i] for i in positions],
+            "documents": [index.documents[i] for i in positions] if "documents" in include else None,
+            "metadatas": [index.metadatas[i] for i in positions] if "metadatas" in include else None,
+            "embeddings": None,
+        }
+
+
+def _results(
+    index: ArtifactIndex, positions: List[List[int]], distances: List[List[float]], include: Iterable[str]
+) -> Dict[str, Any]:
+    """Function to shape query results like Chroma, one list per query."""
+    return {
+        "ids": [[index.ids[i] for i in row] for row in positions],
+        "documents": [[index.documents[i] for i in row] for row in positions] if "documents" in include else None,
+        "metadatas": [[index.metadatas[i] for i in row] for row in positions] if "metadatas" in include else None,
+        "distances": distances if "distances" in include else None,
+        "embeddings": None,
+    }
@@ -1,22 +1,43 @@
 import logging
-from typing import Union
+from contextlib import ExitStack
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Union
 import os
+import threading
+import time
 
 import chromadb
 import tiktoken
-from chromadb import PersistentClient, Settings
-from sentence_transformers import CrossEncoder, SentenceTransformer
+from chromadb import Settings
+from chromadb.api.models.Collection import Collection
 from tiktoken import Encoding
 
 from web3_copilot.common import constants
 from web3_copilot.common.utils import create_file_dict
 from web3_copilot.doc_retrieval import Encoder
 from web3_copilot.doc_retrieval import PdfExtractor
+from web3_copilot.doc_retrieval import IngestionManifest
+from web3_copilot.doc_retrieval import ExtractionPipeline
+from .artifact import NumpyVectorStore, embedding_model_identity
+from .lexical import LexicalIndex
+from .vector_store import ChromaVectorStore, VectorStore
+
+if TYPE_CHECKING:
+    from sentence_transformers import CrossEncoder, SentenceTransformer
+
+MODEL_NAMES = ("embedding_encoder", "cross_encoder_model", "tokenizer")
 
 
 class Config:
-    _embedding_encoder: Union[None, SentenceTransformer] = None
-    _cross_encoder_model: Union[None, CrossEncoder] = None
+    """Models and database of the doc retrieval skills.
+
+    Models are loaded on first use, or all at once by load_models. The pdf extractor
+    and the encoder are only created when documents have to be ingested.
+
+    With artifact_dir, a prebuilt index artifact (see ingest.py) is served read-only
+    by a NumpyVectorStore instead of the Chroma database, and no documents are ingested."""
+
+    _embedding_encoder: Union[None, "SentenceTransformer"] = None
+    _cross_encoder_model: Union[None, "CrossEncoder"] = None
     _tokenizer: Union[None, Encoding] = None
 
     def __init__(
@@ -24,71 +45,296 @@ class Config:
         encoding_name: str,
         embedding_model_name: str,
         cross_encoder_model_name: str,
+        artifact_dir: Optional[str] = None,
     ):
         self.encoding_name = encoding_name
         self.embedding_model_name = embedding_model_name
         self.cross_encoder_model_name = cross_encoder_model_name
+        self.artifact_dir = artifact_dir
+        self._embedding_identity: Optional[Dict[str, Any]] = None
+        # Collection name -> fingerprint of its content, used to invalidate retrieval caches
+        self._collection_versions: Dict[str, str] = {}
+        # Collection name -> BM25 index of its chunks, for hybrid retrieval
+        self._lexical_indices: Dict[str, LexicalIndex] = {}
+        self._model_locks = {name: threading.Lock() for name in MODEL_NAMES}
+        self._pdf_extractor: Optional[PdfExtractor] = None
+        self._encoder: Optional[Encoder] = None
+        self.database_synced = False
+        # Seconds spent loading each model and syncing the database
+        self.timings: Dict[str, float] = {}
 
-    def initialize(self) -> PersistentClient():
-        # Initialize retrieval and ranking models
-        self._embedding_encoder = SentenceTransformer(self.embedding_model_name)
-        self._cross_encoder_model = CrossEncoder(self.cross_encoder_model_name)
+    def initialize(self, lazy: bool = False) -> VectorStore:
+        """Function to open the vector store, after loading the models and syncing the database unless lazy.
 
-        # Initialize tokenizer
-        self._tokenizer = tiktoken.get_encoding(self.encoding_name)
+        In lazy mode the collections are only up to date once sync_database was called."""
+        if not lazy:
+            self.load_models()
 
-        # Initialize pdf text extractor
-        self._pdf_extractor = PdfExtractor(
-            self.embedding_model_name, max_chunk_size=constants.MAX_CHUNK_SIZE
-        )
+        store = self._open_database()
+        if not lazy:
+            self.sync_database(store)
 
-        # Initialize encoder
-        self._encoder = Encoder(self._embedding_encoder)
+        return store
 
-        # Initialize database
-        return self._init_database()
+    def load_models(self):
+        # Initialize retrieval and ranking models, and tokenizer
+        for name in MODEL_NAMES:
+            getattr(self, name)
 
-    def _init_database(self) -> PersistentClient():
-        logging.info('message="initialize database started"')
-        client = chromadb.PersistentClient(
-            path=constants.DB_PERSIST_DIR,
-            settings=Settings(anonymized_telemetry=False)
+    def loaded_models(self) -> Dict[str, bool]:
+        return {name: getattr(self, f"_{name}") is not None for name in MODEL_NAMES}
+
+    def index_names(self) -> List[str]:
+        """Function to list the document indices, from the artifact or the data subdirectories."""
+        if self.artifact_dir is not None:
+            return NumpyVectorStore(self.artifact_dir).index_names
+        return list(create_file_dict(constants.DATA_DIR).keys())
+
+    def _open_database(self) -> VectorStore:
+        if self.artifact_dir is not None:
+            return NumpyVectorStore(self.artifact_dir)
+
+        return ChromaVectorStore(
+            chromadb.PersistentClient(
+                path=constants.DB_PERSIST_DIR,
+                settings=Settings(anonymized_telemetry=False)
+            )
         )
 
+    def sync_database(self, store: VectorStore):
+        """Function to bring every collection up to date with the documents in the data directory,
+        or to load the indices of the artifact."""
+        if isinstance(store, NumpyVectorStore):
+            self._load_artifact(store)
+            return
+
+        logging.info('message="initialize database started"')
+        start = time.perf_counter()
+
         # Return data subdirectories to determine database indices to create
         file_dict = create_file_dict(constants.DATA_DIR)
-        for index, files in file_dict.items():
-            collection = client.get_or_create_collection(
-                name=index, metadata={"hnsw:space": "cosine"}
-            )
-            # If the collection is empty, populate the database
-            if collection.count() == 0:
-                print(f"{index} has no collection, creating...")
-                # Store text chunks for a directory
-                data = []
-                # Extract text from files
-                for file in files:
-                    chunks = self._pdf_extractor.extract_and_chunk(
-                        os.path.join(constants.DATA_DIR, index, file)
+        with ExitStack() as stack:
+            pipeline = None
+
+            def get_pipeline() -> ExtractionPipeline:
+                # Extraction workers are only started if some documents changed
+                nonlocal pipeline
+                if pipeline is None:
+                    pipeline = stack.enter_context(
+                        ExtractionPipeline(
+                            self.pdf_extractor,
+                            num_workers=constants.INGESTION_NUM_WORKERS,
+                            pages_per_task=constants.INGESTION_PAGES_PER_TASK,
+                        )
                     )
-                    data.extend(chunks)
-                # Create document embeddings
-                self._encoder.encodeInCollection(data, collection)
-                print(f"created {index} collection")
+                return pipeline
+
+            for index, files in file_dict.items():
+                collection = store.collection(index)
+                self._sync_collection(index, files, collection, get_pipeline)
 
+        self.database_synced = True
+        self.timings["sync_database"] = time.perf_counter() - start
         logging.info('message="database initialization completed"')
-        return client
 
+    def _load_artifact(self, store: NumpyVectorStore):
+        start = time.perf_counter()
+        store.load(self.embedding_identity, context_encoding=self.encoding_name)
+        for name, index in store.indices.items():
+            self._collection_versions[name] = index.version
+            self._lexical_indices[name] = index.lexical
+
+        self.database_synced = True
+        self.timings["load_artifact"] = time.perf_counter() - start
+        logging.info(f'message="index artifact loaded" path="{store.path}" indices={store.index_names}')
+
+    def _sync_collection(
+        self,
+        index: str,
+        files: List[str],
+        collection: Collection,
+        pipeline: Callable[[], ExtractionPipeline],
+    ):
+        """Function to embed new or changed chunks of an index and delete chunks whose source is gone,
+        updating the BM25 index of the collection along with it."""
+        manifest = IngestionManifest.load(constants.MANIFEST_DIR, index)
+        lexical_path = os.path.join(constants.LEXICAL_INDEX_DIR, f"{index}.npz")
+        lexical = LexicalIndex.load(lexical_path)
+        # Rebuilt from the stored chunks if missing or out of step with the collection
+        if lexical is None or len(lexical) != collection.count():
+            lexical = self._collection_lexical_index(collection)
+            lexical.save(lexical_path)
+        self._lexical_indices[index] = lexical
+
+        # Only trust the manifest if it agrees with the collection, e.g. the
+        # database may have been deleted while the manifest was kept
+        if manifest.num_chunks() == collection.count():
+            existing = manifest.chunk_hashes()
+        else:
+            manifest = IngestionManifest(manifest.path)
+            existing = self._collection_chunk_hashes(collection)
+
+        file_hashes = {
+            file: IngestionManifest.hash_file(os.path.join(constants.DATA_DIR, index, file))
+            for file in files
+        }
+        changed_files = manifest.changed_files(file_hashes)
+        removed_files = manifest.removed_files(file_hashes)
+        if not changed_files and not removed_files and existing.keys() == manifest.chunk_hashes().keys():
+            self._collection_versions[index] = manifest.fingerprint()
+            return
+
+        print(
+            f"updating {index} collection: "
+            f"{len(changed_files)} new or changed files, {len(removed_files)} removed files"
+        )
+        stale_ids = set()
+        for file in removed_files:
+            stale_ids |= manifest.chunk_ids(file)
+            manifest.remove_file(file)
+
+        # Stream new or changed text chunks of a directory into the encoder
+        chunk_hashes = {file: {} for file in changed_files}
+        num_upserted = 0
+        # Chunks whose text is unchanged only need their metadata updated
+        metadata_updates = []
+
+        def pending_chunks():
+            nonlocal num_upserted
+            paths = {file: os.path.join(constants.DATA_DIR, index, file) for file in changed_files}
+            for file, chunks in pipeline().extract(paths):
+                for chunk in chunks:
+                    chunk_hash = IngestionManifest.hash_chunk(chunk["text"], chunk["metadata"])
+                    chunk_hashes[file][chunk["id"]] = chunk_hash
+                    existing_hash = existing.get(chunk["id"])
+                    if existing_hash == chunk_hash:
+                        continue
+                    if existing_hash is not None and IngestionManifest.same_text(existing_hash, chunk_hash):
+                        metadata_updates.append(chunk)
+                    else:
+                        num_upserted += 1
+                        yield chunk
+
+        def lexically_indexed(chunks, batch_size: int = 128):
+            # Chunks are indexed for lexical search in batches, as they are embedded
+            batch = []
+            for chunk in chunks:
+                batch.append(chunk)
+                if len(batch) == batch_size:
+                    lexical.upsert([c["id"] for c in batch], [c["text"] for c in batch])
+                    batch = []
+                yield chunk
+            if batch:
+                lexical.upsert([c["id"] for c in batch], [c["text"] for c in batch])
+
+        # Create document embeddings
+        if changed_files:
+            self.encoder.encodeInCollection(lexically_indexed(pending_chunks()), collection)
+            self.encoder.updateMetadataInCollection(metadata_updates, collection)
+
+        for file in changed_files:
+            stale_ids |= manifest.chunk_ids(file) - chunk_hashes[file].keys()
+            manifest.update_file(file, file_hashes[file], chunk_hashes[file])
+
+        # Chunks in the collection which no file produces anymore
+        current_ids = manifest.chunk_hashes().keys()
+        stale_ids |= existing.keys() - current_ids
+        stale_ids -= current_ids
+
+        if stale_ids:
+            collection.delete(ids=list(stale_ids))
+            lexical.delete(list(stale_ids))
+
+        manifest.save()
+        lexical.save(lexical_path)
+        self._collection_versions[index] = manifest.fingerprint()
+        print(
+            f"updated {index} collection: {num_upserted} chunks upserted, "
+            f"{len(metadata_updates)} chunks with new metadata, {len(stale_ids)} chunks deleted"
+        )
+
+    @staticmethod
+    def _collection_chunk_hashes(collection: Collection) -> Dict[str, str]:
+        """Function to compute the content hash of every chunk already stored in a collection."""
+        if collection.count() == 0:
+            return {}
+
+        stored = collection.get(include=["documents", "metadatas"])
+        return {
+            doc_id: IngestionManifest.hash_chunk(text, metadata)
+            for doc_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        }
+
+    @staticmethod
+    def _collection_lexical_index(collection: Collection) -> LexicalIndex:
+        """Function to build the BM25 index of the chunks already stored in a collection."""
+        lexical = LexicalIndex()
+        if collection.count() > 0:
+            stored = collection.get(include=["documents"])
+            lexical.upsert(stored["ids"], stored["documents"])
+        return lexical
 
+    def collection_version(self, collection_name: str) -> Optional[str]:
+        return self._collection_versions.get(collection_name)
+
+    def lexical_index(self, collection_name: str) -> Optional[LexicalIndex]:
+        return self._lexical_indices.get(collection_name)
+
+    @property
+    def embedding_encoder(self) -> "SentenceTransformer":
+        return self._get_or_load("embedding_encoder", self._load_embedding_encoder)
 
     @property
-    def embedding_encoder(self):
-        return self._embedding_encoder
+    def cross_encoder_model(self) -> "CrossEncoder":
+        return self._get_or_load("cross_encoder_model", self._load_cross_encoder_model)
 
     @property
-    def cross_encoder_model(self):
-        return self._cross_encoder_model
+    def tokenizer(self) -> Encoding:
+        return self._get_or_load("tokenizer", lambda: tiktoken.get_encoding(self.encoding_name))
 
     @property
-    def tokenizer(self):
-        return self._tokenizer
+    def embedding_identity(self) -> Dict[str, Any]:
+        if self._embedding_identity is None:
+            self._embedding_identity = embedding_model_identity(self.embedding_model_name, self.embedding_encoder)
+        return self._embedding_identity
+
+    @property
+    def pdf_extractor(self) -> PdfExtractor:
+        # Initialize pdf text extractor
+        if self._pdf_extractor is None:
+            self._pdf_extractor = PdfExtractor(
+                self.embedding_model_name,
+                max_chunk_size=constants.MAX_CHUNK_SIZE,
+                context_tokenizer=self.tokenizer,
+            )
+        return self._pdf_extractor
+
+    @property
+    def encoder(self) -> Encoder:
+        # Initialize encoder
+        if self._encoder is None:
+            self._encoder = Encoder(self.embedding_encoder)
+        return self._encoder
+
+    def _get_or_load(self, name: str, load: Callable[[], Any]) -> Any:
+        model = getattr(self, f"_{name}")
+        if model is None:
+            # Concurrent first uses wait for a single load
+            with self._model_locks[name]:
+                model = getattr(self, f"_{name}")
+                if model is None:
+                    start = time.perf_counter()
+                    model = load()
+                    setattr(self, f"_{name}", model)
+                    self.timings[name] = time.perf_counter() - start
+                    logging.info(f'message="model loaded" model="{name}" seconds={self.timings[name]:.2f}')
+        return model
+
+    def _load_embedding_encoder(self) -> "SentenceTransformer":
+        # Imported on first use, as importing torch alone takes seconds
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(self.embedding_model_name)
+
+    def _load_cross_encoder_model(self) -> "CrossEncoder":
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(self.cross_encoder_model_name)
@@ -0,0 +1,40 @@
+from typing import List
+
+DOCUMENT_SEPARATOR = "\n\n"
+
+
+def pack_documents(
+    documents: List[str],
+    num_tokens: List[int],
+    token_limit: int,
+    separator_tokens: int = 1,
+    strategy: str = "greedy",
+) -> str:
+    """Function to join ranked documents into a context fitting in a token budget.
+
+    The token count of each document is given, so no document is tokenized.
+    "greedy" keeps documents in rank order until the first one that does not fit.
+    "best_fit" then fills the remaining budget with the largest remaining documents that still fit.
+    Selected documents always keep their rank order."""
+
+    if strategy not in ("greedy", "best_fit"):
+        raise ValueError(f"unknown context packing strategy `{strategy}`")
+
+    sizes = [n + separator_tokens for n in num_tokens]
+    selected = []
+    used_tokens = 0
+    for i, size in enumerate(sizes):
+        if used_tokens + size > token_limit:
+            break
+        selected.append(i)
+        used_tokens += size
+
+    if strategy == "best_fit":
+        remaining = sorted(range(len(selected), len(sizes)), key=lambda i: sizes[i], reverse=True)
+        for i in remaining:
+            if used_tokens + sizes[i] <= token_limit:
+                selected.append(i)
+                used_tokens += sizes[i]
+        selected.sort()
+
+    return "".join(documents[i] + DOCUMENT_SEPARATOR for i in selected)
@@ -1,20 +1,42 @@
 import logging
-from typing import Any, Dict, List
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List
 
 from chromadb.api.models.Collection import Collection
-from sentence_transformers import SentenceTransformer
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
 
 class Encoder:
-    def __init__(self, embedding_model: SentenceTransformer):
+    def __init__(self, embedding_model: "SentenceTransformer"):
         self.embedding_model = embedding_model
 
     def encodeInCollection(
+        self, data: Iterable[Dict[str, Any]], collection: Collection, batch_size: int = 128
+    ):
+        # data may be a generator so chunks are embedded as soon as a full batch is available
+        batch = []
+        batch_number = 1
+        for doc in data:
+            batch.append(doc)
+            if len(batch) == batch_size:
+                self._process_batch(batch, collection, batch_number)
+                batch = []
+                batch_number += 1
+        if batch:
+            self._process_batch(batch, collection, batch_number)
+
+    def updateMetadataInCollection(
         self, data: List[Dict[str, Any]], collection: Collection, batch_size: int = 128
     ):
+        """Function to update the metadata of chunks already stored, without embedding them again."""
         for i in range(0, len(data), batch_size):
             batch = data[i : i + batch_size]
-            self._process_batch(batch, collection, (i // batch_size) + 1)
+            logging.info(f'message="update metadata in collection batch {(i // batch_size) + 1}"')
+            collection.update(
+                ids=[doc["id"] for doc in batch],
+                metadatas=[doc["metadata"] for doc in batch],
+            )
 
     def _process_batch(self, batch, collection, i):
         ids, texts, metadatas = [], [], []
@@ -32,8 +54,8 @@ class Encoder:
             texts, convert_to_tensor=False
         ).tolist()
 
-        # Store the batch to the database
-        logging.info(f'message="add to collection batch {i}"')
-        collection.add(
+        # Store the batch to the database, replacing chunks with the same id
+        logging.info(f'message="upsert to collection batch {i}"')
+        collection.upsert(
             documents=texts, embeddings=embeddings, metadatas=metadatas, ids=ids
         )
@@ -1,39 +1,101 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 import os
 import re
 import hashlib
 
 from pypdf import PdfReader
-
-from transformers import AutoTokenizer
+from tiktoken import Encoding
 
 
 class PdfExtractor:
     """Extract text from pdf documents and create text chunks for embedding model."""
 
-    def __init__(self, embedding_model_name, max_chunk_size):
+    def __init__(self, embedding_model_name, max_chunk_size, context_tokenizer: Optional[Encoding] = None):
         super().__init__()
+        # Imported here, the extractor is only needed when documents are ingested
+        from transformers import AutoTokenizer
         self.tokenizer = AutoTokenizer.from_pretrained(embedding_model_name)
         self.max_chunk_size = max_chunk_size
-
-    def extract_and_chunk(self, path: str) -> List[Dict[str, Any]]:
+        # Tokenizer of the LLM prompt, used to store the token count of each chunk
+        self.context_tokenizer = context_tokenizer
+        self._additive_tokenizer = self._is_additive_tokenizer()
+
+    def extract_and_chunk(
+        self, path: str, page_range: Optional[Tuple[int, int]] = None
+    ) -> List[Dict[str, Any]]:
+        """Function to extract and chunk the pages of a pdf, optionally only the pages in [start, stop)."""
         data = []
 
         with open(path, "rb") as f:
             pdf_reader = PdfReader(f)
-            for page_num in range(len(pdf_reader.pages)):
+            start, stop = page_range if page_range else (0, len(pdf_reader.pages))
+            for page_num in range(start, min(stop, len(pdf_reader.pages))):
                 page = pdf_reader.pages[page_num]
                 text = page.extract_text()
                 text_list = self._split_text(text)
                 chunks = self._create_chunks(
                     text_list, self.max_chunk_size, page_num, self._get_source(path)
                 )
+                self._add_token_counts(chunks)
                 data.extend(chunks)
 
         return data
 
+    @staticmethod
+    def count_pages(path: str) -> int:
+        with open(path, "rb") as f:
+            return len(PdfReader(f).pages)
+
     def _create_chunks(self, text_list, max_size, page_number, source):
-        """Function to create text chunks from a page."""
+        """Function to create text chunks from a page.
+
+        Sentences of a page are tokenized once in a single batch and chunk sizes
+        are summed incrementally, giving the same chunks as _create_chunks_reencode."""
+
+        if not self._additive_tokenizer:
+            return self._create_chunks_reencode(text_list, max_size, page_number, source)
+
+        if not text_list:
+            return []
+
+        sentence_sizes = [
+            len(input_ids)
+            for input_ids in self.tokenizer(
+                text_list,
+                add_special_tokens=False,
+                return_attention_mask=False,
+                return_token_type_ids=False,
+            )["input_ids"]
+        ]
+        num_special_tokens = self.tokenizer.num_special_tokens_to_add()
+
+        chunks = []
+        chunk_sentences = []
+        chunk_size = num_special_tokens
+        chunk_number = 0
+        for sentence, sentence_size in zip(text_list, sentence_sizes):
+            if chunk_size + sentence_size <= max_size:
+                chunk_sentences.append(sentence)
+                chunk_size += sentence_size
+            else:
+                chunks.append(
+                    self._format_chunk(
+                        "\n".join(chunk_sentences), chunk_number, page_number, source
+                    )
+                )
+                chunk_sentences = [sentence]
+                chunk_size = num_special_tokens + sentence_size
+                chunk_number += 1
+        if chunk_sentences:
+            chunks.append(
+                self._format_chunk(
+                    "\n".join(chunk_sentences), chunk_number, page_number, source
+                )
+            )
+        return chunks
+
+    def _create_chunks_reencode(self, text_list, max_size, page_number, source):
+        """Function to create text chunks from a page by re-tokenizing the whole chunk for every sentence."""
 
         chunks = []
         chunk = ""
@@ -53,6 +115,29 @@ class PdfExtractor:
             chunks.append(self._format_chunk(chunk, chunk_number, page_number, source))
         return chunks
 
+    def _is_additive_tokenizer(self) -> bool:
+        """Whether the token count of newline joined sentences is the sum of their token counts.
+
+        This holds for fast tokenizers which pre-tokenize on whitespace, such as the
+        wordpiece tokenizers of the sentence-transformers models."""
+        if not getattr(self.tokenizer, "is_fast", False):
+            return False
+
+        pre_tokenizer = self.tokenizer.backend_tokenizer.pre_tokenizer
+        return type(pre_tokenizer).__name__ in ("BertPreTokenizer", "Whitespace", "WhitespaceSplit")
+
+    def _add_token_counts(self, chunks: List[Dict[str, Any]]):
+        """Function to store the number of prompt tokens of each chunk in its metadata,
+        so that contexts can be built without tokenizing documents at query time."""
+        if self.context_tokenizer is None or not chunks:
+            return
+
+        encoded_chunks = self.context_tokenizer.encode_ordinary_batch(
+            [chunk["text"] for chunk in chunks]
+        )
+        for chunk, tokens in zip(chunks, encoded_chunks):
+            chunk["metadata"]["num_tokens"] = len(tokens)
+
     @staticmethod
     def _format_chunk(
         text: str, chunk_number: int, page_number: int, source: str
@@ -0,0 +1,185 @@
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+import os
+import re
+
+import numpy as np
+
+from web3_copilot.common import constants
+
+# Identifiers such as `keyring-backend`, `eth_call` or `0xa9059cbb` are kept whole, and also split in parts
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+(?:[-.][a-z0-9_]+)*")
+TOKEN_PART_PATTERN = re.compile(r"[-._]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Function to split a text into lowercase terms, compound identifiers followed by their parts."""
+    terms = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        term = match.group()
+        terms.append(term)
+        parts = [part for part in TOKEN_PART_PATTERN.split(term) if part]
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+class LexicalIndex:
+    """BM25 index of the chunks of a collection, with array-backed postings.
+
+    Each term maps to an array of the rows of the chunks containing it and an array of
+    its frequency in them. Upserted chunks are appended as new rows and their previous
+    rows marked deleted, the postings are compacted once deleted rows outnumber live ones."""
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self._live = np.zeros(0, dtype=bool)
+        self._total_length = 0
+        # term -> (rows, term frequencies)
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def upsert(self, ids: Sequence[str], documents: Sequence[str]):
+        """Function to index chunks, replacing the chunks with the same id."""
+        self.delete(ids)
+
+        start = len(self.ids)
+        lengths = []
+        new_postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for row, (chunk_id, text) in enumerate(zip(ids, documents), start):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                rows, frequencies = new_postings.setdefault(term, ([], []))
+                rows.append(row)
+                frequencies.append(count)
+            self.ids.append(chunk_id)
+            self._rows[chunk_id] = row
+
+        self._lengths = np.concatenate([self._lengths, np.asarray(lengths, dtype=np.int32)])
+        self._live = np.concatenate([self._live, np.ones(len(lengths), dtype=bool)])
+        self._total_length += sum(lengths)
+
+        # One concatenation per term of the batch
+        for term, (rows, frequencies) in new_postings.items():
+            rows = np.asarray(rows, dtype=np.int32)
+            frequencies = np.asarray(frequencies, dtype=np.uint16)
+            existing = self._postings.get(term)
+            if existing is not None:
+                rows = np.concatenate([existing[0], rows])
+                frequencies = np.concatenate([existing[1], frequencies])
+            self._postings[term] = (rows, frequencies)
+
+    def delete(self, ids: Sequence[str]):
+        for chunk_id in ids:
+            row = self._rows.pop(chunk_id, None)
+            if row is not None:
+                self._live[row] = False
+                self._total_length -= int(self._lengths[row])
+
+        if len(self.ids) - len(self._rows) > len(self._rows):
+            self._compact()
+
+    def search(self, query: str, k: int) -> Tuple[List[str], List[float]]:
+        """Function to find the k chunks with the highest BM25 score for the query, best first.
+
+        Only chunks containing at least one term of the query are returned."""
+        num_docs = len(self._rows)
+        if num_docs == 0 or k <= 0:
+            return [], []
+
+        k1, b = constants.BM25_K1, constants.BM25_B
+        average_length = max(self._total_length / num_docs, 1e-6)
+        has_deleted = num_docs < len(self.ids)
+
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            rows, frequencies = postings
+            if has_deleted:
+                live = self._live[rows]
+                rows, frequencies = rows[live], frequencies[live]
+            if len(rows) == 0:
+                continue
+
+            idf = np.log(1 + (num_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            frequencies = frequencies.astype(np.float32)
+            norms = k1 * (1 - b + b * self._lengths[rows] / average_length)
+            # Rows are unique within the postings of a term
+            scores[rows] += idf * frequencies * (k1 + 1) / (frequencies + norms)
+
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = matched[np.argsort(-scores[matched], kind="stable")]
+        return [self.ids[row] for row in top], scores[top].tolist()
+
+    def _compact(self):
+        """Function to drop deleted rows, renumbering the rows of the postings."""
+        kept = np.flatnonzero(self._live)
+        new_rows = np.full(len(self.ids), -1, dtype=np.int32)
+        new_rows[kept] = np.arange(len(kept), dtype=np.int32)
+
+        postings = {}
+        for term, (rows, frequencies) in self._postings.items():
+            live = self._live[rows]
+            if live.any():
+                postings[term] = (new_rows[rows[live]], frequencies[live])
+
+        self.ids = [self.ids[row] for row in kept]
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        self._lengths = self._lengths[kept]
+        self._live = np.ones(len(kept), dtype=bool)
+        self._postings = postings
+
+    def save(self, path: str):
+        """Function to write the index as one array of rows and frequencies for all terms, with their offsets."""
+        if len(self._rows) < len(self.ids):
+            self._compact()
+
+        terms = sorted(self._postings)
+        sizes = [len(self._postings[term][0]) for term in terms]
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        # Write to a temporary file first so that a crash never leaves a partial index
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                ids=np.array(self.ids, dtype=str),
+                lengths=self._lengths,
+                terms=np.array(terms, dtype=str),
+                offsets=np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+                rows=np.concatenate([self._postings[term][0] for term in terms] or [np.zeros(0, dtype=np.int32)]),
+                frequencies=np.concatenate(
+                    [self._postings[term][1] for term in terms] or [np.zeros(0, dtype=np.uint16)]
+                ),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["LexicalIndex"]:
+        """Function to read an index written by save, None if there is none."""
+        if not os.path.exists(path):
+            return None
+
+        index = cls()
+        with np.load(path) as data:
+            index.ids = data["ids"].tolist()
+            index._lengths = data["lengths"]
+            offsets, rows, frequencies = data["offsets"], data["rows"], data["frequencies"]
+            # Postings are views of the arrays of all terms
+            index._postings = {
+                term: (rows[offsets[i] : offsets[i + 1]], frequencies[offsets[i] : offsets[i + 1]])
+                for i, term in enumerate(data["terms"].tolist())
+            }
+        index._rows = {chunk_id: row for row, chunk_id in enumerate(index.ids)}
+        index._live = np.ones(len(index.ids), dtype=bool)
+        index._total_length = int(index._lengths.sum())
+        return index
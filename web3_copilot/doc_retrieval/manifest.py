@@ -0,0 +1,96 @@
+from typing import Any, Dict, List, Set
+import hashlib
+import json
+import os
+
+MANIFEST_VERSION = 2
+
+
+class IngestionManifest:
+    """Track the content hash of each source file and of each chunk stored in a collection."""
+
+    def __init__(self, path: str, files: Dict[str, Dict[str, Any]] = None):
+        self.path = path
+        # file name -> {"hash": file content hash, "chunks": {chunk id: chunk content hash}}
+        self.files = files if files is not None else {}
+
+    @classmethod
+    def load(cls, manifest_dir: str, index: str) -> "IngestionManifest":
+        path = os.path.join(manifest_dir, f"{index}.json")
+        if not os.path.exists(path):
+            return cls(path)
+
+        with open(path, "r") as f:
+            manifest = json.load(f)
+
+        # Manifests written by another version are rebuilt from scratch
+        if manifest.get("version") != MANIFEST_VERSION:
+            return cls(path)
+
+        return cls(path, manifest["files"])
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        # Write to a temporary file first so that a crash never leaves a partial manifest
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": self.files}, f)
+        os.replace(tmp_path, self.path)
+
+    def changed_files(self, file_hashes: Dict[str, str]) -> List[str]:
+        """Function to list the files that are new or whose content changed since the last ingestion."""
+        return [
+            file for file, file_hash in file_hashes.items()
+            if self.files.get(file, {}).get("hash") != file_hash
+        ]
+
+    def removed_files(self, file_hashes: Dict[str, str]) -> List[str]:
+        """Function to list the ingested files that no longer exist."""
+        return [file for file in self.files if file not in file_hashes]
+
+    def chunk_ids(self, file: str) -> Set[str]:
+        return set(self.files.get(file, {}).get("chunks", {}).keys())
+
+    def chunk_hashes(self) -> Dict[str, str]:
+        """Function to return the content hash of every chunk across all files."""
+        hashes = {}
+        for entry in self.files.values():
+            hashes.update(entry["chunks"])
+        return hashes
+
+    def fingerprint(self) -> str:
+        """Function to hash the content of all chunks, changing whenever the collection does."""
+        m = hashlib.md5()
+        for chunk_id, chunk_hash in sorted(self.chunk_hashes().items()):
+            m.update(f"{chunk_id}:{chunk_hash}".encode("utf-8"))
+        return m.hexdigest()
+
+    def num_chunks(self) -> int:
+        return sum(len(entry["chunks"]) for entry in self.files.values())
+
+    def update_file(self, file: str, file_hash: str, chunk_hashes: Dict[str, str]):
+        self.files[file] = {"hash": file_hash, "chunks": chunk_hashes}
+
+    def remove_file(self, file: str):
+        self.files.pop(file, None)
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        m = hashlib.md5()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                m.update(block)
+        return m.hexdigest()
+
+    @staticmethod
+    def hash_chunk(text: str, metadata: Dict[str, Any]) -> str:
+        # Text and metadata are hashed separately so that chunks
+        # whose metadata alone changed are updated without re-embedding
+        text_hash = hashlib.md5(text.encode("utf-8")).hexdigest()
+        metadata_hash = hashlib.md5(json.dumps(metadata, sort_keys=True).encode("utf-8")).hexdigest()
+        return f"{text_hash}:{metadata_hash}"
+
+    @staticmethod
+    def same_text(chunk_hash: str, other_chunk_hash: str) -> bool:
+        return chunk_hash.split(":")[0] == other_chunk_hash.split(":")[0]
@@ -0,0 +1,97 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+import multiprocessing
+import threading
+
+from .extractor import PdfExtractor
+
+# Extractor used by a worker process, set by the pool initializer
+_worker_extractor: Optional[PdfExtractor] = None
+
+
+def _init_worker(extractor: PdfExtractor):
+    global _worker_extractor
+    _worker_extractor = extractor
+
+
+def _extract_task(path: str, page_range: Tuple[int, int]) -> List[Dict[str, Any]]:
+    return _worker_extractor.extract_and_chunk(path, page_range=page_range)
+
+
+class ExtractionPipeline:
+    """Extract and chunk pdf documents, spreading files and page ranges of large files across worker processes."""
+
+    def __init__(self, extractor: PdfExtractor, num_workers: int, pages_per_task: int):
+        self.extractor = extractor
+        self.pages_per_task = pages_per_task
+        self.num_workers = num_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+        # Workers inherit the already loaded tokenizer when forked. Other start
+        # methods re-import the main module in every worker, so extraction stays in-process.
+        if num_workers > 1 and "fork" not in multiprocessing.get_all_start_methods():
+            logging.warning('message="fork start method unavailable, pdf extraction runs in-process"')
+            self.num_workers = 1
+
+    def __enter__(self) -> "ExtractionPipeline":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def extract(self, paths: Dict[str, str]) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+        """Function to yield (file, chunks) pairs as soon as each file or page range is chunked.
+
+        Chunks of a single file may be yielded over several pairs, in any order."""
+        if self.num_workers > 1 and self._pool is None and threading.active_count() > 1:
+            # A forked child only gets the forking thread: locks held by the other threads at the time,
+            # e.g. logging locks, stay locked forever. A server syncing in the background extracts in-process.
+            logging.warning(
+                f'message="other threads are running, pdf extraction runs in-process" '
+                f'threads={threading.active_count()}'
+            )
+            self.num_workers = 1
+
+        if self.num_workers <= 1:
+            for file, path in paths.items():
+                yield file, self.extractor.extract_and_chunk(path)
+            return
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_init_worker,
+                initargs=(self.extractor,),
+            )
+
+        tasks = self._create_tasks(paths)
+        # Bound the number of tasks in flight so that finished chunks do not pile
+        # up in memory while the consumer is busy embedding
+        max_in_flight = 2 * self.num_workers
+        in_flight: Dict[Future, str] = {}
+        while tasks or in_flight:
+            while tasks and len(in_flight) < max_in_flight:
+                file, path, page_range = tasks.pop()
+                in_flight[self._pool.submit(_extract_task, path, page_range)] = file
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield in_flight.pop(future), future.result()
+
+    def _create_tasks(self, paths: Dict[str, str]) -> List[Tuple[str, str, Tuple[int, int]]]:
+        tasks = []
+        for file, path in paths.items():
+            num_pages = PdfExtractor.count_pages(path)
+            for start in range(0, num_pages, self.pages_per_task):
+                tasks.append((file, path, (start, min(start + self.pages_per_task, num_pages))))
+
+        # Tasks are popped from the end, so the first pages of the first files are extracted first
+        tasks.reverse()
+        return tasks
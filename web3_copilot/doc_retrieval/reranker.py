@@ -0,0 +1,89 @@
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Callable, List, Tuple
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from sentence_transformers import CrossEncoder
+
+
+class BatchingReranker:
+    """Score (query, document) pairs with a cross-encoder, running the pairs of
+    concurrent requests together in micro-batches on a single worker thread.
+
+    The worker thread is started on first use in each process, so the reranker can be
+    created before the serving processes are forked. The cross-encoder is only
+    requested from get_cross_encoder when pairs are scored."""
+
+    def __init__(
+        self, get_cross_encoder: Callable[[], "CrossEncoder"], max_batch_size: int, max_wait_ms: float
+    ):
+        self.get_cross_encoder = get_cross_encoder
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._requests: "queue.Queue[Tuple[List[List[str]], Future]]" = queue.Queue()
+        self._worker = None
+        self._worker_pid = None
+        self._lock = threading.Lock()
+
+    def predict(self, sentence_pairs: List[List[str]]) -> np.ndarray:
+        """Function to score sentence pairs, blocking until the micro-batch they joined is scored."""
+        if not sentence_pairs:
+            return np.array([])
+
+        self._start_worker()
+        future = Future()
+        self._requests.put((sentence_pairs, future))
+        return future.result()
+
+    def _start_worker(self):
+        with self._lock:
+            # Threads do not survive a fork, the forked process starts its own worker
+            if self._worker_pid != os.getpid():
+                self._requests = queue.Queue()
+                self._worker = threading.Thread(
+                    target=self._run, args=(self._requests,), name="reranker", daemon=True
+                )
+                self._worker.start()
+                self._worker_pid = os.getpid()
+
+    def _run(self, requests: "queue.Queue[Tuple[List[List[str]], Future]]"):
+        while True:
+            batch = [requests.get()]
+            num_pairs = len(batch[0][0])
+
+            # Collect pairs of other requests until the batch is full or the first request waited long enough
+            deadline = time.monotonic() + self.max_wait
+            while num_pairs < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                num_pairs += len(request[0])
+
+            self._score(batch, num_pairs)
+
+    def _score(self, batch: List[Tuple[List[List[str]], Future]], num_pairs: int):
+        sentence_pairs = [pair for pairs, _ in batch for pair in pairs]
+        logging.debug(f'message="rerank batch" requests={len(batch)} pairs={num_pairs}')
+        try:
+            scores = self.get_cross_encoder().predict(sentence_pairs, batch_size=num_pairs)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        # Hand every request the scores of its own pairs
+        start = 0
+        for pairs, future in batch:
+            future.set_result(scores[start : start + len(pairs)])
+            start += len(pairs)
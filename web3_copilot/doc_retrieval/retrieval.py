@@ -1,44 +1,197 @@
-from typing import Any, Dict, List
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+import hashlib
+import threading
 
+import numpy as np
 from chromadb.api.models.Collection import Collection
 
 from web3_copilot.common import constants
+from web3_copilot.common.cache import LRUCache
+from web3_copilot.common.tracing import Span
 from .config import Config
+from .context import DOCUMENT_SEPARATOR, pack_documents
+from .lexical import LexicalIndex
+from .reranker import BatchingReranker
 
 
 class Retriever:
-    def __init__(self, config: Config):
-        self.embedding_encoder = config.embedding_encoder
-        self.cross_encoder = config.cross_encoder_model
-        self.tokenizer = config.tokenizer
+    def __init__(
+        self,
+        config: Config,
+        adaptive_rerank: bool = constants.ADAPTIVE_RERANK,
+        hybrid: bool = constants.HYBRID_RETRIEVAL,
+    ):
+        self.config = config
+        self.adaptive_rerank = adaptive_rerank
+        self.hybrid = hybrid
+        # Fused rankings are precise enough to rank fewer candidates
+        self.num_candidates = constants.HYBRID_NUM_CANDIDATES if hybrid else constants.NUM_RETRIEVED_DOCUMENTS
+        # The embedding model sets padding and truncation on its shared tokenizer for each call,
+        # so concurrent requests must not encode at the same time
+        self._embedding_lock = threading.Lock()
+        self._separator_tokens: Optional[int] = None
+        # Pairs of concurrent requests are scored together by the cross-encoder
+        self.reranker = BatchingReranker(
+            lambda: self.cross_encoder,
+            max_batch_size=constants.RERANK_MAX_BATCH_SIZE,
+            max_wait_ms=constants.RERANK_MAX_WAIT_MS,
+        )
 
-    def retrieve_docs(self, query: str, collection: Collection) -> Dict[str, Any]:
-        """Function to retrieve ranked results from database"""
-        results = self._query_db(
-            query=query, k=constants.NUM_RETRIEVED_DOCUMENTS, collection=collection
+        # Caches keyed on normalized query text, for repeated questions
+        self._embedding_cache = LRUCache(
+            constants.QUERY_CACHE_SIZE, ttl=constants.QUERY_CACHE_TTL
         )
-        ranked_results = self._rank_results(
-            query=query,
-            db_results=results,
-            num_results=constants.NUM_TOP_RANKED_DOCUMENTS,
+        self._context_cache = LRUCache(
+            constants.QUERY_CACHE_SIZE, ttl=constants.QUERY_CACHE_TTL
         )
-        documents = ranked_results["documents"][0]
-        context = self._build_context(documents)
+
+    # Models are read from the config, which loads them on first use
+    @property
+    def embedding_encoder(self):
+        return self.config.embedding_encoder
+
+    @property
+    def cross_encoder(self):
+        return self.config.cross_encoder_model
+
+    @property
+    def tokenizer(self):
+        return self.config.tokenizer
+
+    def retrieve_docs(self, query: str, collection: Collection) -> Dict[str, Any]:
+        """Function to retrieve ranked results from database
+
+        The query embedding is cached, so the chains retrieving the same prompt
+        from different collections embed it once."""
+        # The collection version changes whenever its content does, so stale contexts are never hit
+        cache_key = (
+            collection.name,
+            self.config.collection_version(collection.name),
+            self._normalize_query(query),
+        )
+        context = self._context_cache.get(cache_key)
+        if context is not None:
+            return context
+
+        with Span("retrieval.query", collection=collection.name) as span:
+            results = self._query_db(
+                query=query, k=self.num_candidates, collection=collection
+            )
+            span.count(candidates=len(results["ids"][0]))
+        with Span("retrieval.rerank") as span:
+            if self.adaptive_rerank:
+                ranked_results = self._rank_results_adaptive(
+                    query=query,
+                    db_results=self._prune_candidates(results),
+                    num_results=constants.NUM_TOP_RANKED_DOCUMENTS,
+                )
+            else:
+                ranked_results = self._rank_results(
+                    query=query,
+                    db_results=results,
+                    num_results=constants.NUM_TOP_RANKED_DOCUMENTS,
+                )
+            span.count(documents=len(ranked_results["ids"][0]))
+        with Span("retrieval.context") as span:
+            context = self._build_context(
+                ranked_results["documents"][0], ranked_results["metadatas"][0]
+            )
+            span.count(context_chars=len(context))
+        self._context_cache.put(cache_key, context)
 
         return context
 
-    def _query_db(self, query: str, k: int, collection: Collection) -> Dict[str, Any]:
+    def invalidate(self, collection_name: Optional[str] = None):
+        """Function to drop the cached contexts of a collection, or of all collections."""
+        if collection_name is None:
+            self._context_cache.invalidate()
+        else:
+            self._context_cache.invalidate(lambda key: key[0] == collection_name)
+
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            "query_embeddings": self._embedding_cache.stats(),
+            "contexts": self._context_cache.stats(),
+        }
+
+    def _embed_query(self, query: str) -> List[float]:
+        """Function to calculate the embedding of a query, reusing the embedding of equivalent queries."""
+        cache_key = self._normalize_query(query)
+        embedded_query = self._embedding_cache.get(cache_key)
+        if embedded_query is None:
+            with Span("retrieval.embed"), self._embedding_lock:
+                embedded_query = self.embedding_encoder.encode(
+                    query, convert_to_tensor=False
+                ).tolist()
+            self._embedding_cache.put(cache_key, embedded_query)
+
+        return embedded_query
+
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        # The embedding model is uncased and ignores repeated whitespace
+        return " ".join(query.lower().split())
+
+    def _query_db(
+        self,
+        query: str,
+        k: int,
+        collection: Collection,
+        embedded_query: Optional[List[float]] = None,
+    ) -> Dict[str, Any]:
         """Function to retrieve top K documents
-        from the database based on similarity to the query."""
+        from the database based on similarity to the query, fused with the
+        top BM25 matches of the query in hybrid mode."""
         # Calculate the embedding for the query
-        embedded_query = self.embedding_encoder.encode(
-            query, convert_to_tensor=False
-        ).tolist()
+        if embedded_query is None:
+            embedded_query = self._embed_query(query)
         # Retrieve documenents from the database
         output = collection.query(query_embeddings=[embedded_query], n_results=k)
 
+        lexical_index = self.config.lexical_index(collection.name) if self.hybrid else None
+        if lexical_index is not None:
+            output = self._fuse_lexical(query, k, collection, output, lexical_index)
+
         return output
 
+    @staticmethod
+    def _fuse_lexical(
+        query: str, k: int, collection: Collection, db_results: Dict[str, Any], lexical_index: LexicalIndex
+    ) -> Dict[str, Any]:
+        """Function to merge the database results with the BM25 matches of the query by reciprocal rank fusion.
+
+        Documents only matched lexically are fetched from the collection, with no distance."""
+        lexical_ids, _ = lexical_index.search(query, k)
+        fused_scores = defaultdict(float)
+        # Dense results come first, so they win ties
+        for ranking in (db_results["ids"][0], lexical_ids):
+            for rank, doc_id in enumerate(ranking):
+                fused_scores[doc_id] += 1 / (constants.RRF_K + rank + 1)
+        fused_ids = sorted(fused_scores, key=fused_scores.get, reverse=True)[:k]
+
+        documents = {
+            doc_id: (doc, metadata, distance)
+            for doc_id, doc, metadata, distance in zip(
+                db_results["ids"][0], db_results["documents"][0],
+                db_results["metadatas"][0], db_results["distances"][0],
+            )
+        }
+        missing_ids = [doc_id for doc_id in fused_ids if doc_id not in documents]
+        if missing_ids:
+            fetched = collection.get(ids=missing_ids, include=["documents", "metadatas"])
+            for doc_id, doc, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"]):
+                documents[doc_id] = (doc, metadata, None)
+
+        # Chunks deleted since the BM25 index was loaded are skipped
+        fused_ids = [doc_id for doc_id in fused_ids if doc_id in documents]
+        return {
+            "ids": [fused_ids],
+            "documents": [[documents[doc_id][0] for doc_id in fused_ids]],
+            "metadatas": [[documents[doc_id][1] for doc_id in fused_ids]],
+            "distances": [[documents[doc_id][2] for doc_id in fused_ids]],
+        }
+
     def _rank_results(
         self, query: str, db_results: Dict[str, Any], num_results: int
     ) -> Dict[str, Any]:
@@ -46,12 +199,73 @@ class Retriever:
          the database based on their relevance to
         the query using a cross-encoder and returning the top ranked documents."""
 
-        ranked_results = {}
-
         # Calculate top-ranked documents
         documents = db_results["documents"][0]
         sentence_pairs = [[query, doc] for doc in documents]
-        rankings = self.cross_encoder.predict(sentence_pairs)
+        rankings = self.reranker.predict(sentence_pairs)
+
+        return self._select_results(db_results, rankings, num_results)
+
+    def _rank_results_adaptive(
+        self, query: str, db_results: Dict[str, Any], num_results: int
+    ) -> Dict[str, Any]:
+        """Function to rank the documents retrieved from the database in blocks,
+        in order of similarity to the query, stopping once a whole block
+        leaves the top ranked documents unchanged."""
+
+        documents = db_results["documents"][0]
+        rankings = np.array([])
+        top_ranked = None
+        for start in range(0, len(documents), constants.RERANK_BLOCK_SIZE):
+            block = documents[start : start + constants.RERANK_BLOCK_SIZE]
+            block_rankings = self.reranker.predict([[query, doc] for doc in block])
+            rankings = np.concatenate([rankings, block_rankings])
+
+            block_top_ranked = set(rankings.argsort()[-num_results:])
+            if block_top_ranked == top_ranked:
+                break
+            top_ranked = block_top_ranked
+
+        # Only the documents scored so far are candidates
+        return self._select_results(db_results, rankings, num_results)
+
+    @staticmethod
+    def _prune_candidates(db_results: Dict[str, Any]) -> Dict[str, Any]:
+        """Function to drop documents much less similar to the query than the best hit
+        and documents duplicating a more similar one, before they are ranked.
+
+        Documents only matched lexically have no distance and are kept."""
+
+        distances = db_results["distances"][0]
+        if all(distance is None for distance in distances):
+            return db_results
+        best_distance = min(distance for distance in distances if distance is not None)
+        max_distance = best_distance + constants.RERANK_MAX_DISTANCE_GAP
+
+        kept_idx = []
+        seen_ids, seen_texts = set(), set()
+        for i, (doc_id, doc, distance) in enumerate(
+            zip(db_results["ids"][0], db_results["documents"][0], distances)
+        ):
+            text_hash = hashlib.md5(" ".join(doc.lower().split()).encode("utf-8")).digest()
+            too_far = distance is not None and distance > max_distance
+            if too_far or doc_id in seen_ids or text_hash in seen_texts:
+                continue
+            seen_ids.add(doc_id)
+            seen_texts.add(text_hash)
+            kept_idx.append(i)
+
+        return {
+            key: [[db_results[key][0][i] for i in kept_idx]]
+            for key in ("ids", "documents", "metadatas", "distances")
+        }
+
+    @staticmethod
+    def _select_results(
+        db_results: Dict[str, Any], rankings: np.ndarray, num_results: int
+    ) -> Dict[str, Any]:
+        """Function to keep the top ranked database results, best first."""
+        ranked_results = {}
         top_ranked_idx = rankings.argsort()[-num_results:][::-1]
 
         # Filter database results for rankings
@@ -67,17 +281,24 @@ class Retriever:
         ]
 
         return ranked_results
-    
-    def _build_context(self, documents: List[str]) -> str:
+
+    def _build_context(self, documents: List[str], metadatas: List[Dict[str, Any]]) -> str:
         """Function to convert the database results into a context for the prompt."""
-        context = ""
-        num_tokens = 0
-        for doc in documents:
-            doc += "\n\n"
-            num_tokens += len(self.tokenizer.encode(doc))
-            if num_tokens <= constants.CONTEXT_TOKEN_LIMIT:
-                context += doc
-            else:
-                break
+        # Token counts are stored at ingestion, documents ingested before are tokenized here
+        num_tokens = [
+            metadata["num_tokens"]
+            if metadata and "num_tokens" in metadata
+            else len(self.tokenizer.encode_ordinary(doc))
+            for doc, metadata in zip(documents, metadatas)
+        ]
 
-        return context
+        if self._separator_tokens is None:
+            self._separator_tokens = len(self.tokenizer.encode_ordinary(DOCUMENT_SEPARATOR))
+
+        return pack_documents(
+            documents,
+            num_tokens,
+            token_limit=constants.CONTEXT_TOKEN_LIMIT,
+            separator_tokens=self._separator_tokens,
+            strategy=constants.CONTEXT_PACKING_STRATEGY,
+        )
@@ -0,0 +1,102 @@
+from multiprocessing.managers import BaseManager
+from typing import Any, Dict, Optional
+import multiprocessing
+import os
+import threading
+
+from .vector_store import VectorStore
+
+
+class CollectionStore:
+    """Collections of the vector store owned by the store process, as served to the other processes."""
+
+    def __init__(self, store: VectorStore):
+        self.store = store
+
+    def query(self, name: str, **kwargs) -> Dict[str, Any]:
+        return self.store.collection(name).query(**kwargs)
+
+    def get(self, name: str, **kwargs) -> Dict[str, Any]:
+        return self.store.collection(name).get(**kwargs)
+
+    def count(self, name: str) -> int:
+        return self.store.collection(name).count()
+
+
+# Store served by the manager, set before the store process is forked
+_store: Optional[CollectionStore] = None
+
+
+def _get_store() -> CollectionStore:
+    return _store
+
+
+class StoreManager(BaseManager):
+    pass
+
+
+StoreManager.register("store", callable=_get_store)
+
+
+class SharedStoreClient(VectorStore):
+    """Vector store of the processes which do not own the store.
+
+    Collections are reached over a local socket of the store process. The connection
+    is opened on first use in each process, so the client can be created before
+    workers are forked."""
+
+    def __init__(self, address: Any, authkey: bytes, manager: Optional[StoreManager] = None):
+        super().__init__()
+        self.address = address
+        self.authkey = authkey
+        # Keeps the store process alive in the process which started it
+        self._manager = manager
+        self._proxy = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _open_collection(self, name: str) -> "RemoteCollection":
+        return RemoteCollection(name, self)
+
+    def _store(self) -> CollectionStore:
+        with self._lock:
+            if self._pid != os.getpid():
+                manager = StoreManager(address=self.address, authkey=self.authkey)
+                manager.connect()
+                # The proxy opens one connection per calling thread
+                self._proxy = manager.store()
+                self._pid = os.getpid()
+            return self._proxy
+
+
+class RemoteCollection:
+    """Collection of the store process, with the Collection methods used by the retriever."""
+
+    def __init__(self, name: str, client: SharedStoreClient):
+        self.name = name
+        self._client = client
+
+    def query(self, **kwargs) -> Dict[str, Any]:
+        return self._client._store().query(self.name, **kwargs)
+
+    def get(self, **kwargs) -> Dict[str, Any]:
+        return self._client._store().get(self.name, **kwargs)
+
+    def count(self) -> int:
+        return self._client._store().count(self.name)
+
+
+def serve_collections(store: VectorStore) -> SharedStoreClient:
+    """Function to hand the vector store over to a store process forked from the current one.
+
+    The current process must not use the store afterwards, other processes forked from it
+    query the store through the returned SharedStoreClient."""
+    global _store
+    _store = CollectionStore(store)
+
+    authkey = os.urandom(32)
+    manager = StoreManager(authkey=authkey, ctx=multiprocessing.get_context("fork"))
+    manager.start()
+    _store = None
+
+    return SharedStoreClient(manager.address, authkey, manager)
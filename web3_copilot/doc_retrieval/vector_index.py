@@ -0,0 +1,180 @@
+from typing import Optional, Tuple
+import os
+
+import numpy as np
+
+STORAGE_DTYPES = ("float32", "float16", "int8")
+# Rows converted to float32 at once when scoring, bounds the memory of a search
+SEARCH_BLOCK_SIZE = 16384
+# Rows sampled per list to train the IVF centroids
+IVF_TRAINING_ROWS_PER_LIST = 256
+# Arrays saved next to the embeddings when present
+EXTRA_ARRAYS = ("scales", "centroids", "list_rows", "list_offsets")
+
+
+class VectorIndex:
+    """Normalized embeddings searched by inner product, stored as float32, float16 or int8.
+
+    int8 rows are quantized with their own scale, so a score is the int8 dot product times the
+    scale of the row. With IVF lists, rows are grouped around centroids and a search only scores
+    the rows of the nprobe lists closest to the query, otherwise every row is scored."""
+
+    def __init__(
+        self,
+        data: np.ndarray,
+        scales: Optional[np.ndarray] = None,
+        centroids: Optional[np.ndarray] = None,
+        list_rows: Optional[np.ndarray] = None,
+        list_offsets: Optional[np.ndarray] = None,
+    ):
+        self.data = data
+        self.scales = scales
+        # Rows of list i are list_rows[list_offsets[i]:list_offsets[i + 1]]
+        self.centroids = centroids
+        self.list_rows = list_rows
+        self.list_offsets = list_offsets
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def dtype(self) -> str:
+        return self.data.dtype.name
+
+    @property
+    def num_lists(self) -> int:
+        return 0 if self.centroids is None else len(self.centroids)
+
+    def nbytes(self) -> int:
+        arrays = [self.data] + [getattr(self, suffix) for suffix in EXTRA_ARRAYS]
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    @classmethod
+    def build(
+        cls, embeddings: np.ndarray, dtype: str = "float32", num_lists: int = 0, seed: int = 0
+    ) -> "VectorIndex":
+        """Function to quantize normalized float32 embeddings, and group them in num_lists IVF lists if given."""
+        if dtype not in STORAGE_DTYPES:
+            raise ValueError(f"unknown embedding storage dtype `{dtype}`, expected one of {STORAGE_DTYPES}")
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        scales = None
+        if dtype == "int8":
+            max_values = np.abs(embeddings).max(axis=1) if len(embeddings) else np.zeros(0, dtype=np.float32)
+            scales = (np.maximum(max_values, 1e-12) / 127).astype(np.float32)
+            data = np.round(embeddings / scales[:, None]).astype(np.int8)
+        else:
+            data = embeddings.astype(dtype)
+
+        index = cls(data, scales)
+        # Fewer rows than lists would leave lists empty, the index is searched exhaustively
+        if num_lists > 0 and len(embeddings) > num_lists:
+            index.centroids, index.list_rows, index.list_offsets = _train_ivf(embeddings, num_lists, seed)
+        return index
+
+    def save(self, index_dir: str, name: str = "embeddings"):
+        np.save(os.path.join(index_dir, f"{name}.npy"), self.data)
+        for suffix in EXTRA_ARRAYS:
+            array = getattr(self, suffix)
+            if array is not None:
+                np.save(os.path.join(index_dir, f"{name}.{suffix}.npy"), array)
+
+    @classmethod
+    def load(cls, index_dir: str, name: str = "embeddings", mmap: bool = True) -> "VectorIndex":
+        """Function to load an index saved by save, memory-mapping the arrays read-only."""
+        mmap_mode = "r" if mmap else None
+        arrays = {}
+        for suffix in EXTRA_ARRAYS:
+            path = os.path.join(index_dir, f"{name}.{suffix}.npy")
+            arrays[suffix] = np.load(path, mmap_mode=mmap_mode) if os.path.exists(path) else None
+
+        return cls(np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode=mmap_mode), **arrays)
+
+    def search(self, queries: np.ndarray, k: int, nprobe: int = 8) -> Tuple[np.ndarray, np.ndarray]:
+        """Function to find the k rows with the highest inner product with each normalized query.
+
+        Returns the positions and scores of the rows of each query, best first.
+        Queries may get fewer than k rows when the IVF lists probed hold fewer rows."""
+        queries = np.asarray(queries, dtype=np.float32)
+        if self.num_lists == 0:
+            return self._top_k(self._score(queries, None), None, k)
+
+        # Lists whose centroid is closest to each query
+        nprobe = min(nprobe, self.num_lists)
+        centroid_scores = queries @ self.centroids.T
+        probed = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+
+        positions, scores = [], []
+        for query, lists in zip(queries, probed):
+            rows = np.concatenate(
+                [self.list_rows[self.list_offsets[i] : self.list_offsets[i + 1]] for i in lists]
+            )
+            rows.sort()
+            query_positions, query_scores = self._top_k(self._score(query[None, :], rows), rows, k)
+            positions.append(query_positions[0])
+            scores.append(query_scores[0])
+
+        # Pad queries which got fewer rows, with the scores of missing rows at -inf
+        width = max(len(p) for p in positions)
+        padded_positions = np.full((len(queries), width), -1, dtype=np.int64)
+        padded_scores = np.full((len(queries), width), -np.inf, dtype=np.float32)
+        for i, (p, s) in enumerate(zip(positions, scores)):
+            padded_positions[i, : len(p)] = p
+            padded_scores[i, : len(s)] = s
+        return padded_positions, padded_scores
+
+    def _score(self, queries: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Function to score the rows, or every row, against the queries block by block."""
+        num_rows = len(self.data) if rows is None else len(rows)
+        scores = np.empty((len(queries), num_rows), dtype=np.float32)
+        for start in range(0, num_rows, SEARCH_BLOCK_SIZE):
+            stop = min(start + SEARCH_BLOCK_SIZE, num_rows)
+            selection = slice(start, stop) if rows is None else rows[start:stop]
+            block = np.asarray(self.data[selection], dtype=np.float32)
+            block_scores = queries @ block.T
+            if self.scales is not None:
+                block_scores *= self.scales[selection]
+            scores[:, start:stop] = block_scores
+        return scores
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, rows: Optional[np.ndarray], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, scores.shape[1])
+        if k == 0:
+            return np.zeros((len(scores), 0), dtype=np.int64), np.zeros((len(scores), 0), dtype=np.float32)
+
+        # Partial sort of the k best rows of each query, then sort them
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return (top if rows is None else rows[top]), top_scores
+
+
+def _train_ivf(
+    embeddings: np.ndarray, num_lists: int, seed: int, iterations: int = 10
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Function to cluster normalized embeddings with spherical k-means, returning the
+    centroids, and the rows of each list with the offsets of the lists."""
+    rng = np.random.default_rng(seed)
+    num_samples = min(len(embeddings), num_lists * IVF_TRAINING_ROWS_PER_LIST)
+    sample = embeddings[rng.choice(len(embeddings), num_samples, replace=False)]
+
+    centroids = sample[rng.choice(num_samples, num_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        for i in range(num_lists):
+            members = sample[assignments == i]
+            # Lists left empty keep their centroid
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[i] = centroid / max(np.linalg.norm(centroid), 1e-12)
+
+    assignments = np.concatenate([
+        np.argmax(embeddings[start : start + SEARCH_BLOCK_SIZE] @ centroids.T, axis=1)
+        for start in range(0, len(embeddings), SEARCH_BLOCK_SIZE)
+    ])
+    list_rows = np.argsort(assignments, kind="stable").astype(np.int64)
+    list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=num_lists))]).astype(np.int64)
+    return centroids.astype(np.float32), list_rows, list_offsets
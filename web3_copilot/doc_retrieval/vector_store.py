@@ -0,0 +1,50 @@
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Any, Dict, Sequence
+import threading
+
+if TYPE_CHECKING:
+    from chromadb.api import API
+
+
+class VectorStore(ABC):
+    """Collections of embedded chunks, as used by ingestion and retrieval.
+
+    Collection handles are opened once and cached, they answer the Chroma Collection
+    methods used by the retriever: query, get and count, and name. Collections of
+    stores which are written to also answer upsert, update and delete."""
+
+    def __init__(self):
+        self._collections: Dict[str, Any] = {}
+        self._collections_lock = threading.Lock()
+
+    def collection(self, name: str) -> Any:
+        """Function to return the cached handle of a collection, opening it on first use."""
+        collection = self._collections.get(name)
+        if collection is None:
+            with self._collections_lock:
+                collection = self._collections.get(name)
+                if collection is None:
+                    collection = self._open_collection(name)
+                    self._collections[name] = collection
+        return collection
+
+    def query(self, name: str, query_embeddings: Sequence[Sequence[float]], n_results: int) -> Dict[str, Any]:
+        """Function to query a collection with a batch of embeddings, returning one list of results per embedding.
+
+        The batch is scored at once: one matrix product for the numpy store, one request for Chroma."""
+        return self.collection(name).query(query_embeddings=list(query_embeddings), n_results=n_results)
+
+    @abstractmethod
+    def _open_collection(self, name: str) -> Any:
+        pass
+
+
+class ChromaVectorStore(VectorStore):
+    """Collections of a Chroma client, created with cosine distances if missing."""
+
+    def __init__(self, client: "API"):
+        super().__init__()
+        self.client = client
+
+    def _open_collection(self, name: str) -> Any:
+        return self.client.get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"})
@@ -0,0 +1,107 @@
+from typing import Any, Callable, Dict, Optional, Sequence
+import json
+import os
+
+import httpx
+
+from council.contexts import Consumption, ContextBase, LLMContext
+from council.llm import LLMCallException, LLMMessage, LLMResult, OpenAILLM, OpenAILLMConfiguration
+
+from web3_copilot.common.tracing import Span
+
+
+def chat_completions_url() -> str:
+    """Function to return the url of the OpenAI chat completions API, under OPENAI_API_BASE when set,
+    e.g. to point the agent to a stand-in server."""
+    return os.environ.get("OPENAI_API_BASE", "https://api.openai.com/v1").rstrip("/") + "/chat/completions"
+
+
+def llm_caller(context: ContextBase) -> str:
+    """Function to tell what an LLM request is for from the execution path of its context:
+    routing by the controller, scoring by the evaluator, or answering by a skill."""
+    source = context.log_entry.source
+    if "/controller" in source or source.startswith("controller"):
+        return "controller"
+    if "/evaluator" in source or source.startswith("evaluator"):
+        return "evaluator"
+    return "skill"
+
+
+class TracedOpenAILLM(OpenAILLM):
+    """OpenAILLM recording a span per request, named after its caller, with its size in
+    characters of the prompt and tokens consumed.
+
+    Requests are sent to chat_completions_url over connections reused across requests.
+    With an on_token callback, the answer is streamed and on_token called with every piece of it."""
+
+    def __init__(self, config: OpenAILLMConfiguration):
+        super().__init__(config)
+        self._client = httpx.Client()
+        self._provider = self._post
+
+    def _post(self, payload: Dict[str, Any]) -> httpx.Response:
+        headers = {"Authorization": self.config.authorization, "Content-Type": "application/json"}
+        return self._client.post(chat_completions_url(), headers=headers, json=payload, timeout=self.config.timeout)
+
+    def post_chat_request(self, context: LLMContext, messages: Sequence[LLMMessage], **kwargs: Any) -> LLMResult:
+        with Span(f"llm.{llm_caller(context)}", context, stream="on_token" in kwargs) as span:
+            span.count(prompt_chars=sum(len(message.content) for message in messages))
+            result = super().post_chat_request(context, messages, **kwargs)
+            span.count(tokens=sum(c.value for c in result.consumptions if c.unit == "token"))
+            span.set(model=self.config.model.unwrap_or(""))
+            return result
+
+    def _post_chat_request(
+        self,
+        context: LLMContext,
+        messages: Sequence[LLMMessage],
+        on_token: Optional[Callable[[str], None]] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        if on_token is None:
+            return super()._post_chat_request(context, messages, **kwargs)
+
+        payload = self.config.build_default_payload()
+        payload["messages"] = [message.dict() for message in messages]
+        payload.update(kwargs)
+        payload["stream"] = True
+        # The last event reports the tokens consumed, as answers in one piece do
+        payload["stream_options"] = {"include_usage": True}
+        headers = {"Authorization": self.config.authorization, "Content-Type": "application/json"}
+
+        parts, usage, model = [], None, self.config.model.unwrap_or("")
+        with self._client.stream(
+            "POST", chat_completions_url(), headers=headers, json=payload, timeout=self.config.timeout
+        ) as response:
+            if response.status_code != httpx.codes.OK:
+                response.read()
+                raise LLMCallException(response.status_code, response.text)
+
+            for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                usage = chunk.get("usage") or usage
+                model = chunk.get("model") or model
+                choices = chunk.get("choices") or [{}]
+                token = choices[0].get("delta", {}).get("content")
+                if token:
+                    parts.append(token)
+                    on_token(token)
+
+        if usage is not None:
+            tokens = usage["total_tokens"]
+        else:
+            # APIs not reporting usage in streams: the prompt tokens and a token per piece of the answer
+            tokens = len(parts)
+            if self._token_counter is not None:
+                tokens += self._token_counter.count_messages_token(messages)
+        answer = "".join(parts)
+        return LLMResult(choices=[answer] if answer else [], consumptions=[Consumption(tokens, "token", model)])
+
+    @staticmethod
+    def from_env(model: Optional[str] = None) -> "TracedOpenAILLM":
+        return TracedOpenAILLM(OpenAILLMConfiguration.from_env(model=model))
@@ -2,36 +2,46 @@ from council.contexts import Budget, Consumption
 from council.contexts import ChainContext, ChatMessage
 from council.skills import SkillBase
 
-from chromadb import Client
-
 from web3_copilot.doc_retrieval.config import Config
-from web3_copilot.doc_retrieval import Retriever
+from web3_copilot.doc_retrieval import Retriever, VectorStore
 
 from web3_copilot.common import constants
-
-import json
+from web3_copilot.common.cache import LRUCache
+from web3_copilot.common.disk_cache import DiskCache
+from web3_copilot.common.tracing import Span
+from web3_copilot.common.utils import TX_HASH_PATTERN
+from web3_copilot.streaming import emit
+from web3_copilot.txn_debugger import EtherscanClient, TenderlyClient, TraceCompactor, to_prompt_json
+
+import hashlib
+import itertools
+import os
 import re
-import requests
+from typing import Optional
+from urllib.parse import urlparse
 
-from dotenv import find_dotenv, get_key
+from dotenv import dotenv_values, find_dotenv
 
 
 class DocRetrievalSkill(SkillBase):
     """Skill to retrieve documents from database and build context"""
 
     def __init__(self,
-                 db_client: Client,
+                 vector_store: VectorStore,
                  collection_name: str,
                  retriever: Retriever):
         super().__init__(name="doc_retrieval")
-        self.db_client = db_client
         self.collection_name = collection_name
+        # Handle of the collection opened once, not on every request
+        self.collection = vector_store.collection(collection_name)
         self.retriever = retriever
 
     def execute(self, context: ChainContext) -> ChatMessage:
-        collection = self.db_client.get_or_create_collection(name=self.collection_name)
         query = context.chat_history.last_message.message
-        doc_context = self.retriever.retrieve_docs(query=query, collection=collection)
+        with Span("skill.doc_retrieval", context, collection=self.collection_name):
+            # Only the collection of the chain is queried, the query embedding is shared by the retriever
+            doc_context = self.retriever.retrieve_docs(query=query, collection=self.collection)
+        emit(context, "retrieval", collection=self.collection_name)
 
         return self.build_success_message(
             f"Results from {self.collection_name} in database retrieved\n{doc_context}",
@@ -45,19 +55,46 @@ class TransactionDebuggerSkill(SkillBase):
     def __init__(self, config: Config):
         super().__init__(name="txn_debugger")
 
-        self.tokenizer = config._tokenizer
+        self.retrieval_config = config
         self.config = self._get_config()
         self.token_limit = constants.CONTEXT_TOKEN_LIMIT - 1000
-        self.req_count = 0
+        # JSON-RPC request ids, shared by concurrent executions of the skill
+        self.req_count = itertools.count()
+        # Token counts of contract sources, popular contracts show up in most traces
+        self._source_token_counts = LRUCache(constants.SOURCE_TOKEN_COUNT_CACHE_SIZE)
+        # Traces of mined transactions and verified sources never change, they are kept on disk across restarts
+        self.cache = DiskCache(
+            constants.TXN_DEBUGGER_CACHE_PATH, max_bytes=constants.TXN_DEBUGGER_CACHE_MAX_BYTES
+        )
+        self.chain = urlparse(self.config.get("etherscan_api") or "").netloc
+        self.tenderly = TenderlyClient(
+            rpc_url=self.config.get("rpc_url"),
+            api_key=self.config.get("tenderly_api_key"),
+        )
+        self.etherscan = EtherscanClient(
+            api_url=self.config.get("etherscan_api"),
+            api_key=self.config.get("block_explorer_api_key"),
+            max_workers=constants.ETHERSCAN_MAX_WORKERS,
+            requests_per_second=float(
+                self.config.get("etherscan_rate_limit") or constants.ETHERSCAN_RATE_LIMIT
+            ),
+        )
+
+    @property
+    def tokenizer(self):
+        # Loaded by the config on first use
+        return self.retrieval_config.tokenizer
 
     def _get_config(self):
-        env_path = find_dotenv()
+        # Variables of the environment take precedence over the .env file, e.g. to point to stand-in servers
+        env = {**dotenv_values(find_dotenv()), **os.environ}
 
         web3_config = {
-            "rpc_url": get_key(env_path, "ETH_MAINNET_URL"),
-            "tenderly_api_key": get_key(env_path, "TENDERLY_API_KEY"),
-            "block_explorer_api_key": get_key(env_path, "ETHERSCAN_API_KEY"),
-            "etherscan_api": get_key(env_path, "ETHERSCAN_API"),
+            "rpc_url": env.get("ETH_MAINNET_URL"),
+            "tenderly_api_key": env.get("TENDERLY_API_KEY"),
+            "block_explorer_api_key": env.get("ETHERSCAN_API_KEY"),
+            "etherscan_api": env.get("ETHERSCAN_API"),
+            "etherscan_rate_limit": env.get("ETHERSCAN_RATE_LIMIT"),
         }
 
         return web3_config
@@ -65,68 +102,82 @@ class TransactionDebuggerSkill(SkillBase):
     def execute(self, context: ChainContext) -> ChatMessage:
         query = context.chat_history.last_message.message
         tx_hash = self.extract_tx_hash(query)
+        with Span("skill.txn_debugger", context, tx_hash=tx_hash) as span:
+            debug_context = self.build_debug_context(tx_hash, context)
+            if debug_context is None:
+                return self.build_error_message(f"Could not trace transaction {tx_hash}")
+            span.count(contracts=len(debug_context["contracts_source_code"]))
 
-        url = self.config.get("rpc_url")
-        headers = {
-            "Content-Type": "application/json",
-            "X-access-Key": self.config.get("tenderly_api_key")
-        }
-        data = json.dumps({
-            "method": "tenderly_traceTransaction",
-            "params": [tx_hash],
-            "id": self.req_count,
-            "jsonrpc": "2.0"
-        })
-
-        response = requests.post(url, headers=headers, data=data)
-        context.budget.add_consumption(1, "call", "API_CALL")
-
-        tx_trace = response.json()["result"]
+        emit(context, "retrieval", transaction=tx_hash, contracts=len(debug_context["contracts_source_code"]))
 
-        addresses = self.extract_recipient_addresses(tx_trace)
+        return self.build_success_message(
+            to_prompt_json(debug_context),
+            data=debug_context
+        )
 
-        contracts = self.fetch_contracts(addresses, context.budget)
+    def build_debug_context(self, tx_hash: str, context: ChainContext) -> Optional[dict]:
+        """Function to gather the trace summary and contract sources of a transaction, None if it could not be traced."""
+        # Summaries depend on the trace token limit, which is part of the key
+        cache_key = f"{tx_hash.lower()}:{constants.TRACE_TOKEN_LIMIT}"
+        trace = self.cache.get("trace_summary", cache_key)
+        if trace is None:
+            trace = self.fetch_trace_summary(tx_hash, context.budget)
+            if trace is None:
+                return None
+            self.cache.put("trace_summary", cache_key, trace)
+
+        # Contract sources get the rest of the budget left by the trace summary
+        contracts = self.fetch_contracts(
+            trace["recipient_addresses"],
+            context.budget,
+            token_limit=self.token_limit - trace["num_tokens"],
+        )
 
-        debug_context = {
-            "transaction_trace": tx_trace,
+        return {
+            "transaction_trace": trace["summary"],
             "contracts_source_code": contracts
         }
 
-        self.req_count += 1
+    def fetch_trace_summary(self, tx_hash: str, budget: Budget) -> Optional[dict]:
+        """Function to stream the trace of a transaction into a summary within its own token limit."""
+        with TraceCompactor(
+            self.tokenizer,
+            constants.TRACE_TOKEN_LIMIT,
+            spool_max_memory=constants.TRACE_SPOOL_MAX_MEMORY,
+        ) as compactor:
+            tx_trace = self.tenderly.trace_transaction(tx_hash, next(self.req_count), compactor)
+            budget.add_consumption(1, "call", "API_CALL")
 
-        return self.build_success_message(
-            f"{debug_context}",
-            data=debug_context
-        )
+            if tx_trace is None:
+                return None
 
-    def fetch_contracts(self, addresses: list[str], budget: Budget):
-        api_url = self.config.get("etherscan_api")
-        api_key = self.config.get("block_explorer_api_key")
+            return {
+                "summary": compactor.summarize(tx_trace),
+                "recipient_addresses": compactor.recipient_addresses,
+                "num_tokens": compactor.num_tokens,
+            }
 
+    def fetch_contracts(self, addresses: list[str], budget: Budget, token_limit: Optional[int] = None):
+        token_limit = self.token_limit if token_limit is None else token_limit
         contracts = {}
         seen = {}
         num_tokens = 0
 
-        for address in addresses:
-            url = (f"{api_url}"
-                   f"?module=contract"
-                   f"&action=getsourcecode"
-                   f"&address={address}"
-                   f"&apikey={api_key}")
-            response = requests.get(url)
-            budget.add_consumption(1, "call", "API_CALL")
+        # Sources are fetched concurrently, then folded in address order
+        # so that the token limit cuts off the same contracts on every request
+        results = self.fetch_source_codes(addresses, budget)
 
-            if response.status_code < 400:
-                result = response.json()["result"]
+        for address, result in zip(addresses, results):
+            if result is not None:
                 details = []
 
                 # exclude unverified contracts
                 for res in result:
                     if res["ContractName"] not in seen and len(res["SourceCode"]) > 0:
-                        num_tokens += len(self.tokenizer.encode(res["SourceCode"]))
-                        if num_tokens <= self.token_limit:
+                        num_tokens += self._count_tokens(res["SourceCode"])
+                        if num_tokens <= token_limit:
                             details.append(res["SourceCode"])
-                            seen["ContractName"] = True
+                            seen[res["ContractName"]] = True
                         else:
                             break
 
@@ -134,18 +185,37 @@ class TransactionDebuggerSkill(SkillBase):
 
         return contracts
 
-    def extract_recipient_addresses(self, trace) -> list[str]:
-        addresses = []
-        trace_steps = trace["trace"]
-        seen = {}
-
-        for step in trace_steps:
-            to = step["to"]
-            if to not in seen and "decodedInput" not in step:
-                addresses.append(to)
-                seen[to] = True
+    def fetch_source_codes(self, addresses: list[str], budget: Budget) -> list:
+        """Function to return the `getsourcecode` result of each address, from the cache when available."""
+        results = [self.cache.get("source", f"{self.chain}:{address.lower()}") for address in addresses]
 
-        return addresses
+        missing = [i for i, result in enumerate(results) if result is None]
+        fetched = self.etherscan.get_source_codes([addresses[i] for i in missing])
+        for i, result in zip(missing, fetched):
+            budget.add_consumption(1, "call", "API_CALL")
+            if result is None:
+                continue
+
+            # Unverified contracts are cached for a while only, they may get verified later
+            verified = any(len(res["SourceCode"]) > 0 for res in result)
+            self.cache.put(
+                "source",
+                f"{self.chain}:{addresses[i].lower()}",
+                result,
+                ttl=None if verified else constants.UNVERIFIED_SOURCE_CACHE_TTL,
+            )
+            results[i] = result
+
+        return results
+
+    def _count_tokens(self, source_code: str) -> int:
+        key = hashlib.md5(source_code.encode("utf-8")).digest()
+        num_tokens = self._source_token_counts.get(key)
+        if num_tokens is None:
+            num_tokens = len(self.tokenizer.encode_ordinary(source_code))
+            self._source_token_counts.put(key, num_tokens)
+
+        return num_tokens
 
     def extract_all_addresses(self, query: str) -> list[str]:
         raw_pattern = r"0x[a-fA-F0-9]{40}"
@@ -159,8 +229,7 @@ class TransactionDebuggerSkill(SkillBase):
         return addresses
 
     def extract_tx_hash(self, query: str) -> str:
-        raw_pattern = r"0x[a-fA-F0-9]{64}"
-        match = re.search(raw_pattern, query)
+        match = TX_HASH_PATTERN.search(query)
 
         pos = match.regs[0]
         tx_hash = query[pos[0]:pos[1]]
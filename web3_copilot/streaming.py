@@ -0,0 +1,108 @@
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+import re
+import threading
+import time
+import weakref
+
+from council.agents import Agent
+from council.contexts import AgentContext, ChatMessage, ContextBase, SkillContext
+from council.controllers import ExecutionUnit
+from council.llm import LLMMessage
+from council.skills import LLMSkill
+
+from web3_copilot.common.tracing import current_span, metrics
+from web3_copilot.llm import TracedOpenAILLM
+
+# Called with the name and data of every event of an execution
+EventListener = Callable[[str, Dict[str, Any]], None]
+
+# Listeners of the executions in progress, keyed on the chat history of their context.
+# Council runs skills on its own thread pools, the chat history is what all contexts of an execution share.
+_listeners: "weakref.WeakKeyDictionary[Any, EventListener]" = weakref.WeakKeyDictionary()
+_listeners_lock = threading.Lock()
+
+_CHAIN_PATTERN = re.compile(r"chain\(([^)]*)\)")
+
+
+@contextmanager
+def listen(context: ContextBase, listener: EventListener):
+    """Function to send the events of the execution of context to listener, until the block exits."""
+    with _listeners_lock:
+        _listeners[context.chat_history] = listener
+    try:
+        yield
+    finally:
+        with _listeners_lock:
+            _listeners.pop(context.chat_history, None)
+
+
+def listener_of(context: ContextBase) -> Optional[EventListener]:
+    with _listeners_lock:
+        return _listeners.get(context.chat_history)
+
+
+def emit(context: ContextBase, event: str, **data: Any):
+    """Function to send an event to the listener of the execution, if any, tagged with the chain emitting it."""
+    listener = listener_of(context)
+    if listener is None:
+        return
+
+    chain = chain_name(context)
+    if chain is not None:
+        data.setdefault("chain", chain)
+    listener(event, data)
+
+
+def chain_name(context: ContextBase) -> Optional[str]:
+    """Function to find the chain a context belongs to from its execution path, None outside of a chain."""
+    match = _CHAIN_PATTERN.search(context.log_entry.source)
+    return match.group(1) if match else None
+
+
+class StreamingAgent(Agent):
+    """Agent sending a route event to the listener of the execution before every chain it runs."""
+
+    @staticmethod
+    def _execute_unit(context: AgentContext, unit: ExecutionUnit):
+        emit(context, "route", chain=unit.chain.name)
+        Agent._execute_unit(context, unit)
+
+
+class StreamingLLMSkill(LLMSkill):
+    """LLMSkill streaming the answer of the LLM as token events, when the execution has a listener.
+
+    Without a listener, or with an LLM other than TracedOpenAILLM, the answer is requested in one piece."""
+
+    def execute(self, context: SkillContext) -> ChatMessage:
+        if listener_of(context) is None:
+            return super().execute(context)
+        if not isinstance(self.llm, TracedOpenAILLM):
+            message = super().execute(context)
+            if not message.is_error:
+                emit(context, "token", text=message.message)
+            return message
+
+        messages = [LLMMessage.system_message(self._builder.apply(context)), *self._context_messages(context)]
+        start = time.perf_counter()
+        first_token = True
+
+        def on_token(token: str):
+            nonlocal first_token
+            if first_token:
+                first_token = False
+                seconds = time.perf_counter() - start
+                metrics.observe("llm.skill.first_token", seconds)
+                span = current_span()
+                if span is not None:
+                    span.set(first_token_ms=round(seconds * 1000, 3))
+            emit(context, "token", text=token)
+
+        # Through the monitored LLM, so that the tokens consumed are accounted in the budget
+        llm_response = self._llm.post_chat_request(context, messages=messages, on_token=on_token)
+        if len(llm_response.choices) < 1:
+            return self.build_error_message(message="no response")
+
+        context.budget.add_consumption(1, "call", "LLMSkill")
+
+        return self.build_success_message(message=llm_response.first_choice, data=llm_response)
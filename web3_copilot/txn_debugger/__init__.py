@@ -0,0 +1,4 @@
+from .rate_limiter import RateLimiter
+from .etherscan import EtherscanClient
+from .trace import TraceCompactor, compact_trace, to_prompt_json
+from .tenderly import TenderlyClient
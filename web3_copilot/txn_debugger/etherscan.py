@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import logging
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from web3_copilot.common import constants
+from web3_copilot.common import tracing
+from .rate_limiter import RateLimiter
+
+
+class EtherscanClient:
+    """Fetch verified contract sources from the Etherscan API concurrently,
+    over a pooled HTTP session and within the Etherscan rate limit.
+
+    Requests failing transiently are retried max_retries times with exponential backoff."""
+
+    def __init__(
+        self,
+        api_url: str,
+        api_key: str,
+        max_workers: int,
+        requests_per_second: float,
+        timeout: float = 30,
+        max_retries: int = constants.ETHERSCAN_MAX_RETRIES,
+        retry_backoff: float = constants.ETHERSCAN_RETRY_BACKOFF,
+    ):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        # Keep one connection per worker alive across requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="etherscan")
+        self._rate_limiter = RateLimiter(requests_per_second)
+
+    def get_source_code(self, address: str) -> Optional[List[Dict[str, Any]]]:
+        """Function to fetch the `getsourcecode` result of a contract, None if the request failed."""
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            self._rate_limiter.acquire()
+            try:
+                result, transient = self._request(address)
+            except (requests.RequestException, ValueError) as e:
+                result, transient = repr(e), True
+
+            if isinstance(result, list):
+                return result
+            if not transient:
+                break
+
+        logging.warning(
+            f'message="etherscan getsourcecode failed" address="{address}" attempts={attempt + 1} result="{result}"'
+        )
+        return None
+
+    def _request(self, address: str):
+        """Function to send one `getsourcecode` request, returning its result, or the error and whether it is transient."""
+        with tracing.Span("http.etherscan", address=address) as span:
+            response = self.session.get(
+                self.api_url,
+                params={
+                    "module": "contract",
+                    "action": "getsourcecode",
+                    "address": address,
+                    "apikey": self.api_key,
+                },
+                timeout=self.timeout,
+            )
+            span.count(bytes=len(response.content)).set(status=response.status_code)
+        if response.status_code >= 400:
+            return f"status {response.status_code}", response.status_code == 429 or response.status_code >= 500
+
+        result = response.json()["result"]
+        # Errors such as rate limiting are reported as a message instead of a list of contracts
+        if not isinstance(result, list):
+            return result, "rate limit" in str(result).lower()
+
+        return result, False
+
+    def get_source_codes(self, addresses: List[str]) -> List[Optional[List[Dict[str, Any]]]]:
+        """Function to fetch the sources of several contracts concurrently, in the order of the addresses."""
+        return list(self._executor.map(tracing.propagate(self.get_source_code), addresses))
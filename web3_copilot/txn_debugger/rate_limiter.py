@@ -0,0 +1,21 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """Space out calls shared by several threads so that at most `rate` calls start per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Function to block until the caller may start its call."""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+
+        if wait > 0:
+            time.sleep(wait)
@@ -0,0 +1,91 @@
+from typing import Any, Dict, Optional
+import json
+import logging
+
+import ijson
+from ijson.common import ObjectBuilder
+import requests
+
+from web3_copilot.common.tracing import Span
+from .trace import TRACE_FIELDS, TraceCompactor
+
+TRACE_STEP_PREFIX = "result.trace.item"
+SCALAR_EVENTS = ("string", "number", "boolean", "null")
+
+
+class TenderlyClient:
+    """Trace transactions with the `tenderly_traceTransaction` JSON-RPC method of the Tenderly gateway.
+
+    The response body is parsed incrementally: each trace step is built on its own and handed
+    to a TraceCompactor, so the full trace is never loaded in memory."""
+
+    def __init__(self, rpc_url: str, api_key: str, timeout: float = 60):
+        self.rpc_url = rpc_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def trace_transaction(
+        self, tx_hash: str, request_id: int, compactor: TraceCompactor
+    ) -> Optional[Dict[str, Any]]:
+        """Function to stream the steps of a trace into the compactor.
+
+        Returns the top level fields of the trace, None if the transaction could not be traced."""
+        headers = {
+            "Content-Type": "application/json",
+            "X-access-Key": self.api_key
+        }
+        data = json.dumps({
+            "method": "tenderly_traceTransaction",
+            "params": [tx_hash],
+            "id": request_id,
+            "jsonrpc": "2.0"
+        })
+
+        with Span("http.tenderly", tx_hash=tx_hash) as span, self.session.post(
+            self.rpc_url, headers=headers, data=data, stream=True, timeout=self.timeout
+        ) as response:
+            span.set(status=response.status_code)
+            if response.status_code >= 400:
+                logging.warning(
+                    f'message="tenderly_traceTransaction failed" tx_hash="{tx_hash}" status={response.status_code}'
+                )
+                return None
+
+            # Let urllib3 decompress the body while it is read
+            response.raw.decode_content = True
+            try:
+                return self._parse_trace(response.raw, tx_hash, compactor)
+            finally:
+                # Bytes received, compressed or not
+                span.count(bytes=response.raw.tell(), steps=compactor.num_steps)
+
+    @staticmethod
+    def _parse_trace(body, tx_hash: str, compactor: TraceCompactor) -> Optional[Dict[str, Any]]:
+        trace = None
+        error = {}
+        step_builder = None
+
+        for prefix, event, value in ijson.parse(body, use_float=True):
+            if step_builder is not None:
+                step_builder.event(event, value)
+                if prefix == TRACE_STEP_PREFIX and event == "end_map":
+                    compactor.add_step(step_builder.value)
+                    step_builder = None
+            elif prefix == TRACE_STEP_PREFIX and event == "start_map":
+                step_builder = ObjectBuilder()
+                step_builder.event(event, value)
+            elif prefix == "result" and event == "start_map":
+                trace = {}
+            elif event in SCALAR_EVENTS and prefix.startswith("result."):
+                # Only the top level fields kept in the prompt are read, nested values are skipped
+                field = prefix[len("result."):]
+                if field in TRACE_FIELDS:
+                    trace[field] = value
+            elif event in SCALAR_EVENTS and prefix.startswith("error."):
+                error[prefix[len("error."):]] = value
+
+        if trace is None:
+            logging.warning(f'message="tenderly_traceTransaction failed" tx_hash="{tx_hash}" error="{error}"')
+
+        return trace
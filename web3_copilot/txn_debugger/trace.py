@@ -0,0 +1,174 @@
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+import json
+import tempfile
+
+from tiktoken import Encoding
+
+# Fields of the trace and of its steps kept in the prompt
+TRACE_FIELDS = (
+    "status", "type", "from", "to", "value", "gas", "gasUsed", "blockNumber",
+    "transactionHash", "error", "errorReason", "revertReason",
+)
+STEP_FIELDS = (
+    "type", "from", "to", "value", "gasUsed", "method", "error", "errorReason",
+    "revertReason", "traceAddress",
+)
+# Decoded values longer than this are truncated
+MAX_VALUE_CHARS = 256
+
+
+class TraceCompactor:
+    """Summarize a transaction trace for the LLM prompt in a single pass over its steps.
+
+    Repeated STATICCALLs are collapsed into one step with a count, raw calldata is
+    dropped, decoded inputs and outputs are only kept for the top level calls and the
+    revert path, and steps are dropped by priority until the trace fits in the token limit.
+    Error frames come first, then the rest of the revert path, then steps by depth.
+
+    Compacted steps are spooled to a temporary file which spills to disk past
+    spool_max_memory bytes, so traces of any size are summarized in bounded memory."""
+
+    def __init__(self, tokenizer: Encoding, token_limit: int, spool_max_memory: int = 16 * 1024 * 1024):
+        self.tokenizer = tokenizer
+        self.token_limit = token_limit
+        self.num_steps = 0
+        self.num_tokens = 0
+        # Contracts called without a decoded input, in order of first call, whose sources are fetched
+        self.recipient_addresses: List[str] = []
+        self._seen_recipients: Set[str] = set()
+        # One json line per compacted step: [step, decoded input, decoded output]
+        self._spool = tempfile.SpooledTemporaryFile(max_size=spool_max_memory, mode="w+")
+        self._num_spooled = 0
+        self._error_addresses: List[Tuple[int, ...]] = []
+        # (to, selector) of STATICCALLs -> index of the spooled step, and how often it was called
+        self._staticcalls: Dict[Tuple[Any, str], int] = {}
+        self._call_counts: Dict[int, int] = {}
+
+    def __enter__(self) -> "TraceCompactor":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._spool.close()
+
+    def add_step(self, step: Dict[str, Any]):
+        self.num_steps += 1
+
+        to = step.get("to")
+        if to not in self._seen_recipients and "decodedInput" not in step:
+            self.recipient_addresses.append(to)
+            self._seen_recipients.add(to)
+
+        is_error = bool(step.get("error"))
+        if is_error:
+            self._error_addresses.append(tuple(step.get("traceAddress") or ()))
+
+        selector = (step.get("input") or "")[:10]
+        if step.get("type") == "STATICCALL" and not is_error:
+            key = (to, selector)
+            index = self._staticcalls.get(key)
+            if index is not None:
+                self._call_counts[index] = self._call_counts.get(index, 1) + 1
+                return
+            self._staticcalls[key] = self._num_spooled
+
+        compact = {field: step[field] for field in STEP_FIELDS if field in step}
+        if "method" not in compact and selector:
+            compact["selector"] = selector
+
+        self._spool.write(
+            to_prompt_json(
+                [compact, _truncate(step.get("decodedInput")), _truncate(step.get("decodedOutput"))]
+            )
+        )
+        self._spool.write("\n")
+        self._num_spooled += 1
+
+    def summarize(self, trace: Dict[str, Any]) -> Dict[str, Any]:
+        """Function to build the compacted trace from its top level fields and the steps added."""
+        summary = {field: trace[field] for field in TRACE_FIELDS if field in trace}
+        num_tokens = self._count_tokens(summary)
+
+        revert_path = set()
+        for address in self._error_addresses:
+            revert_path.update(address[:depth] for depth in range(len(address) + 1))
+
+        # Only the priority and token count of each step are kept in memory
+        candidates = []
+        step_tokens = []
+        for i, compact in enumerate(self._read_steps(revert_path)):
+            address = tuple(compact.get("traceAddress") or ())
+            if compact.get("error"):
+                priority = 0
+            elif address in revert_path:
+                priority = 1
+            else:
+                priority = 2 + len(address)
+            candidates.append((priority, i))
+            step_tokens.append(self._count_tokens(compact))
+
+        # Keep the most important steps fitting in the token limit, in trace order
+        kept = set()
+        for _, i in sorted(candidates):
+            if num_tokens + step_tokens[i] <= self.token_limit:
+                kept.add(i)
+                num_tokens += step_tokens[i]
+
+        summary["trace"] = [
+            compact for i, compact in enumerate(self._read_steps(revert_path)) if i in kept
+        ]
+        if len(kept) < self._num_spooled:
+            summary["omittedSteps"] = self._num_spooled - len(kept)
+        collapsed = self.num_steps - self._num_spooled
+        if collapsed:
+            summary["collapsedStaticCalls"] = collapsed
+
+        self.num_tokens = num_tokens
+        return summary
+
+    def _read_steps(self, revert_path: Set[Tuple[int, ...]]) -> Iterator[Dict[str, Any]]:
+        """Function to read back the spooled steps in their final form."""
+        self._spool.seek(0)
+        for i, line in enumerate(self._spool):
+            compact, decoded_input, decoded_output = json.loads(line)
+            if i in self._call_counts:
+                compact["count"] = self._call_counts[i]
+
+            address = tuple(compact.get("traceAddress") or ())
+            if address in revert_path or len(address) <= 1:
+                if decoded_input is not None:
+                    compact["decodedInput"] = decoded_input
+                if decoded_output is not None:
+                    compact["decodedOutput"] = decoded_output
+
+            yield compact
+
+    def _count_tokens(self, value: Any) -> int:
+        return len(self.tokenizer.encode_ordinary(to_prompt_json(value)))
+
+
+def compact_trace(
+    trace: Dict[str, Any], tokenizer: Encoding, token_limit: int
+) -> Tuple[Dict[str, Any], TraceCompactor]:
+    """Function to compact a trace already in memory, returning the summary and the compactor used."""
+    with TraceCompactor(tokenizer, token_limit) as compactor:
+        for step in trace.get("trace") or []:
+            compactor.add_step(step)
+        return compactor.summarize(trace), compactor
+
+
+def to_prompt_json(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def _truncate(value: Optional[Any]) -> Optional[Any]:
+    """Function to cut long strings inside decoded values, e.g. large bytes arguments."""
+    if isinstance(value, str):
+        return value if len(value) <= MAX_VALUE_CHARS else value[:MAX_VALUE_CHARS] + "..."
+    if isinstance(value, list):
+        return [_truncate(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _truncate(item) for key, item in value.items()}
+    return value